@@ -0,0 +1,115 @@
+"""
+Measures the per-request overhead of authenticating a caller, before and after principal resolution moved into a
+single `before_request` hook.
+
+"before" replays the previous flow: `firebase_auth_required` wrapped each route, and the route then called
+`get_user_id` and `verify_user`, each re-reading FLASK_ENV. "after" runs `authenticate_request` once and reads the
+principal from `flask.g`. Token verification itself is stubbed out in both cases so only the auth plumbing is timed.
+
+Usage:
+    python -m benchmarks.bench_auth [--iterations N]
+"""
+import os
+import timeit
+from argparse import ArgumentParser
+from functools import wraps
+from unittest.mock import patch
+
+os.environ.setdefault("FIREBASE_CREDENTIALS_PATH", "benchmark_credentials.json")
+os.environ.setdefault("FIREBASE_DB_URL", "https://benchmark.firebaseio.com")
+
+from flask import Flask, jsonify, request  # noqa: E402
+
+from src.routes.auth import (  # noqa: E402
+    AUTH_MODE,
+    AUTH_MODE_FIREBASE,
+    authenticate_request,
+    firebase_auth_required,
+    get_user_id,
+    token_cache,
+    verify_user,
+)
+
+USER_ID = "benchmark_user"
+DECODED_TOKEN = {"user_id": USER_ID, "exp": 2 ** 40}
+
+
+def legacy_firebase_auth_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if os.getenv('FLASK_ENV') == 'development':
+            return f(*args, **kwargs)
+        id_token = request.headers['Authorization']
+        request.decoded_token = token_cache.get(id_token) or DECODED_TOKEN
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def legacy_get_user_id(req):
+    if os.environ.get('FLASK_ENV') == 'development':
+        return req.headers.get('Authorization', None)
+    try:
+        return req.decoded_token['user_id']
+    except (AttributeError, KeyError, ValueError, TypeError):
+        return None
+
+
+def legacy_verify_user(user_id, req):
+    if os.getenv('FLASK_ENV') == 'development':
+        return True, None
+    requesting_user_id = legacy_get_user_id(req)
+    if requesting_user_id is None or user_id != requesting_user_id:
+        return False, (jsonify({"message": "Insufficient permissions"}), 403)
+    return True, None
+
+
+@legacy_firebase_auth_required
+def legacy_view():
+    legacy_get_user_id(request)
+    return legacy_verify_user(USER_ID, request)
+
+
+@firebase_auth_required
+def view():
+    get_user_id()
+    return verify_user(USER_ID)
+
+
+def create_benchmark_app() -> Flask:
+    app = Flask(__name__)
+    app.config[AUTH_MODE] = AUTH_MODE_FIREBASE
+    app.add_url_rule("/legacy", "legacy_view", legacy_view)
+    app.add_url_rule("/current", "view", view)
+    return app
+
+
+def run(iterations: int) -> dict:
+    app = create_benchmark_app()
+    results = {}
+    with patch("src.routes.auth.auth.verify_id_token", return_value=DECODED_TOKEN):
+        token_cache.put("benchmark-token", DECODED_TOKEN)
+
+        with app.test_request_context("/legacy", headers={"Authorization": "benchmark-token"}):
+            results["before"] = min(timeit.repeat(legacy_view, number=iterations, repeat=5)) / iterations
+
+        with app.test_request_context("/current", headers={"Authorization": "benchmark-token"}):
+            def current_request():
+                authenticate_request()
+                return view()
+            results["after"] = min(timeit.repeat(current_request, number=iterations, repeat=5)) / iterations
+    return results
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark per-request authentication overhead")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+    for name, seconds in results.items():
+        print(f"{name:>6}: {seconds * 1e6:8.2f} us/request")
+    print(f"speedup: {results['before'] / results['after']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Measures controller cost against the in-memory database backend, with a realistic dataset and no network. For each
+controller call, reports the mean time, the number of database calls, and the bytes they read, so N+1 patterns and
+oversized reads show up directly.
+
+Usage:
+    python -m benchmarks.bench_controllers [--iterations N] [--users 200] [--medications 4] [--events 1000]
+"""
+import os
+import timeit
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+os.environ.setdefault("FIREBASE_CREDENTIALS_PATH", "benchmark_credentials.json")
+os.environ.setdefault("FIREBASE_DB_URL", "https://benchmark.firebaseio.com")
+os.environ["FIREBASE_DB_BACKEND"] = "memory"
+os.environ["FLASK_ENV"] = "development"
+os.environ["METRICS_ENABLED"] = "false"
+
+from benchmarks.bench_load import build_dataset  # noqa: E402
+from src.app import create_app  # noqa: E402
+from src.controllers.medication_controller import get_medication, get_scheduled_medications_for_user  # noqa: E402
+from src.controllers.medication_event_controller import (  # noqa: E402
+    create_medication_event,
+    get_medication_events_for_user,
+)
+from src.controllers.user_controller import get_user, get_users  # noqa: E402
+from src.database.data_access import record_calls  # noqa: E402
+
+
+def create_parser():
+    parser = ArgumentParser(description="Benchmark controllers against the in-memory database")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--medications", type=int, default=4, help="Medications per user")
+    parser.add_argument("--events", type=int, default=1000, help="Events per medication")
+    return parser
+
+
+def main():
+    args = create_parser().parse_args()
+    with patch("src.app.initialize_firebase_app"), patch("src.app.init_swagger"):
+        app = create_app()
+
+    data, medication_ids_by_user = build_dataset(args.users, args.medications, args.events)
+    app.extensions["memory_database"].set("/", data)
+    user_id = next(iter(medication_ids_by_user))
+    medication_id = medication_ids_by_user[user_id][0]
+    now = datetime.utcnow()
+
+    cases = {
+        "get_user": lambda: get_user(user_id),
+        "get_users": lambda: get_users(None, 50),
+        "get_medication": lambda: get_medication(user_id, medication_id),
+        "create_medication_event": lambda: create_medication_event(
+            user_id, medication_id, {"timestamp": now.isoformat(), "dosage": "1 pill"}
+        ),
+        "get_medication_events_for_user": lambda: get_medication_events_for_user(
+            user_id, now - timedelta(days=30), now, 50
+        ),
+        "get_scheduled_medications_for_user": lambda: get_scheduled_medications_for_user(
+            user_id, now - timedelta(days=7), now, 100
+        ),
+    }
+
+    print(f"users={args.users} medications={args.medications} events={args.events} iterations={args.iterations}")
+    print(f"{'controller':<38}{'mean us':>12}{'db calls':>10}{'bytes read':>14}")
+    with app.test_request_context(headers={"Authorization": user_id}):
+        for name, case in cases.items():
+            with record_calls() as calls:
+                case()
+            seconds = timeit.timeit(case, number=args.iterations)
+            bytes_read = sum(call.response_bytes or 0 for call in calls)
+            print(f"{name:<38}{seconds / args.iterations * 1e6:>12.1f}{len(calls):>10}{bytes_read:>14}")
+
+
+if __name__ == '__main__':
+    main()
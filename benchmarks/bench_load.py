@@ -0,0 +1,391 @@
+"""
+Load-tests the API over HTTP: starts the real app under gunicorn against a local Realtime Database stand-in
+(`benchmarks.rtdb_server`), seeds it with users, medications and events, and drives a weighted mix of requests from
+concurrent clients. Reports requests per second and p50/p95/p99 latency for each scenario.
+
+The app runs with FLASK_ENV=development, so the Authorization header is taken as the caller's UID and no ID tokens are
+needed, and with rate limiting and profiling disabled. Clients are threads in this process, so at very high request
+rates the driver itself can become the bottleneck; compare runs made with the same settings.
+
+Scenarios:
+    log_event       POST /medications/<medication_id>/events/
+    schedule        GET  /medications/schedule/<user_id> over the last week
+    list_events     GET  /medications/events/users/<user_id> over the last 30 days
+    get_medication  GET  /medications/<medication_id>
+
+Usage:
+    python -m benchmarks.bench_load [--workers 2] [--threads 4] [--concurrency 16] [--duration 20]
+        [--mix log_event=2,schedule=3,list_events=4,get_medication=1] [--latency-ms 0] [--jitter-ms 0]
+        [--users 50] [--medications 4] [--events 200] [--json results.json]
+"""
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable
+
+import requests
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from src.utils.search import medication_names, user_search_entries
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEDULES = [
+    {"minute": "0", "hour": "8", "day_of_month": "*", "month": "*", "day_of_week": "*"},
+    {"minute": "30", "hour": "8,20", "day_of_month": "*", "month": "*", "day_of_week": "*"},
+    {"minute": "0", "hour": "*/6", "day_of_month": "*", "month": "*", "day_of_week": "*"},
+    {"minute": "15", "hour": "21", "day_of_month": "*", "month": "*", "day_of_week": "1-5"},
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def write_service_account(directory: str) -> str:
+    """
+    Writes a syntactically valid service account file with a throwaway key. firebase_admin requires one to initialize,
+    but never uses it in emulator mode.
+    """
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_key = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    path = os.path.join(directory, "benchmark_service_account.json")
+    with open(path, "w") as file:
+        json.dump({
+            "type": "service_account",
+            "project_id": "taprx-benchmark",
+            "private_key_id": "benchmark",
+            "private_key": private_key,
+            "client_email": "benchmark@taprx-benchmark.iam.gserviceaccount.com",
+            "client_id": "0",
+            "token_uri": "https://oauth2.googleapis.com/token",
+        }, file)
+    return path
+
+
+def build_dataset(users: int, medications: int, events: int, seed: int = 0) -> tuple[dict, dict[str, list[str]]]:
+    """
+    Builds the database as the API itself would have written it: with the indexes, name mirror and counters that are
+    maintained on every write, marked built, so requests take the same paths as in production rather than the
+    fallbacks for data written before the indexes existed.
+
+    Returns:
+        tuple[dict, dict[str, list[str]]]: The database contents, and the medication IDs of each user ID.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    data = {
+        "users": {},
+        "medication_events": {},
+        "user_events": {},
+        "user_search": {},
+        "search_names": {"users": {}, "medications": {}},
+        "metadata": {
+            "user_count": users,
+            "medication_counts": {},
+            "user_events_built": {},
+            "user_search_built": True,
+            "search_names_built": True,
+        },
+    }
+    medication_ids_by_user = {}
+    for u in range(users):
+        user_id = f"bench_user_{u:05d}"
+        user_medications = {}
+        for m in range(medications):
+            medication_id = f"{user_id}_med_{m:02d}"
+            user_medications[medication_id] = {
+                "medication_id": medication_id,
+                "name": f"Medication {m}",
+                "dosage": "1 pill",
+                "schedule": SCHEDULES[(u + m) % len(SCHEDULES)],
+            }
+            data["medication_events"][medication_id] = {
+                f"{medication_id}_event_{e:05d}": {
+                    "medication_event_id": f"{medication_id}_event_{e:05d}",
+                    "user_id": user_id,
+                    "medication_id": medication_id,
+                    "timestamp": (now - timedelta(minutes=rng.randrange(60 * 24 * 60))).isoformat(),
+                    "dosage": "1 pill",
+                }
+                for e in range(events)
+            }
+            data["user_events"].setdefault(user_id, {}).update({
+                medication_event_id: {"medication_id": medication_id, "timestamp": event["timestamp"]}
+                for medication_event_id, event in data["medication_events"][medication_id].items()
+            })
+        data["users"][user_id] = {
+            "user_id": user_id,
+            "first_name": f"First{u}",
+            "last_name": f"Last{u}",
+            "phone": "555-0100",
+            "medications": user_medications,
+        }
+        data["user_search"].update(user_search_entries(user_id, f"First{u}", f"Last{u}"))
+        data["search_names"]["users"][user_id] = {"first_name": f"First{u}", "last_name": f"Last{u}"}
+        data["search_names"]["medications"][user_id] = medication_names(user_medications)
+        data["metadata"]["medication_counts"][user_id] = medications
+        data["metadata"]["user_events_built"][user_id] = True
+        medication_ids_by_user[user_id] = list(user_medications)
+    return data, medication_ids_by_user
+
+
+def make_scenarios(base_url: str) -> dict[str, Callable[[requests.Session, random.Random, str, str], requests.Response]]:
+    def log_event(session, rng, user_id, medication_id):
+        return session.post(
+            f"{base_url}/medications/{medication_id}/events/",
+            json={"timestamp": datetime.utcnow().isoformat(), "dosage": "1 pill"},
+            headers={"Authorization": user_id},
+        )
+
+    def schedule(session, rng, user_id, medication_id):
+        now = datetime.utcnow()
+        return session.get(
+            f"{base_url}/medications/schedule/{user_id}",
+            params={"start_at": (now - timedelta(days=7)).isoformat(), "end_at": now.isoformat(), "limit": 100},
+            headers={"Authorization": user_id},
+        )
+
+    def list_events(session, rng, user_id, medication_id):
+        now = datetime.utcnow()
+        return session.get(
+            f"{base_url}/medications/events/users/{user_id}",
+            params={"start_at": (now - timedelta(days=30)).isoformat(), "end_at": now.isoformat(), "limit": 50},
+            headers={"Authorization": user_id},
+        )
+
+    def get_medication(session, rng, user_id, medication_id):
+        return session.get(f"{base_url}/medications/{medication_id}", headers={"Authorization": user_id})
+
+    return {
+        "log_event": log_event,
+        "schedule": schedule,
+        "list_events": list_events,
+        "get_medication": get_medication,
+    }
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def wait_until_ready(process: subprocess.Popen, url: str, name: str) -> None:
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{name} exited with code {process.returncode}")
+        try:
+            if requests.get(url, timeout=5).status_code == 200:
+                return
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{name} did not become ready within 30 seconds")
+
+
+def start_database(args, data_path: str, port: int) -> subprocess.Popen:
+    # The database runs in its own process, so it does not compete with the clients for this process's GIL.
+    command = [
+        sys.executable, "-m", "benchmarks.rtdb_server",
+        "--port", str(port),
+        "--data", data_path,
+        "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms),
+    ]
+    process = subprocess.Popen(command, cwd=REPO_ROOT, stdout=subprocess.DEVNULL)
+    wait_until_ready(process, f"http://127.0.0.1:{port}/.json?shallow=true", "Database stand-in")
+    return process
+
+
+def start_app(args, database_url: str, credentials_path: str, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "FIREBASE_CREDENTIALS_PATH": credentials_path,
+        "FIREBASE_DB_URL": database_url,
+        "FLASK_ENV": "development",
+        "RATE_LIMIT_ENABLED": "false",
+        "PROFILER_ENABLED": "false",
+        # Kept in the foreground, so it can be waited for and stopped.
+        "GUNICORN_DAEMON": "false",
+    }
+    env.pop("FIREBASE_DATABASE_EMULATOR_HOST", None)
+    env.pop("METRICS_DIR", None)
+    # The production config, so the app runs with the same server hooks, with the benchmark's pool size and address.
+    command = [
+        sys.executable, "-m", "gunicorn",
+        "-c", "gunicorn_config.py",
+        "--workers", str(args.workers),
+        "--threads", str(args.threads),
+        "--bind", f"127.0.0.1:{port}",
+        "--log-level", "warning",
+        "wsgi:app",
+    ]
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env)
+    wait_until_ready(process, f"http://127.0.0.1:{port}/", "gunicorn")
+    return process
+
+
+def drive(args, base_url: str, medication_ids_by_user: dict[str, list[str]]) -> tuple[dict, float]:
+    scenarios = make_scenarios(base_url)
+    weights = parse_mix(args.mix)
+    unknown = set(weights) - set(scenarios)
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    names = list(weights)
+    user_ids = list(medication_ids_by_user)
+
+    results = defaultdict(lambda: {"latencies": [], "errors": 0, "statuses": defaultdict(int)})
+    results_lock = threading.Lock()
+    warmup_ends = time.monotonic() + args.warmup
+    run_ends = warmup_ends + args.duration
+
+    def client(index: int) -> None:
+        rng = random.Random(args.seed + index)
+        session = requests.Session()
+        local = defaultdict(lambda: {"latencies": [], "errors": 0, "statuses": defaultdict(int)})
+        while True:
+            now = time.monotonic()
+            if now >= run_ends:
+                break
+            name = rng.choices(names, weights=[weights[n] for n in names])[0]
+            user_id = rng.choice(user_ids)
+            medication_id = rng.choice(medication_ids_by_user[user_id])
+            started = time.perf_counter()
+            try:
+                status = scenarios[name](session, rng, user_id, medication_id).status_code
+            except requests.RequestException:
+                status = 0
+            elapsed = time.perf_counter() - started
+            if now < warmup_ends:
+                continue
+            local[name]["latencies"].append(elapsed)
+            local[name]["statuses"][status] += 1
+            if not 200 <= status < 300:
+                local[name]["errors"] += 1
+        with results_lock:
+            for name, result in local.items():
+                results[name]["latencies"].extend(result["latencies"])
+                results[name]["errors"] += result["errors"]
+                for status, count in result["statuses"].items():
+                    results[name]["statuses"][status] += count
+
+    clients = [threading.Thread(target=client, args=(i,)) for i in range(args.concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return results, args.duration
+
+
+def summarize(results: dict, duration: float) -> dict:
+    summary = {}
+    all_latencies = []
+    for name in sorted(results):
+        latencies = sorted(results[name]["latencies"])
+        all_latencies.extend(latencies)
+        summary[name] = {
+            "requests": len(latencies),
+            "errors": results[name]["errors"],
+            "statuses": dict(results[name]["statuses"]),
+            "rps": len(latencies) / duration,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+        }
+    all_latencies.sort()
+    summary["total"] = {
+        "requests": len(all_latencies),
+        "errors": sum(result["errors"] for result in results.values()),
+        "rps": len(all_latencies) / duration,
+        "p50_ms": percentile(all_latencies, 0.50) * 1000,
+        "p95_ms": percentile(all_latencies, 0.95) * 1000,
+        "p99_ms": percentile(all_latencies, 0.99) * 1000,
+    }
+    return summary
+
+
+def print_summary(summary: dict) -> None:
+    print(f"{'scenario':<16}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, row in summary.items():
+        print(
+            f"{name:<16}{row['requests']:>10}{row['errors']:>8}{row['rps']:>10.1f}"
+            f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}"
+        )
+
+
+def create_parser():
+    parser = ArgumentParser(description="Load-test the API under gunicorn against a local Realtime Database")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent client threads")
+    parser.add_argument("--duration", type=float, default=20, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds before the run")
+    parser.add_argument("--mix", default="log_event=2,schedule=3,list_events=4,get_medication=1")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Latency added to each database request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random +/- variation of the database latency")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--medications", type=int, default=4, help="Medications per user")
+    parser.add_argument("--events", type=int, default=200, help="Events per medication")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the summary to this file")
+    return parser
+
+
+def main():
+    args = create_parser().parse_args()
+    data, medication_ids_by_user = build_dataset(args.users, args.medications, args.events, args.seed)
+
+    database_port, app_port = free_port(), free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        data_path = os.path.join(directory, "benchmark_data.json")
+        with open(data_path, "w") as file:
+            json.dump(data, file)
+
+        processes = [start_database(args, data_path, database_port)]
+        try:
+            credentials_path = write_service_account(directory)
+            database_url = f"http://127.0.0.1:{database_port}/?ns=taprx-benchmark"
+            processes.append(start_app(args, database_url, credentials_path, app_port))
+            results, duration = drive(args, f"http://127.0.0.1:{app_port}", medication_ids_by_user)
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait(timeout=30)
+
+    summary = summarize(results, duration)
+    print(
+        f"workers={args.workers} threads={args.threads} concurrency={args.concurrency} "
+        f"db_latency={args.latency_ms}ms users={args.users} medications={args.medications} events={args.events}"
+    )
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(summary, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures how long a page of scheduled medication times takes to build as the requested time range grows. Pages are
+expanded lazily and stop at the page limit, so for a fixed limit the latency should not grow with the range.
+
+The database is the in-memory backend, holding one user whose medications run on frequent schedules, so a long range
+holds far more occurrences than a page. With --full-expansion, the time to expand every occurrence in the range, as
+pages were built before, is shown alongside.
+
+Usage:
+    python -m benchmarks.bench_schedule [--days 1 7 30 365] [--limit 250] [--repeat 20] [--full-expansion]
+"""
+import os
+import time
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from statistics import median
+from unittest.mock import patch
+
+from croniter import croniter_range
+
+os.environ.setdefault("FIREBASE_CREDENTIALS_PATH", "benchmark_credentials.json")
+os.environ.setdefault("FIREBASE_DB_URL", "https://benchmark.firebaseio.com")
+os.environ["FIREBASE_DB_BACKEND"] = "memory"
+os.environ["METRICS_ENABLED"] = "false"
+
+from src.app import create_app  # noqa: E402
+from src.controllers.medication_controller import get_scheduled_medications_for_user  # noqa: E402
+
+SCHEDULES = {
+    "med_1": {"minute": "*/5", "hour": "*"},
+    "med_2": {"minute": "0", "hour": "*/4"},
+    "med_3": {"minute": "30", "hour": "8"},
+}
+START_AT = datetime(2024, 1, 1)
+
+
+def create_parser():
+    parser = ArgumentParser(description="Benchmark paging through scheduled medication times")
+    parser.add_argument("--days", type=int, nargs="+", default=[1, 7, 30, 365], help="Lengths of the time range")
+    parser.add_argument("--limit", type=int, default=250)
+    parser.add_argument("--repeat", type=int, default=20, help="Pages built per range")
+    parser.add_argument("--full-expansion", action="store_true", help="Also time expanding every occurrence")
+    return parser
+
+
+def main():
+    args = create_parser().parse_args()
+    with patch("src.app.initialize_firebase_app"), patch("src.app.init_swagger"):
+        app = create_app()
+    app.extensions["memory_database"].set("/users/bench_user", {
+        "user_id": "bench_user",
+        "first_name": "Bench",
+        "last_name": "User",
+        "medications": {
+            medication_id: {"medication_id": medication_id, "name": medication_id, "schedule": schedule}
+            for medication_id, schedule in SCHEDULES.items()
+        },
+    })
+
+    print(f"limit={args.limit} repeat={args.repeat}")
+    print(f"{'days':>6}{'page ms':>12}{'full expansion ms':>20}{'occurrences':>14}")
+    with app.app_context():
+        for days in args.days:
+            end_at = START_AT + timedelta(days=days)
+            latencies = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                get_scheduled_medications_for_user("bench_user", START_AT, end_at, args.limit)
+                latencies.append(time.perf_counter() - started)
+
+            full_ms, occurrences = "", ""
+            if args.full_expansion:
+                started = time.perf_counter()
+                occurrences = sum(
+                    1
+                    for schedule in SCHEDULES.values()
+                    for _ in croniter_range(START_AT, end_at, f"{schedule['minute']} {schedule['hour']} * * *")
+                )
+                full_ms = f"{(time.perf_counter() - started) * 1000:.1f}"
+            print(f"{days:>6}{median(latencies) * 1000:>12.2f}{full_ms:>20}{occurrences:>14}")
+
+
+if __name__ == '__main__':
+    main()
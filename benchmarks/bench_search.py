@@ -0,0 +1,128 @@
+"""
+Measures the trigram search indexes: how long they take to build from the database at worker start, how much memory
+they hold, and the latency of user and medication name queries, including partial words and typos.
+
+The database is the in-memory backend, filled with generated users whose names and medications are drawn from fixed
+word lists, so many documents share words as they would in production. The build time includes paging through
+/search_names, which the in-memory backend does by sorting the keys for every page.
+
+Usage:
+    python -m benchmarks.bench_search [--users 20000] [--medications 4] [--queries 2000]
+"""
+import os
+import random
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from statistics import quantiles
+from unittest.mock import patch
+
+os.environ.setdefault("FIREBASE_CREDENTIALS_PATH", "benchmark_credentials.json")
+os.environ.setdefault("FIREBASE_DB_URL", "https://benchmark.firebaseio.com")
+os.environ["FIREBASE_DB_BACKEND"] = "memory"
+os.environ["METRICS_ENABLED"] = "false"
+
+from src.app import create_app  # noqa: E402
+from src.controllers.search_controller import SearchIndexes, rebuild_search_names  # noqa: E402
+
+FIRST_NAMES = [
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth", "William",
+    "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Christopher", "Karen", "Daniel", "Nancy",
+    "Matthew", "Lisa", "Anthony", "Margaret", "Mark", "Sandra", "Donald", "Ashley",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee",
+    "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson",
+]
+MEDICATION_NAMES = [
+    "Metformin", "Lisinopril", "Atorvastatin", "Levothyroxine", "Amlodipine", "Metoprolol", "Omeprazole",
+    "Simvastatin", "Losartan", "Albuterol", "Gabapentin", "Hydrochlorothiazide", "Sertraline", "Furosemide",
+    "Acetaminophen", "Ibuprofen", "Aspirin", "Prednisone", "Escitalopram", "Montelukast",
+]
+USER_QUERIES = ["john", "smi", "jonson", "rodrigez", "eliza", "thom", "martinez", "jennifer lopez"]
+MEDICATION_QUERIES = ["metfor", "lisinoprl", "statin", "aspirin", "ibu", "levothyrox", "omeprazol"]
+
+
+def create_parser():
+    parser = ArgumentParser(description="Benchmark the trigram search indexes")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--medications", type=int, default=4, help="Medications per user")
+    parser.add_argument("--queries", type=int, default=2000, help="Queries per search kind")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+def build_users(users: int, medications: int, rng: random.Random) -> dict:
+    return {
+        f"bench_user_{u:06d}": {
+            "user_id": f"bench_user_{u:06d}",
+            "first_name": rng.choice(FIRST_NAMES),
+            "last_name": rng.choice(LAST_NAMES),
+            "medications": {
+                f"med_{m:02d}": {"medication_id": f"med_{m:02d}", "name": name}
+                for m, name in enumerate(rng.sample(MEDICATION_NAMES, medications))
+            },
+        }
+        for u in range(users)
+    }
+
+
+def report(name: str, latencies: list[float], results: int):
+    percentiles = quantiles(latencies, n=100)
+    print(
+        f"{name:<22}{percentiles[49] * 1e6:>10.1f}{percentiles[94] * 1e6:>10.1f}{percentiles[98] * 1e6:>10.1f}"
+        f"{results / len(latencies):>14.1f}"
+    )
+
+
+def main():
+    args = create_parser().parse_args()
+    rng = random.Random(args.seed)
+    with patch("src.app.initialize_firebase_app"), patch("src.app.init_swagger"):
+        app = create_app()
+    users = build_users(args.users, args.medications, rng)
+    app.extensions["memory_database"].set("/users", users)
+    user_ids = list(users)
+
+    with app.app_context():
+        rebuild_search_names()
+        # Memory is traced in a separate build, as tracing slows the build down.
+        tracemalloc.start()
+        traced = SearchIndexes()
+        traced.build()
+        index_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del traced
+
+        indexes = SearchIndexes()
+        started = time.perf_counter()
+        indexes.build()
+        build_seconds = time.perf_counter() - started
+
+    print(f"users={args.users} medications={args.medications} queries={args.queries}")
+    print(f"build: {build_seconds:.2f} s, index memory: {index_bytes / 2 ** 20:.1f} MiB "
+          f"({len(indexes.users)} users, {len(indexes.medications)} medications, "
+          f"{indexes.users.vocabulary_size + indexes.medications.vocabulary_size} distinct words)")
+    print(f"{'search':<22}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}{'mean results':>14}")
+
+    latencies, results = [], 0
+    for _ in range(args.queries):
+        query = rng.choice(USER_QUERIES)
+        started = time.perf_counter()
+        results += len(indexes.users.search(query, limit=10))
+        latencies.append(time.perf_counter() - started)
+    report("users", latencies, results)
+
+    latencies, results = [], 0
+    for _ in range(args.queries):
+        query = rng.choice(MEDICATION_QUERIES)
+        user_id = rng.choice(user_ids)
+        started = time.perf_counter()
+        results += len(indexes.medications.search(query, limit=10, scope=user_id))
+        latencies.append(time.perf_counter() - started)
+    report("medications of a user", latencies, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+A local stand-in for the Firebase Realtime Database, speaking the subset of its REST protocol that firebase_admin uses
+from the controllers: GET (with `shallow`, `orderBy`, `startAt`, `endAt`, `equalTo`, `limitToFirst` and
+`limitToLast`), PUT (with `if-match` ETags), PATCH (including multi-path updates), POST (push) and DELETE, plus the
+`timestamp` and `increment` server values.
+
+Point the app at it by setting FIREBASE_DB_URL to `http://127.0.0.1:<port>/?ns=<namespace>`, which puts
+firebase_admin in emulator mode: no Google credentials are needed and every request is sent to this server.
+
+Usage:
+    python -m benchmarks.rtdb_server [--port 9000] [--latency-ms 0] [--jitter-ms 0] [--data seed.json]
+"""
+import json
+import random
+import time
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+from src.database.memory_db import MemoryDatabase, etag_of
+
+
+class RealtimeDatabaseHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY, delayed ACKs stall keep-alive responses by ~40ms.
+    disable_nagle_algorithm = True
+    server: "RealtimeDatabaseServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, value: Any, headers: Optional[dict] = None) -> None:
+        body = b"" if status == 204 else json.dumps(value, separators=(",", ":")).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, header_value in (headers or {}).items():
+            self.send_header(name, header_value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Any:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def _parse(self) -> tuple[str, dict]:
+        url = urlparse(self.path)
+        path = unquote(url.path)
+        if not path.endswith(".json"):
+            raise ValueError("Paths must end in .json")
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        return path[:-len(".json")], params
+
+    def _handle(self, method: str) -> None:
+        self.server.inject_latency()
+        try:
+            path, params = self._parse()
+            database = self.server.database
+            silent = params.get("print") == "silent"
+
+            if method == "GET":
+                if "orderBy" in params:
+                    value = database.query(
+                        path,
+                        order_by=json.loads(params["orderBy"]),
+                        start_at=json.loads(params["startAt"]) if "startAt" in params else None,
+                        end_at=json.loads(params["endAt"]) if "endAt" in params else None,
+                        equal_to=json.loads(params["equalTo"]) if "equalTo" in params else None,
+                        limit_to_first=int(params["limitToFirst"]) if "limitToFirst" in params else None,
+                        limit_to_last=int(params["limitToLast"]) if "limitToLast" in params else None,
+                    )
+                elif "limitToFirst" in params or "limitToLast" in params or "startAt" in params:
+                    raise ValueError("orderBy must be defined when other query parameters are defined")
+                else:
+                    value = database.get(path, shallow=params.get("shallow") == "true")
+                headers = {"ETag": etag_of(value)} if self.headers.get("X-Firebase-ETag") == "true" else None
+                self._send_json(200, value, headers)
+            elif method == "PUT":
+                value = self._read_json()
+                with database.lock:
+                    expected_etag = self.headers.get("if-match")
+                    current = database.get(path)
+                    if expected_etag is not None and expected_etag != etag_of(current):
+                        self._send_json(412, current, {"ETag": etag_of(current)})
+                        return
+                    database.set(path, value)
+                    written = database.get(path)
+                self._send_json(204 if silent else 200, written, {"ETag": etag_of(written)})
+            elif method == "PATCH":
+                value = self._read_json()
+                if not isinstance(value, dict):
+                    raise ValueError("Invalid data; couldn't parse JSON object")
+                database.update(path, value)
+                self._send_json(204 if silent else 200, value)
+            elif method == "POST":
+                self._send_json(200, {"name": database.push(path, self._read_json())})
+            elif method == "DELETE":
+                database.delete(path)
+                self._send_json(204 if silent else 200, None)
+        except (ValueError, json.JSONDecodeError) as ex:
+            self._send_json(400, {"error": str(ex)})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+class RealtimeDatabaseServer(ThreadingHTTPServer):
+    """
+    Serves a `MemoryDatabase` over HTTP, optionally delaying each request to simulate network and backend latency.
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address: tuple[str, int], database: MemoryDatabase, latency: float = 0, jitter: float = 0):
+        super().__init__(address, RealtimeDatabaseHandler)
+        self.database = database
+        self.latency = latency
+        self.jitter = jitter
+
+    def inject_latency(self) -> None:
+        delay = self.latency + (random.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def create_parser():
+    parser = ArgumentParser(description="Run a local Realtime Database stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random +/- variation of the delay")
+    parser.add_argument("--data", help="JSON file to load as the initial database contents")
+    return parser
+
+
+if __name__ == '__main__':
+    args = create_parser().parse_args()
+    data = None
+    if args.data:
+        with open(args.data, "r") as file:
+            data = json.load(file)
+
+    server = RealtimeDatabaseServer(
+        (args.host, args.port), MemoryDatabase(data), args.latency_ms / 1000, args.jitter_ms / 1000
+    )
+    print(f"Realtime Database stand-in listening on {server.url}", flush=True)
+    server.serve_forever()
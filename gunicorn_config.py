@@ -10,4 +10,42 @@ forwarded_allow_ips = '*'
 
 secure_scheme_headers = {'X-Forwarded-Proto': 'https'}
 
-daemon = True
+daemon = os.environ.get('GUNICORN_DAEMON', 'true').lower() != 'false'
+
+
+def on_starting(server):
+    import tempfile
+    from src.routes.metrics import METRICS_DIR
+    from src.routes.rate_limit import RATE_LIMIT_DB_PATH, rate_limiting_enabled
+    from src.utils.metrics import clear_metrics_directory
+
+    # Workers only share rate limits through a file they all agree on. Without a configured one, the workers of this
+    # server share a file of their own, which they inherit the path of.
+    if rate_limiting_enabled() and not os.environ.get(RATE_LIMIT_DB_PATH):
+        os.environ[RATE_LIMIT_DB_PATH] = os.path.join(tempfile.mkdtemp(prefix="taprx_"), "rate_limits.sqlite3")
+        server.log.info(f"Sharing rate limits through {os.environ[RATE_LIMIT_DB_PATH]}")
+
+    # Likewise for metrics. A configured directory may hold the snapshots of a previous run.
+    if os.environ.get(METRICS_DIR):
+        clear_metrics_directory(os.environ[METRICS_DIR])
+    else:
+        os.environ[METRICS_DIR] = tempfile.mkdtemp(prefix="taprx_metrics_")
+
+
+def post_worker_init(worker):
+    from firebase_admin.exceptions import FirebaseError
+    from src.controllers.search_controller import search_indexes
+
+    # Warm the search indexes before taking requests. If the database is unreachable, the first search builds them.
+    with worker.wsgi.app_context():
+        try:
+            search_indexes.build()
+        except (ValueError, FirebaseError) as ex:
+            worker.log.error(f"Failed to build search indexes: {ex}")
+
+
+def child_exit(server, worker):
+    from src.routes.metrics import METRICS_DIR
+    from src.utils.metrics import mark_process_dead
+
+    mark_process_dead(os.environ[METRICS_DIR], worker.pid)
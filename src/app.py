@@ -2,12 +2,17 @@ import yaml
 from flasgger import Swagger
 from flask import Flask
 
+from src.database.data_access import init_database
 from src.database.firebase_config import initialize_firebase_app
 from src.models.errors.error_handlers import register_error_handlers
+from src.routes.auth import init_auth
 from src.routes.base import base_bp
 from src.routes.dependant_router import dependant_bp
 from src.routes.medication_event_router import medication_events_bp
 from src.routes.medication_router import medications_bp
+from src.routes.metrics import init_metrics
+from src.routes.profiling import init_profiler
+from src.routes.rate_limit import init_rate_limiter
 from src.routes.user_router import users_bp
 
 
@@ -56,7 +61,12 @@ def create_app():
     initialize_firebase_app()
 
     app = Flask(__name__, instance_relative_config=True)
+    init_database(app)
     init_swagger(app)
+    init_metrics(app)
+    init_auth(app)
+    init_rate_limiter(app)
+    init_profiler(app)
 
     app.register_blueprint(base_bp)
     app.register_blueprint(medications_bp, url_prefix="/medications")
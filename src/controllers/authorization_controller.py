@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from typing import Callable
+
+from firebase_admin.exceptions import FirebaseError
+from flask import current_app
+
+from src.database.data_access import reference
+from src.models.errors.invalid_request_error import InvalidRequestError
+
+RELATIONSHIP_INDEX_TTL_SECONDS = "RELATIONSHIP_INDEX_TTL_SECONDS"
+
+
+class RelationshipIndex:
+    """
+    In-memory index of the users allowed to read each user's data, built from the users' `monitored_by_users` lists.
+
+    Entries are dropped by `invalidate` when a user's relationships change. Each gunicorn worker keeps its own index, so
+    entries also expire after a TTL to bound how long another worker can serve a stale relationship.
+    """
+
+    def __init__(self, ttl_seconds: float = 300, clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize a new relationship index
+
+        Args:
+            ttl_seconds: {float} Seconds an entry is served before it is reloaded.
+            clock: {Callable[[], float]} Returns a monotonic time in seconds. Optional.
+        """
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: dict[str, tuple[float, frozenset[str]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> frozenset[str] | None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            loaded_at, monitoring_user_ids = entry
+            if self._clock() - loaded_at >= self.ttl_seconds:
+                del self._entries[user_id]
+                return None
+            return monitoring_user_ids
+
+    def put(self, user_id: str, monitoring_user_ids: frozenset[str]) -> None:
+        with self._lock:
+            self._entries[user_id] = (self._clock(), monitoring_user_ids)
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+relationship_index = RelationshipIndex(ttl_seconds=float(os.getenv(RELATIONSHIP_INDEX_TTL_SECONDS, "300")))
+
+
+def get_monitoring_user_ids(user_id: str) -> frozenset[str]:
+    """
+    Retrieves the UIDs of the users monitoring a user, from the relationship index when possible.
+
+    Args:
+        user_id: (str) UID for the monitored user.
+
+    Returns:
+        frozenset[str]: The UIDs of the users monitoring the user.
+
+    Raises:
+        FirebaseError: If an error occurs while interacting with the database.
+    """
+    monitoring_user_ids = relationship_index.get(user_id)
+    if monitoring_user_ids is not None:
+        return monitoring_user_ids
+
+    try:
+        monitored_by_users = reference("/users/{user_id}/monitored_by_users", user_id=user_id).get()
+    except (ValueError, FirebaseError) as ex:
+        current_app.logger.error(f"Firebase failure while trying to retrieve monitoring users for user {user_id}: {ex}")
+        raise FirebaseError(500, f"Failed to retrieve monitoring users for user {user_id}")
+
+    # Firebase returns sparse arrays as dictionaries keyed by index.
+    if isinstance(monitored_by_users, dict):
+        monitored_by_users = monitored_by_users.values()
+    monitoring_user_ids = frozenset(
+        monitoring_user_id for monitoring_user_id in monitored_by_users or [] if isinstance(monitoring_user_id, str)
+    )
+
+    relationship_index.put(user_id, monitoring_user_ids)
+    return monitoring_user_ids
+
+
+def can_read_user_data(requesting_user_id: str | None, user_id: str) -> bool:
+    """
+    Answers whether a user may read another user's data: users may read their own data, and monitoring users may read
+    the data of the users they monitor.
+
+    Args:
+        requesting_user_id: (str) UID for the user making the request.
+        user_id: (str) UID for the user owning the data.
+
+    Returns:
+        bool: Whether the requesting user may read the data.
+
+    Raises:
+        FirebaseError: If an error occurs while interacting with the database.
+    """
+    if requesting_user_id is None:
+        return False
+    if requesting_user_id == user_id:
+        return True
+    return requesting_user_id in get_monitoring_user_ids(user_id)
+
+
+def authorize_user_data_access(requesting_user_id: str | None, user_id: str) -> None:
+    """
+    Requires that a user may read another user's data.
+
+    Args:
+        requesting_user_id: (str) UID for the user making the request.
+        user_id: (str) UID for the user owning the data.
+
+    Raises:
+        InvalidRequestError: If the requesting user may not read the data.
+        FirebaseError: If an error occurs while interacting with the database.
+    """
+    if not can_read_user_data(requesting_user_id, user_id):
+        current_app.logger.error(f"Insufficient permissions: {requesting_user_id} cannot read data of {user_id}")
+        raise InvalidRequestError("User does not have access to this user's data")
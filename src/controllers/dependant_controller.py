@@ -1,11 +1,12 @@
-from firebase_admin import db
 from flask import current_app
 from firebase_admin.exceptions import FirebaseError
 
+from src.database.data_access import reference
 from src.models.Dependant import Dependant
 from src.models.errors.resource_already_exists_error import ResourceAlreadyExistsError
 from src.models.errors.invalid_request_error import InvalidRequestError
 from src.models.errors.resource_not_found_error import ResourceNotFoundError
+from src.utils.push_id import generate_push_id
 
 
 def get_dependants(user_id: str) -> dict or None:
@@ -23,7 +24,7 @@ def get_dependants(user_id: str) -> dict or None:
         InvalidRequestError: If an error occurs from input.
     """
     try:
-        dependants = db.reference(f"/users/{user_id}/dependants").get()
+        dependants = reference("/users/{user_id}/dependants", user_id=user_id).get()
     except ValueError as ex:
         current_app.logger.error(f"Invalid request: {ex}")
         raise InvalidRequestError
@@ -52,7 +53,9 @@ def get_dependant(user_id: str, dependant_id: str) -> Dependant or None:
         InvalidRequestError: If an error occurs from input.
     """
     try:
-        dependant = db.reference(f"/users/{user_id}/dependants/{dependant_id}").get()
+        dependant = reference(
+            "/users/{user_id}/dependants/{dependant_id}", user_id=user_id, dependant_id=dependant_id
+        ).get()
     except ValueError as ex:
         current_app.logger.error(f"Invalid request: {ex}")
         raise InvalidRequestError
@@ -97,17 +100,7 @@ def create_dependant(user_id: str, dependant_json_dict: dict) -> Dependant or No
         current_app.logger.error("First name and last name are required")
         raise InvalidRequestError("First name and last name are required")
 
-    try:
-        dependant_id = db.reference(f"/users/{user_id}/dependants").push().key
-    except (ValueError, TypeError) as ex:
-        current_app.logger.error(f"Invalid request: {ex}")
-        raise InvalidRequestError
-    except FirebaseError as ex:
-        current_app.logger.error(
-            f"Firebase failure while trying to generate dependant ID: {ex}"
-        )
-        raise ex
-
+    dependant_id = generate_push_id()
     new_dependant = Dependant(
         dependant_id=dependant_id,
         first_name=first_name,
@@ -116,7 +109,7 @@ def create_dependant(user_id: str, dependant_json_dict: dict) -> Dependant or No
     )
 
     try:
-        db.reference(f"/users/{user_id}/dependants/{dependant_id}").set(
+        reference("/users/{user_id}/dependants/{dependant_id}", user_id=user_id, dependant_id=dependant_id).set(
             new_dependant.to_dict()
         )
     except (ValueError, TypeError) as ex:
@@ -151,8 +144,8 @@ def update_dependant(
         ResourceNotFoundError: If the user or dependant does not exist.
     """
     try:
-        dependant_data = db.reference(
-            f"/users/{user_id}/dependants/{dependant_id}"
+        dependant_data = reference(
+            "/users/{user_id}/dependants/{dependant_id}", user_id=user_id, dependant_id=dependant_id
         ).get()
     except ValueError as ex:
         current_app.logger.error(f"Invalid request: {ex}")
@@ -187,7 +180,7 @@ def update_dependant(
     )
 
     try:
-        db.reference(f"/users/{user_id}/dependants/{dependant_id}").set(
+        reference("/users/{user_id}/dependants/{dependant_id}", user_id=user_id, dependant_id=dependant_id).set(
             updated_dependant.to_dict()
         )
     except (ValueError, TypeError) as ex:
@@ -223,40 +216,31 @@ def delete_dependant(user_id: str, dependant_id: str) -> None:
     if dependant_id is None:
         raise InvalidRequestError("Dependant ID cannot be None")
 
+    # The user is only checked when the dependant is missing, to tell the two cases apart.
     try:
-        user_data = db.reference(f"/users/{user_id}").get()
+        dependant_exists = reference(
+            "/users/{user_id}/dependants/{dependant_id}", user_id=user_id, dependant_id=dependant_id
+        ).exists()
+        user_exists = dependant_exists or reference("/users/{user_id}", user_id=user_id).exists()
     except ValueError as ex:
         current_app.logger.error(f"Invalid request: {ex}")
         raise InvalidRequestError
     except FirebaseError as ex:
         current_app.logger.error(
-            f"Firebase failure while trying to retrieve user {user_id}: {ex}"
+            f"Firebase failure while trying to retrieve dependant {dependant_id}: {ex}"
         )
         raise ex
 
-    if user_data is None:
+    if not user_exists:
         current_app.logger.error(f"User {user_id} does not exist")
         raise ResourceNotFoundError(f"User {user_id} does not exist")
 
-    try:
-        dependant_data = db.reference(
-            f"/users/{user_id}/dependants/{dependant_id}"
-        ).get()
-    except ValueError as ex:
-        current_app.logger.error(f"Invalid request: {ex}")
-        raise InvalidRequestError
-    except FirebaseError as ex:
-        current_app.logger.error(
-            f"Firebase failure while trying to retrieve dependant {dependant_id}: {ex}"
-        )
-        raise ex
-
-    if dependant_data is None:
+    if not dependant_exists:
         current_app.logger.error(f"Dependant {dependant_id} does not exist")
         raise ResourceNotFoundError(f"Dependant {dependant_id} does not exist")
 
     try:
-        db.reference(f"/users/{user_id}/dependants/{dependant_id}").delete()
+        reference("/users/{user_id}/dependants/{dependant_id}", user_id=user_id, dependant_id=dependant_id).delete()
     except ValueError as ex:
         current_app.logger.error(f"Invalid request: {ex}")
         raise InvalidRequestError
@@ -1,11 +1,15 @@
+import heapq
 from datetime import datetime, timedelta
+from itertools import islice
+from typing import Iterator
 
-from croniter import croniter_range
-from firebase_admin import db
+from croniter import croniter, croniter_range
 from firebase_admin.exceptions import FirebaseError
 from flask import current_app
 
+from src.controllers.search_controller import index_medication, reindex_medication, unindex_medication
 from src.controllers.user_controller import get_user
+from src.database.data_access import fan_out, reference, seed_counter
 from src.models.Medication import Medication
 from src.models.Schedule import Schedule
 from src.models.User import User
@@ -13,9 +17,12 @@ from src.models.errors.invalid_request_error import InvalidRequestError
 from src.models.errors.resource_not_found_error import ResourceNotFoundError
 from src.utils.constants import (
     MAX_MEDICATION_SCHEDULED_TIMES_PER_PAGE,
+    MAX_MEDICATIONS_PER_BULK_REQUEST,
     GET_MED_SCHEDULED_TIMES_DELIMITER
 )
-from src.utils.pagination import parse_start_tkn, create_next_token
+from src.utils.pagination import parse_start_tkn, create_next_token, decode_cursor, encode_cursor
+from src.utils.push_id import generate_push_id
+from src.utils.search import medication_name_updates
 
 
 def get_medication(user_id: str, medication_id: str) -> Medication or None:
@@ -34,8 +41,8 @@ def get_medication(user_id: str, medication_id: str) -> Medication or None:
         ValueError: If an error occurs while trying to retrieve the medication.
     """
     try:
-        medication_data = db.reference(
-            f"/users/{user_id}/medications/{medication_id}"
+        medication_data = reference(
+            "/users/{user_id}/medications/{medication_id}", user_id=user_id, medication_id=medication_id
         ).get()
     except (ValueError, FirebaseError) as ex:
         current_app.logger.error(
@@ -53,32 +60,104 @@ def get_medication(user_id: str, medication_id: str) -> Medication or None:
         return None
 
 
-def get_medications(user_id: str, page=1, limit=50) -> tuple[list[Medication], int]:
+def get_medication_version_if_changed(user_id: str, etag: str | None) -> tuple[bool, str | None]:
     """
-    Retrieves medications for a user from the database.
+    Checks whether any of a user's medications changed since the caller read them. Every write to a user's medications
+    also increments /metadata/medication_versions/{user_id}, so its database ETag changes with the medications, and
+    checking it costs a read of a single number, or nothing if it is unchanged.
+
+    Args:
+        user_id: (str) The user's ID.
+        etag: (str | None) The ETag the caller received with the medications, or None if it has none.
+
+    Returns:
+        tuple[bool, str | None]: Whether the medications may have changed, and the current ETag to send with them.
+
+    Raises:
+        FirebaseError: If an error occurs while interacting with the database.
+        ValueError: If an error occurs while trying to retrieve the version.
+    """
+    try:
+        changed, _, etag = reference(
+            "/metadata/medication_versions/{user_id}", user_id=user_id
+        ).conditional_get(etag)
+    except (ValueError, FirebaseError) as ex:
+        current_app.logger.error(f"Failed to retrieve the medication version of user {user_id}: {ex}")
+        raise ex
+    return changed, etag
+
+
+def get_medication_if_changed(
+        user_id: str, medication_id: str, etag: str | None
+) -> tuple[bool, Medication | None, str | None]:
+    """
+    Fetches a medication from the database, unless the caller's copy is still current. The medication node's database
+    ETag identifies the copy, so an unchanged medication is not downloaded.
 
     Args:
         user_id: (str) UID for the user.
-        page: (int) The positive, non-zero page number to retrieve. Optional.
-        limit: (int) The positive, non-zero maximum number of medications to retrieve. Optional.
+        medication_id: (str) UID for medication.
+        etag: (str | None) The ETag of the caller's copy, or None if it has none.
 
     Returns:
-        tuple: A list of medications and the total number of medications for the user.
+        tuple[bool, Medication | None, str | None]: Whether the medication changed, the medication if it did and
+        exists, and its ETag.
 
     Raises:
         FirebaseError: If an error occurs while interacting with the database.
-        ValueError: If the page or limit are invalid.
+        ValueError: If an error occurs while trying to retrieve the medication.
+    """
+    try:
+        changed, medication_data, etag = reference(
+            "/users/{user_id}/medications/{medication_id}", user_id=user_id, medication_id=medication_id
+        ).conditional_get(etag)
+    except (ValueError, FirebaseError) as ex:
+        current_app.logger.error(
+            f"Firebase failure while trying to retrieve medication {medication_id}: {ex}"
+        )
+        raise ex
+
+    if not changed or not medication_data:
+        return changed, None, etag
+    if not isinstance(medication_data, dict):
+        raise ValueError(
+            f"Expected a dictionary from Firebase, but got a different type. Got: {medication_data}"
+        )
+    return True, Medication.from_dict(medication_data), etag
+
+
+def get_medications(user_id: str, start_token: str = None, limit=50) -> tuple[list[Medication], int, str | None]:
     """
-    # Validate inputs
-    if page <= 0:
-        raise ValueError("Page must be a positive, non-zero integer")
+    Retrieves a page of a user's medications from the database, ordered by medication ID. Pages are read with a key
+    range query, so only the requested medications are downloaded.
+
+    Args:
+        user_id: (str) UID for the user.
+        start_token: (str) The token to retrieve the next page of medications. Optional.
+        limit: (int) The positive, non-zero maximum number of medications to retrieve. Optional.
+
+    Returns:
+        tuple: A list of medications, the total number of medications for the user & the token for the next page, or
+        None if this is the last page.
 
+    Raises:
+        InvalidRequestError: If the start token is invalid.
+        FirebaseError: If an error occurs while interacting with the database.
+        ValueError: If the limit is invalid.
+    """
     if limit <= 0:
         raise ValueError("Limit must be a positive, non-zero integer")
 
-    # Fetch medications from the database
     try:
-        medications = db.reference(f"/users/{user_id}/medications").get()
+        start_key = decode_cursor(start_token) if start_token else None
+    except ValueError:
+        raise InvalidRequestError("Invalid next_token.")
+
+    try:
+        query = reference("/users/{user_id}/medications", user_id=user_id).order_by_key()
+        if start_key is not None:
+            query = query.start_at(start_key)
+        medications = query.limit_to_first(limit + 1).get()
     except (FirebaseError, ValueError) as ex:
         current_app.logger.error(
             f"Firebase failure while trying to retrieve medications for user {user_id}: {ex}"
@@ -86,29 +165,106 @@ def get_medications(user_id: str, page=1, limit=50) -> tuple[list[Medication], i
         raise ex
 
     if medications is None:
-        return [], 0
+        return [], get_medication_count(user_id), None
 
     if not isinstance(medications, dict):
         raise ValueError(
             f"Expected a list from Firebase, but got a different type. Got: {medications}"
         )
-    medications_list = list(medications.values())
-    for medication in medications_list:
+    for medication in medications.values():
         if not isinstance(medication, dict):
             raise ValueError(
                 f"Expected a dictionary from Firebase, but got a different type. Got: {medication}"
             )
 
-    # Paginate medications
-    total_medications = len(medications_list)
+    medication_ids = list(medications)
+    next_token = encode_cursor(medication_ids[limit]) if len(medication_ids) > limit else None
+    medications_list = [Medication.from_dict(medications[medication_id]) for medication_id in medication_ids[:limit]]
+
+    return medications_list, get_medication_count(user_id), next_token
+
+
+def get_medication_count(user_id: str) -> int:
+    """
+    Retrieves the number of medications a user has, from the counter at /metadata/medication_counts/{user_id}, which
+    is seeded and kept in step by every write that adds or removes a medication. Until the user's medications are
+    first written, they are counted with a shallow read instead, without writing the counter.
+
+    Args:
+        user_id: (str) UID for the user.
+
+    Returns:
+        int: The number of medications.
+
+    Raises:
+        FirebaseError: If an error occurs while interacting with the database.
+    """
+    try:
+        medication_count = reference("/metadata/medication_counts/{user_id}", user_id=user_id).get()
+        if medication_count is not None:
+            # A counter that drifted, e.g. through concurrent deletes of one medication, must not report fewer than 0.
+            return max(medication_count, 0)
+
+        return len(reference("/users/{user_id}/medications", user_id=user_id).get(shallow=True) or {})
+    except (FirebaseError, ValueError) as ex:
+        current_app.logger.error(f"Firebase failure while trying to count medications for user {user_id}: {ex}")
+        raise FirebaseError(500, f"Failed to count medications for user {user_id}")
+
+
+def seed_medication_counts() -> int:
+    """
+    Sets every user's counter at /metadata/medication_counts to the number of medications they have, from shallow
+    reads. Writes seed a missing counter themselves, so this only repairs counters that have drifted. Medications
+    written between the reads and the write are not counted.
+
+    Returns:
+        int: The number of users counted.
+
+    Raises:
+        FirebaseError: If an error occurs while interacting with the database.
+    """
+    user_ids = list(reference("/users").get(shallow=True) or {})
+    medication_counts = fan_out(
+        lambda user_id: len(reference("/users/{user_id}/medications", user_id=user_id).get(shallow=True) or {}),
+        user_ids,
+    )
+    reference("/metadata/medication_counts").set(dict(zip(user_ids, medication_counts)))
+    return len(user_ids)
+
+
+def _seed_medication_count(user_id: str) -> None:
+    # Called before a write that changes the counter, as a server-side increment would start a missing one from 0.
+    seed_counter(
+        reference("/metadata/medication_counts/{user_id}", user_id=user_id),
+        lambda: len(reference("/users/{user_id}/medications", user_id=user_id).get(shallow=True) or {}),
+    )
+
+
+def get_medication_ids(user_id: str) -> list[str]:
+    """
+    Retrieves the IDs of a user's medications with a shallow read, without downloading the medications themselves.
+
+    Args:
+        user_id: (str) UID for the user.
 
-    if page:
-        medications_list = medications_list[(page - 1) * limit :]
+    Returns:
+        list[str]: The medication IDs, sorted.
 
-    medications_list = medications_list[:limit]
-    medications_list = [Medication.from_dict(medication) for medication in medications_list]
+    Raises:
+        ResourceNotFoundError: If the user does not exist.
+        FirebaseError: If an error occurs while interacting with the database.
+    """
+    try:
+        medication_ids = reference("/users/{user_id}/medications", user_id=user_id).get(shallow=True)
+        if medication_ids is None and not reference("/users/{user_id}", user_id=user_id).exists():
+            raise ResourceNotFoundError(f"User {user_id} does not exist")
+    except (FirebaseError, ValueError) as ex:
+        current_app.logger.error(f"Firebase failure while trying to retrieve medication IDs for user {user_id}: {ex}")
+        raise FirebaseError(500, f"Failed to retrieve medications for user {user_id}")
 
-    return medications_list, total_medications
+    if not isinstance(medication_ids, dict):
+        return []
+    return sorted(medication_ids)
 
 
 def create_medication(user_id: str, medication_json_dict: dict) -> Medication:
@@ -140,26 +296,19 @@ def create_medication(user_id: str, medication_json_dict: dict) -> Medication:
         raise InvalidRequestError
 
     try:
-        user_data = db.reference(f"/users/{user_id}").get()
+        user_exists = reference("/users/{user_id}", user_id=user_id).exists()
     except FirebaseError as ex:
         current_app.logger.error(
             f"Firebase failure while trying to retrieve user {user_id}: {ex}"
         )
         raise ex
 
-    if user_data is None:
+    if not user_exists:
         current_app.logger.error(f"User {user_id} does not exist")
         raise ResourceNotFoundError(f"User {user_id} does not exist")
 
-    try:
-        # Generates UID for the medication and creates the empty node.
-        medication_id = db.reference(f"/users/{user_id}/medications").push().key
-    except FirebaseError as ex:
-        current_app.logger.error(
-            f"Firebase failure while trying to generate medication ID: {ex}"
-        )
-        raise ex
-
+    # Generated locally, so the medication is created in a single write.
+    medication_id = generate_push_id()
     new_medication = Medication(
         medication_id=medication_id,
         name=name,
@@ -170,9 +319,13 @@ def create_medication(user_id: str, medication_json_dict: dict) -> Medication:
     )
 
     try:
-        db.reference(f"/users/{user_id}/medications/{medication_id}").set(
-            new_medication.to_dict()
-        )
+        _seed_medication_count(user_id)
+        reference("/").update({
+            f"users/{user_id}/medications/{medication_id}": new_medication.to_dict(),
+            f"metadata/medication_counts/{user_id}": {".sv": {"increment": 1}},
+            f"metadata/medication_versions/{user_id}": {".sv": {"increment": 1}},
+            f"search_names/medications/{user_id}/{medication_id}": {"name": name, "nickname": nickname},
+        })
     except (ValueError, TypeError) as ex:
         current_app.logger.error(
             f"Error while trying to store medication {medication_id}: {ex}"
@@ -184,6 +337,8 @@ def create_medication(user_id: str, medication_json_dict: dict) -> Medication:
         )
         raise ex
 
+    index_medication(user_id, medication_id, name, nickname)
+
     return new_medication
 
 
@@ -208,24 +363,19 @@ def update_medication(
         FirebaseError: If an error occurs while interacting with the database.
 
     """
-    updated_medication_data = {}
-    medication_keys_to_copy = ["container_id", "name", "nickname", "dosage"]
-    for key in medication_keys_to_copy:
-        if key in medication_json_dict:
-            updated_medication_data[key] = medication_json_dict[key]
-
-    if "schedule" in medication_json_dict:
-        updated_schedule = Schedule.from_dict(medication_json_dict["schedule"])
-        if updated_schedule:
-            updated_medication_data["schedule"] = updated_schedule.to_dict()
-
+    updated_medication_data = _medication_updates(medication_json_dict)
     if not updated_medication_data:
         raise InvalidRequestError("No valid fields to update")
 
     try:
-        db.reference(f"/users/{user_id}/medications/{medication_id}").update(
-            updated_medication_data
-        )
+        reference("/").update({
+            **{
+                f"users/{user_id}/medications/{medication_id}/{key}": value
+                for key, value in updated_medication_data.items()
+            },
+            **medication_name_updates(user_id, medication_id, updated_medication_data),
+            f"metadata/medication_versions/{user_id}": {".sv": {"increment": 1}},
+        })
     except ValueError as ex:
         current_app.logger.error(
             f"Error while trying to update medication {medication_id}: {ex}"
@@ -237,12 +387,147 @@ def update_medication(
         )
         raise ex
 
+    reindex_medication(user_id, medication_id, updated_medication_data)
+
+    return updated_medication_data
+
+
+def _medication_updates(medication_json_dict: dict) -> dict:
+    updated_medication_data = {}
+    medication_keys_to_copy = ["container_id", "name", "nickname", "dosage"]
+    for key in medication_keys_to_copy:
+        if key in medication_json_dict:
+            updated_medication_data[key] = medication_json_dict[key]
+
+    if "schedule" in medication_json_dict:
+        updated_schedule = Schedule.from_dict(medication_json_dict["schedule"])
+        if updated_schedule:
+            updated_medication_data["schedule"] = updated_schedule.to_dict()
     return updated_medication_data
 
 
+def save_medications(user_id: str, medication_json_dicts: list) -> list[dict]:
+    """
+    Creates and updates a list of medications for a user in one write, e.g. a discharge list when onboarding a
+    patient. Items with a medication_id update that medication; the others create a new one. Every item and its schedule
+    is validated first, the user and their medication IDs are checked with one shallow read, and all valid items are
+    written with one multi-path update.
+
+    Args:
+        user_id: (str) UID for the user.
+        medication_json_dicts: (list) The medications' data, as for `create_medication`, or as for `update_medication`
+            along with a medication_id.
+
+    Returns:
+        list[dict]: The result of each item, in order: whether it succeeded, its status ("created", "updated", "invalid"
+        or "not_found"), and the medication ID with the stored data, or an error message.
+
+    Raises:
+        InvalidRequestError: If the list is not a list, or is empty or too long.
+        ResourceNotFoundError: If the user does not exist.
+        ValueError, TypeError: If an error occurs while trying to store the medications.
+        FirebaseError: If an error occurs while interacting with the database.
+    """
+    if not isinstance(medication_json_dicts, list) or not medication_json_dicts:
+        raise InvalidRequestError("Expected a non-empty list of medications")
+    if len(medication_json_dicts) > MAX_MEDICATIONS_PER_BULK_REQUEST:
+        raise InvalidRequestError(
+            f"Too many medications. Please send at most {MAX_MEDICATIONS_PER_BULK_REQUEST} per request."
+        )
+
+    medication_ids = set(get_medication_ids(user_id))
+
+    results = []
+    updates = {}
+    created = []
+    updated = []
+    for medication_json_dict in medication_json_dicts:
+        try:
+            result = _prepare_medication_write(user_id, medication_json_dict, medication_ids)
+        except InvalidRequestError as ex:
+            results.append({"success": False, "status": "invalid", "message": ex.message})
+            continue
+        except ResourceNotFoundError as ex:
+            results.append({"success": False, "status": "not_found", "message": ex.message})
+            continue
+
+        medication_id, data = result
+        if "medication_id" in medication_json_dict:
+            updates.update({
+                f"users/{user_id}/medications/{medication_id}/{key}": value for key, value in data.items()
+            })
+            updates.update(medication_name_updates(user_id, medication_id, data))
+            updated.append((medication_id, data))
+            results.append({"success": True, "status": "updated", "medication_id": medication_id, "data": data})
+        else:
+            updates[f"users/{user_id}/medications/{medication_id}"] = data
+            updates[f"search_names/medications/{user_id}/{medication_id}"] = {
+                "name": data["name"], "nickname": data.get("nickname")
+            }
+            created.append((medication_id, data))
+            results.append({"success": True, "status": "created", "medication_id": medication_id, "data": data})
+
+    if created:
+        updates[f"metadata/medication_counts/{user_id}"] = {".sv": {"increment": len(created)}}
+    if updates:
+        updates[f"metadata/medication_versions/{user_id}"] = {".sv": {"increment": 1}}
+        try:
+            if created:
+                _seed_medication_count(user_id)
+            reference("/").update(updates)
+        except (ValueError, TypeError) as ex:
+            current_app.logger.error(f"Error while trying to store medications for user {user_id}: {ex}")
+            raise ex
+        except FirebaseError as ex:
+            current_app.logger.error(f"Firebase failure while trying to store medications for user {user_id}: {ex}")
+            raise ex
+
+    for medication_id, data in created:
+        index_medication(user_id, medication_id, data["name"], data.get("nickname"))
+    for medication_id, data in updated:
+        reindex_medication(user_id, medication_id, data)
+
+    return results
+
+
+def _prepare_medication_write(user_id: str, medication_json_dict: dict, medication_ids: set[str]) -> tuple[str, dict]:
+    if not isinstance(medication_json_dict, dict):
+        raise InvalidRequestError("Expected a medication object")
+
+    schedule = medication_json_dict.get("schedule")
+    if schedule is not None:
+        if not isinstance(schedule, dict):
+            raise InvalidRequestError("Invalid schedule")
+        parsed_schedule = Schedule.from_dict(schedule)
+        if parsed_schedule is not None and not croniter.is_valid(parsed_schedule.to_cron()):
+            raise InvalidRequestError(f"Invalid schedule: {parsed_schedule.to_cron()}")
+
+    if "medication_id" in medication_json_dict:
+        medication_id = medication_json_dict["medication_id"]
+        if medication_id not in medication_ids:
+            raise ResourceNotFoundError(f"Medication {medication_id} does not exist")
+        updated_medication_data = _medication_updates(medication_json_dict)
+        if not updated_medication_data:
+            raise InvalidRequestError("No valid fields to update")
+        return medication_id, updated_medication_data
+
+    name = medication_json_dict.get("name")
+    if not name or not isinstance(name, str):
+        raise InvalidRequestError("Missing required field: name")
+    new_medication = Medication(
+        medication_id=generate_push_id(),
+        name=name,
+        container_id=medication_json_dict.get("container_id", None),
+        nickname=medication_json_dict.get("nickname", None),
+        dosage=medication_json_dict.get("dosage", None),
+        schedule=Schedule.from_dict(schedule),
+    )
+    return new_medication.medication_id, new_medication.to_dict()
+
+
 def delete_medication(user_id: str, medication_id: str):
     """
-    Deletes a medication from the database.
+    Deletes a medication from the database, along with its events' entries in the user's event index.
 
     Args:
         user_id: (str) The user's ID.
@@ -268,7 +553,22 @@ def delete_medication(user_id: str, medication_id: str):
         raise ResourceNotFoundError(f"Medication {medication_id} does not exist")
 
     try:
-        db.reference(f"/users/{user_id}/medications/{medication_id}").delete()
+        medication_event_ids = reference(
+            "/medication_events/{medication_id}", medication_id=medication_id
+        ).get(shallow=True) or {}
+        updates = {
+            f"users/{user_id}/medications/{medication_id}": None,
+            f"search_names/medications/{user_id}/{medication_id}": None,
+            f"metadata/medication_counts/{user_id}": {".sv": {"increment": -1}},
+            f"metadata/medication_versions/{user_id}": {".sv": {"increment": 1}},
+            # The medication's events drop out of the user's event lists.
+            f"metadata/event_versions/{user_id}": {".sv": {"increment": 1}},
+        }
+        for medication_event_id in medication_event_ids:
+            updates[f"user_events/{user_id}/{medication_event_id}"] = None
+        # Seeded while the medication still exists, so the decrement in the same update counts it out.
+        _seed_medication_count(user_id)
+        reference("/").update(updates)
     except ValueError as ex:
         current_app.logger.error(
             f"Error while trying to delete medication {medication_id}: {ex}"
@@ -280,6 +580,8 @@ def delete_medication(user_id: str, medication_id: str):
         )
         raise ex
 
+    unindex_medication(user_id, medication_id)
+
 
 def get_scheduled_medications_for_user(
         user_id: str,
@@ -311,33 +613,137 @@ def get_scheduled_medications_for_user(
         current_app.logger.error(f"Error while trying to retrieve user {user_id}")
         raise FirebaseError(500, "Internal server error")
 
-    medication_ids = list(medications.keys())
-    medication_ids.sort()
-    scheduled_timestamps = []
     start_tkn_medication_id, start_tkn_start_at = parse_start_tkn(start_token, GET_MED_SCHEDULED_TIMES_DELIMITER, 2)
     start_tkn_start_at = datetime.fromisoformat(start_tkn_start_at) if start_tkn_start_at else None
-    nxt_tkn = None
 
-    for medication_id in medication_ids:
-        if medications[medication_id].schedule and (not start_tkn_medication_id or start_tkn_medication_id <= medication_id):
-            tmp_start_at = start_at
+    def scheduled_times() -> Iterator[tuple[datetime, str]]:
+        # Lazy all the way down: croniter_range computes each occurrence only when it is asked for, so taking a page
+        # costs the same however long the time range is.
+        for medication_id in sorted(medications):
+            schedule = medications[medication_id].schedule
+            if not schedule or (start_tkn_medication_id and medication_id < start_tkn_medication_id):
+                continue
+            medication_start_at = start_at
             if start_tkn_start_at and medication_id == start_tkn_medication_id:
-                tmp_start_at = start_tkn_start_at
-            new_dts = croniter_range(tmp_start_at, end_at, medications[medication_id].schedule.to_cron())
-            for dt in new_dts:
-                dt = dt.isoformat()
-                scheduled_timestamps.append((dt, medication_id))
-            if len(scheduled_timestamps) >= limit:
-                scheduled_timestamps = scheduled_timestamps[:limit]
-                nxt_tkn = create_next_token(
-                    [
-                        medication_id,
-                        (datetime.fromisoformat(scheduled_timestamps[-1][0]) + timedelta(microseconds=1)).isoformat()
-                    ],
-                    GET_MED_SCHEDULED_TIMES_DELIMITER
-                )
-                break
+                medication_start_at = start_tkn_start_at
+            # croniter_range walks backwards when its start is after its end.
+            if medication_start_at > end_at:
+                continue
+            for scheduled_at in croniter_range(medication_start_at, end_at, schedule.to_cron()):
+                yield scheduled_at, medication_id
+
+    # One past the page, to tell whether there is a next page.
+    page = list(islice(scheduled_times(), limit + 1))
+    scheduled_timestamps = [(scheduled_at.isoformat(), medication_id) for scheduled_at, medication_id in page[:limit]]
+    nxt_tkn = None
+    if len(page) > limit:
+        last_scheduled_at, last_medication_id = page[limit - 1]
+        nxt_tkn = create_next_token(
+            [last_medication_id, (last_scheduled_at + timedelta(microseconds=1)).isoformat()],
+            GET_MED_SCHEDULED_TIMES_DELIMITER
+        )
+
+    return scheduled_timestamps, nxt_tkn
+
+
+def get_scheduled_medication_timeline(
+        user_id: str,
+        start_at: datetime,
+        end_at: datetime,
+        limit: int = MAX_MEDICATION_SCHEDULED_TIMES_PER_PAGE,
+        start_token: str = None
+) -> tuple[list[tuple[str, str]], str | None]:
+    """
+    Retrieves scheduled medication times for a user within a given time range, across all medications in time order.
+    Each medication's times are expanded lazily and merged with a heap, so a page costs O(limit · log M) for M
+    medications, however long the time range is or how many pages came before it.
+
+    Args:
+        user_id: (str) UID for the user.
+        start_at: (datetime) Start of the time range.
+        end_at: (datetime) End of the time range.
+        limit: (int) Maximum number of scheduled times to retrieve. Optional.
+        start_token: (str) Token to start retrieving scheduled times from. Optional.
+
+    Returns:
+        tuple: A list of tuples including the timestamp and medication id, ordered by timestamp then medication id, and
+        the next token to use for pagination.
+
+    Raises:
+        InvalidRequestError: If the start token is invalid.
+        FirebaseError: If an error occurs while interacting with the database.
+        ResourceNotFoundError: If the user does not exist.
+    """
+    position = parse_schedule_timeline_token(start_token)
+
+    try:
+        medications = User.from_dict(get_user(user_id)).medications
+    except (ValueError, TypeError):
+        current_app.logger.error(f"Error while trying to retrieve user {user_id}")
+        raise FirebaseError(500, "Internal server error")
+
+    def scheduled_times(medication_id: str, schedule: Schedule) -> Iterator[tuple[datetime, str]]:
+        medication_start_at = start_at
+        if position:
+            # Resume after the last time returned: a medication ordered at or before it at that time has already had
+            # its time returned, one ordered after it has not.
+            last_scheduled_at, last_medication_id = position
+            medication_start_at = last_scheduled_at
+            if medication_id <= last_medication_id:
+                medication_start_at += timedelta(microseconds=1)
+        if medication_start_at > end_at:
+            return
+        for scheduled_at in croniter_range(medication_start_at, end_at, schedule.to_cron()):
+            yield scheduled_at, medication_id
+
+    timeline = heapq.merge(*(
+        scheduled_times(medication_id, medication.schedule)
+        for medication_id, medication in medications.items()
+        if medication.schedule
+    ))
+    # One past the page, to tell whether there is a next page.
+    page = list(islice(timeline, limit + 1))
+    scheduled_timestamps = [(scheduled_at.isoformat(), medication_id) for scheduled_at, medication_id in page[:limit]]
+    nxt_tkn = create_schedule_timeline_token(*page[limit - 1]) if len(page) > limit else None
 
     return scheduled_timestamps, nxt_tkn
 
 
+def create_schedule_timeline_token(scheduled_at: datetime, medication_id: str) -> str:
+    """
+    Creates a token for the next page of a scheduled medication timeline.
+
+    Args:
+        scheduled_at: (datetime) The last scheduled time returned.
+        medication_id: (str) The medication the last scheduled time belongs to.
+
+    Returns:
+        str: The next token.
+    """
+    return encode_cursor(
+        create_next_token([scheduled_at.isoformat(), medication_id], GET_MED_SCHEDULED_TIMES_DELIMITER)
+    )
+
+
+def parse_schedule_timeline_token(start_token: str | None) -> tuple[datetime, str] | None:
+    """
+    Parses a token created by `create_schedule_timeline_token`.
+
+    Args:
+        start_token: (str | None) The token, or None for the first page.
+
+    Returns:
+        tuple[datetime, str] | None: The last scheduled time returned and its medication ID, or None for the first page.
+
+    Raises:
+        InvalidRequestError: If the token is invalid.
+    """
+    if not start_token:
+        return None
+    try:
+        scheduled_at, medication_id = decode_cursor(start_token).split(GET_MED_SCHEDULED_TIMES_DELIMITER, 1)
+        return datetime.fromisoformat(scheduled_at), medication_id
+    except ValueError:
+        raise InvalidRequestError("Invalid next_token.")
+
+
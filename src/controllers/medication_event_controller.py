@@ -1,17 +1,21 @@
-from datetime import datetime, timedelta
+import heapq
+import json
+from datetime import datetime, timedelta, timezone
+from itertools import islice
 
-from firebase_admin import db
 from firebase_admin.exceptions import FirebaseError
 from flask import current_app
 
-from src.controllers.medication_controller import get_medication
-from src.controllers.user_controller import get_user
+from src.controllers.medication_controller import get_medication, get_medication_ids
+from src.database.data_access import fan_out, reference
 from src.models.MedicationEvent import MedicationEvent
-from src.models.User import User
 from src.models.errors.invalid_request_error import InvalidRequestError
 from src.models.errors.resource_not_found_error import ResourceNotFoundError
-from src.utils.constants import GET_MED_EVENTS_FOR_USER_NEXT_TOKEN_DELIMITER, MAX_MEDICATION_EVENTS_PER_PAGE
-from src.utils.pagination import parse_start_tkn
+from src.utils.constants import (
+    GET_MED_EVENTS_FOR_USER_NEXT_TOKEN_DELIMITER, MAX_MEDICATION_EVENTS_PER_BATCH, MAX_MEDICATION_EVENTS_PER_PAGE
+)
+from src.utils.pagination import decode_cursor, encode_cursor, parse_start_tkn
+from src.utils.push_id import derive_push_id, generate_push_id
 
 
 def get_medication_event(user_id: str, medication_id: str, medication_event_id: str) -> MedicationEvent | None:
@@ -32,7 +36,11 @@ def get_medication_event(user_id: str, medication_id: str, medication_event_id:
         ValueError: If the medication event is not a dictionary.
     """
     try:
-        medication_event_data = db.reference(f"/medication_events/{medication_id}/{medication_event_id}").get()
+        medication_event_data = reference(
+            "/medication_events/{medication_id}/{medication_event_id}",
+            medication_id=medication_id,
+            medication_event_id=medication_event_id,
+        ).get()
     except (ValueError, FirebaseError) as ex:
         current_app.logger.error(
             f"Failed to retrieve medication event {medication_event_id} for medication {medication_id}: {ex}"
@@ -80,47 +88,316 @@ def get_medication_events_for_user(
         FirebaseError: If an error occurs while interacting with the database.
         ValueError: If the input to create the next_token is invalid.
     """
-    # TODO: Use `get_medications` to get a user's medications.
-    #  Using `get_user` for now until `get_medications` is stable.
+    # medication_ids are sorted to ensure consistent pagination
+    start_token_medication_id, start_token_end_at = parse_start_tkn(start_token, GET_MED_EVENTS_FOR_USER_NEXT_TOKEN_DELIMITER, 2)
+    medication_ids = [
+        medication_id for medication_id in get_medication_ids(user_id)
+        if start_token_medication_id is None or medication_id >= start_token_medication_id
+    ]
+
+    def get_events(medication_id: str) -> list[MedicationEvent]:
+        query_end_at = start_token_end_at if medication_id == start_token_medication_id else end_at
+        return get_medication_events_for_medication(medication_id, start_at, query_end_at, limit)
+
+    # The medications are queried concurrently, each for a full page since how many events the earlier medications
+    # contribute is not known up front. The results are consumed in order, and the queries not yet started are
+    # cancelled once the page is full.
+    medication_events = []
+    last_medication_id = None
+    results = fan_out(get_events, medication_ids)
     try:
-        user = User.from_dict(get_user(user_id))
-    except (ValueError, TypeError) as ex:
-        current_app.logger.error(f"Failed to retrieve user {user_id}: {ex}")
-        raise FirebaseError(500, f"Failed to retrieve user {user_id}")
+        for medication_id, events in zip(medication_ids, results):
+            # Equivalent to having queried the medication for only the events still needed.
+            medication_events.extend(events[-(limit - len(medication_events)):])
+            if len(medication_events) == limit:
+                last_medication_id = medication_id
+                break
+    except ValueError as ex:
+        current_app.logger.error(f"Failed to retrieve medication events for user {user_id}: {ex}")
+        raise FirebaseError(500, "Failed to retrieve medication events")
+    finally:
+        results.close()
 
-    # sort medication_ids to ensure consistent pagination
-    medication_ids = list(user.medications.keys())
-    medication_ids.sort()
-    medication_events = []
-    start_token_medication_id, start_token_end_at = parse_start_tkn(start_token, GET_MED_EVENTS_FOR_USER_NEXT_TOKEN_DELIMITER, 2)
+    if last_medication_id is not None:
+        try:
+            next_token = create_next_tkn_for_medication_events_for_user(
+                last_medication_id, medication_events[-1].timestamp + timedelta(microseconds=-1)
+            )
+        except ValueError as ex:
+            current_app.logger.error(f"Failed to create next token for medication events: {ex}")
+            raise ex
+        return medication_events, next_token
+    return medication_events, None
 
-    for medication_id in medication_ids:
-        if start_token_medication_id is None or medication_id >= start_token_medication_id:
-            if medication_id == start_token_medication_id:
-                query_end_at = start_token_end_at
-            else:
-                query_end_at = end_at
-
-            try:
-                medication_events.extend(
-                    get_medication_events_for_medication(
-                        medication_id, start_at, query_end_at, limit - len(medication_events)
-                    )
-                )
-            except ValueError as ex:
-                current_app.logger.error(f"Failed to retrieve medication events for medication {medication_id}: {ex}")
-                raise FirebaseError(500, "Failed to retrieve medication events")
 
-            if len(medication_events) == limit:
-                try:
-                    next_token = create_next_tkn_for_medication_events_for_user(
-                        medication_id, medication_events[-1].timestamp + timedelta(microseconds=-1)
-                    )
-                except ValueError as ex:
-                    current_app.logger.error(f"Failed to create next token for medication events: {ex}")
-                    raise ex
-                return medication_events, next_token
-    return medication_events, None
+def get_medication_event_timeline(
+        user_id: str,
+        start_at: datetime = datetime.min,
+        end_at: datetime = datetime.utcnow(),
+        limit: int = MAX_MEDICATION_EVENTS_PER_PAGE,
+        start_token: str = None,
+) -> tuple[list[MedicationEvent], str | None]:
+    """
+    Retrieves a user's medication events from a specified range as one timeline across all their medications, newest
+    first. Once the user's event index has been built, a page is found with a single range query on it, however many
+    medications the user has. Until then, each medication's events are read and merged, so events created before the
+    index existed are still returned.
+
+    Args:
+        user_id: (str) The user's ID.
+        start_at: (datetime) The start date for the range of events to retrieve. Optional.
+        end_at: (datetime) The end date for the range of events to retrieve. Optional.
+        limit: (int) The maximum number of events to retrieve. Optional.
+        start_token: (str) The token to retrieve the next page of events. Optional.
+
+    Returns:
+        tuple[list[MedicationEvent], str | None]: A list of medication events, newest first, and the next token for
+        pagination, or None if there are no more events.
+
+    Raises:
+        InvalidRequestError: If the request or the start token is invalid.
+        FirebaseError: If an error occurs while interacting with the database.
+    """
+    if start_at > end_at:
+        current_app.logger.error(f"Invalid date range: {start_at} > {end_at}")
+        raise InvalidRequestError("Invalid date range")
+
+    if not 0 < limit <= MAX_MEDICATION_EVENTS_PER_PAGE:
+        current_app.logger.error(f"Invalid limit value: {limit}")
+        raise InvalidRequestError(
+            f"Invalid limit value. "
+            f"Please use a positive integer value that is less than or equal to {MAX_MEDICATION_EVENTS_PER_PAGE}."
+        )
+
+    # A token is only ever continued by the path that created it, so the index being built part way through paging
+    # does not change the order of the timeline.
+    position = parse_timeline_token(start_token)
+    if isinstance(position, dict) or (position is None and not user_event_index_built(user_id)):
+        return _get_merged_medication_event_timeline(user_id, start_at, end_at, limit, position or {})
+    return _get_indexed_medication_event_timeline(user_id, start_at, end_at, limit, position)
+
+
+def _get_indexed_medication_event_timeline(
+        user_id: str, start_at: datetime, end_at: datetime, limit: int, position: tuple[datetime, int] | None
+) -> tuple[list[MedicationEvent], str | None]:
+    """
+    Reads a page of the timeline from the user's event index, then its events concurrently. Events with the same
+    timestamp are in the index's order, by ID.
+    """
+    # A range query cannot start part way through the events sharing a timestamp, so the token holds the timestamp of
+    # the last event returned and how many events at that timestamp were returned, and those are read again and dropped.
+    skipped = 0
+    if position is not None:
+        end_at, skipped = position
+    entries = get_user_event_entries(user_id, start_at, end_at, limit + skipped + 1)
+    entries = entries[::-1][skipped:]
+    page = entries[:limit]
+
+    def get_event(entry: tuple[str, str, datetime]) -> dict | None:
+        medication_event_id, medication_id, _ = entry
+        return reference(
+            "/medication_events/{medication_id}/{medication_event_id}",
+            medication_id=medication_id,
+            medication_event_id=medication_event_id,
+        ).get()
+
+    try:
+        medication_events = [
+            MedicationEvent.from_dict(medication_event_data)
+            for medication_event_data in fan_out(get_event, page)
+            # An entry can briefly outlive its event if the index is rebuilt while events are deleted.
+            if medication_event_data
+        ]
+    except (ValueError, TypeError, AttributeError) as ex:
+        current_app.logger.error(f"Failed to retrieve medication events for user {user_id}: {ex}")
+        raise FirebaseError(500, "Failed to retrieve medication events")
+
+    if len(entries) <= limit:
+        return medication_events, None
+
+    last_timestamp = page[-1][2]
+    returned_at_last_timestamp = sum(1 for _, _, timestamp in page if timestamp == last_timestamp)
+    if position is not None and last_timestamp == position[0]:
+        returned_at_last_timestamp += skipped
+    return medication_events, create_timeline_token(last_timestamp, returned_at_last_timestamp)
+
+
+def _get_merged_medication_event_timeline(
+        user_id: str,
+        start_at: datetime,
+        end_at: datetime,
+        limit: int,
+        positions: dict[str, tuple[datetime, str] | None]
+) -> tuple[list[MedicationEvent], str | None]:
+    """
+    Reads each medication's events newest first in chunks, and merges the chunks with a heap, so a page only reads
+    about its share of events from each medication. The next token records, for each medication, the last event
+    returned from it.
+    """
+    medication_ids = [
+        medication_id for medication_id in get_medication_ids(user_id) if positions.get(medication_id, ()) is not None
+    ]
+    # Sized so the first chunks fill the page when events are spread evenly across medications. A medication with
+    # more than its share is read further, in growing chunks, only if the merge reaches the end of its chunk.
+    chunk_size = min(-(-limit // max(len(medication_ids), 1)) + 1, MAX_MEDICATION_EVENTS_PER_PAGE)
+    streams = [
+        _TimelineStream(medication_id, start_at, end_at, positions.get(medication_id), chunk_size)
+        for medication_id in medication_ids
+    ]
+
+    try:
+        for stream, chunk in zip(streams, fan_out(_TimelineStream.read_chunk, streams)):
+            stream.chunk = chunk
+        timeline = heapq.merge(*streams, key=_timeline_order, reverse=True)
+        medication_events = list(islice(timeline, limit))
+        has_more = next(timeline, None) is not None
+    except ValueError as ex:
+        current_app.logger.error(f"Failed to retrieve medication events for user {user_id}: {ex}")
+        raise FirebaseError(500, "Failed to retrieve medication events")
+
+    if not has_more:
+        return medication_events, None
+
+    for medication_event in medication_events:
+        positions[medication_event.medication_id] = (medication_event.timestamp, medication_event.medication_event_id)
+    for stream in streams:
+        # Medications with nothing left to read are marked done, so later pages skip them.
+        if stream.finished and (stream.last_event is None or positions.get(stream.medication_id) == (
+                stream.last_event.timestamp, stream.last_event.medication_event_id)):
+            positions[stream.medication_id] = None
+    return medication_events, create_merged_timeline_token(positions)
+
+
+def _timeline_order(medication_event: MedicationEvent) -> tuple[datetime, str, str]:
+    return medication_event.timestamp, medication_event.medication_id, medication_event.medication_event_id
+
+
+class _TimelineStream:
+    """
+    A medication's events in a range, newest first, read lazily in chunks that double in size up to the maximum page
+    size. Events at or after the position, the timestamp and ID of the last event already returned, are skipped.
+    """
+
+    def __init__(
+            self,
+            medication_id: str,
+            start_at: datetime,
+            end_at: datetime,
+            position: tuple[datetime, str] | None,
+            chunk_size: int
+    ):
+        self.medication_id = medication_id
+        self.start_at = start_at
+        self.end_at = position[0] if position else end_at
+        self.position = position
+        # The first chunk also reads back the event at the position.
+        self.chunk_size = min(chunk_size + 1, MAX_MEDICATION_EVENTS_PER_PAGE) if position else chunk_size
+        self.chunk: list[MedicationEvent] | None = None
+        self.exhausted = False
+        self.finished = False
+        self.last_event: MedicationEvent | None = None
+
+    def read_chunk(self) -> list[MedicationEvent]:
+        """
+        Reads the next chunk, oldest first, and moves the stream's bounds past it.
+        """
+        events = get_medication_events_for_medication(self.medication_id, self.start_at, self.end_at, self.chunk_size)
+        self.exhausted = len(events) < self.chunk_size
+        chunk = [event for event in events if self.position is None or _before(event, self.position)]
+        if chunk:
+            self.end_at = chunk[0].timestamp
+            self.position = (chunk[0].timestamp, chunk[0].medication_event_id)
+        elif not self.exhausted and self.chunk_size == MAX_MEDICATION_EVENTS_PER_PAGE:
+            # More events share the position's timestamp than fit in a chunk, and a query cannot start part way through
+            # them, so the rest of them are skipped.
+            current_app.logger.error(f"Skipping events of medication {self.medication_id} at {self.end_at}")
+            self.end_at -= timedelta(microseconds=1)
+            self.position = None
+        self.chunk_size = min(self.chunk_size * 2, MAX_MEDICATION_EVENTS_PER_PAGE)
+        return chunk
+
+    def __iter__(self):
+        chunk = self.chunk if self.chunk is not None else self.read_chunk()
+        while True:
+            for event in reversed(chunk):
+                self.last_event = event
+                yield event
+            if self.exhausted:
+                break
+            chunk = self.read_chunk()
+        self.finished = True
+
+
+def _before(medication_event: MedicationEvent, position: tuple[datetime, str]) -> bool:
+    return (medication_event.timestamp, medication_event.medication_event_id) < position
+
+
+def create_timeline_token(timestamp: datetime, returned: int) -> str:
+    """
+    Creates a token for the next page of a medication event timeline read from the user's event index.
+
+    Args:
+        timestamp: (datetime) The timestamp of the last event returned.
+        returned: (int) How many events with that timestamp have been returned.
+
+    Returns:
+        str: The next token.
+    """
+    return encode_cursor(json.dumps([timestamp.isoformat(), returned], separators=(",", ":")))
+
+
+def create_merged_timeline_token(positions: dict[str, tuple[datetime, str] | None]) -> str:
+    """
+    Creates a token for the next page of a medication event timeline merged from the user's medications.
+
+    Args:
+        positions: (dict[str, tuple[datetime, str] | None]) For each medication, the timestamp and ID of the last event
+            returned from it, or None if it has no more events.
+
+    Returns:
+        str: The next token.
+    """
+    return encode_cursor(json.dumps(
+        {
+            medication_id: [position[0].isoformat(), position[1]] if position else 0
+            for medication_id, position in positions.items()
+        },
+        separators=(",", ":"),
+    ))
+
+
+def parse_timeline_token(
+        start_token: str | None
+) -> tuple[datetime, int] | dict[str, tuple[datetime, str] | None] | None:
+    """
+    Parses a token created by `create_timeline_token` or `create_merged_timeline_token`.
+
+    Args:
+        start_token: (str | None) The token, or None for the first page.
+
+    Returns:
+        tuple[datetime, int] | dict[str, tuple[datetime, str] | None] | None: The timestamp and count in an index
+        token, the position of each medication in a merged token, or None for the first page.
+
+    Raises:
+        InvalidRequestError: If the token is invalid.
+    """
+    if not start_token:
+        return None
+    try:
+        position = json.loads(decode_cursor(start_token))
+        if isinstance(position, dict):
+            return {
+                medication_id: (datetime.fromisoformat(medication_position[0]), medication_position[1])
+                if medication_position else None
+                for medication_id, medication_position in position.items()
+            }
+        timestamp, returned = position
+        if not isinstance(returned, int) or returned < 1:
+            raise ValueError(f"Invalid count: {returned}")
+        return datetime.fromisoformat(timestamp), returned
+    except (ValueError, TypeError, KeyError, IndexError, AttributeError):
+        raise InvalidRequestError("Invalid start_token.")
 
 
 def get_medication_events_for_medication_controller(
@@ -133,10 +410,11 @@ def get_medication_events_for_medication_controller(
 ) -> tuple[list[MedicationEvent], str | None]:
     """
     Uses the get_medication_events_for_medication function to retrieve medication events for a medication. Handles the
-    authorization and pagination of the data retrieval.
+    authorization and pagination of the data retrieval. Callers reading another user's events must check that the
+    requesting user may read them with `authorize_user_data_access` first.
 
     Args:
-        user_id: (str) The user's ID.
+        user_id: (str) The ID of the user owning the medication.
         medication_id: (str) The medication's ID.
         start_at: (datetime) The start date for the range of events to retrieve. Optional.
         end_at: (datetime) The end date for the range of events to retrieve. Optional.
@@ -150,15 +428,7 @@ def get_medication_events_for_medication_controller(
         InvalidRequestError: If the request is invalid.
         FirebaseError: If an error occurs while interacting with the database.
     """
-    # TODO: Use `get_medications` to get a user's medications.
-    #  Using `get_user` for now until `get_medications` is stable.
-    try:
-        user = User.from_dict(get_user(user_id))
-    except (ValueError, TypeError) as ex:
-        current_app.logger.error(f"Failed to retrieve user {user_id}: {ex}")
-        raise FirebaseError(500, f"Failed to retrieve user {user_id}")
-    # TODO: add authorization for monitoring users to access their monitored users events
-    if medication_id not in user.medications.keys():
+    if medication_id not in get_medication_ids(user_id):
         raise InvalidRequestError("User is not authorized to access events for this medication")
 
     if start_at > end_at:
@@ -222,7 +492,7 @@ def get_medication_events_for_medication(
         )
 
     try:
-        medication_events = db.reference(f"/medication_events/{medication_id}")\
+        medication_events = reference("/medication_events/{medication_id}", medication_id=medication_id)\
             .order_by_child("timestamp")\
             .start_at(start_at.isoformat())\
             .end_at(end_at.isoformat())\
@@ -241,9 +511,142 @@ def get_medication_events_for_medication(
     return [MedicationEvent.from_dict(medication_event_data) for medication_event_data in medication_events.values()]
 
 
+def get_event_version_if_changed(user_id: str, etag: str | None) -> tuple[bool, str | None]:
+    """
+    Checks whether any of a user's medication events changed since the caller read them. Every write to a user's
+    events also increments /metadata/event_versions/{user_id}, so its database ETag changes with the events, and
+    checking it costs a read of a single number, or nothing if it is unchanged.
+
+    Args:
+        user_id: (str) The user's ID.
+        etag: (str | None) The ETag the caller received with the events, or None if it has none.
+
+    Returns:
+        tuple[bool, str | None]: Whether the events may have changed, and the current ETag to send with them.
+
+    Raises:
+        FirebaseError: If an error occurs while interacting with the database.
+    """
+    try:
+        changed, _, etag = reference("/metadata/event_versions/{user_id}", user_id=user_id).conditional_get(etag)
+    except (FirebaseError, ValueError) as ex:
+        current_app.logger.error(f"Failed to retrieve the event version of user {user_id}: {ex}")
+        raise FirebaseError(500, "Failed to retrieve medication events")
+    return changed, etag
+
+
+def get_user_event_entries(
+        user_id: str,
+        start_at: datetime = datetime.min,
+        end_at: datetime = datetime.utcnow(),
+        limit: int = MAX_MEDICATION_EVENTS_PER_PAGE
+) -> list[tuple[str, str, datetime]]:
+    """
+    Retrieves the entries of a user's event index from a specified range, with a single query however many medications
+    the user has. The entries are ordered by timestamp in ascending order, and are the latest ones in the range if there
+    are more than the limit. The entries are small, so unlike event queries the limit is not capped at a page.
+
+    Args:
+        user_id: (str) The user's ID.
+        start_at: (datetime) The start date for the range of events to retrieve. Optional.
+        end_at: (datetime) The end date for the range of events to retrieve. Optional.
+        limit: (int) The maximum number of entries to retrieve. Optional.
+
+    Returns:
+        list[tuple[str, str, datetime]]: The ID, medication ID and timestamp of each event.
+
+    Raises:
+        InvalidRequestError: If the request is invalid.
+        FirebaseError: If an error occurs while interacting with the database.
+
+    Notes:
+        /user_events/{user_id} is written in the same update as each event, so it holds every event written since it
+        was introduced, and `rebuild_user_event_index` adds older events. In Firebase, the rules need
+        `".indexOn": "timestamp"` on /user_events/$user_id.
+    """
+    if start_at > end_at:
+        current_app.logger.error(f"Invalid date range: {start_at} > {end_at}")
+        raise InvalidRequestError("Invalid date range")
+
+    if limit < 1:
+        current_app.logger.error(f"Invalid limit value: {limit}")
+        raise InvalidRequestError("Invalid limit value. Please use a positive integer value.")
+
+    try:
+        user_events = reference("/user_events/{user_id}", user_id=user_id)\
+            .order_by_child("timestamp")\
+            .start_at(start_at.isoformat())\
+            .end_at(end_at.isoformat())\
+            .limit_to_last(limit)\
+            .get()
+    except (FirebaseError, ValueError) as ex:
+        current_app.logger.error(f"Failed to retrieve event index for user {user_id}: {ex}")
+        raise FirebaseError(500, "Failed to retrieve medication events")
+
+    try:
+        return [
+            (medication_event_id, entry["medication_id"], datetime.fromisoformat(entry["timestamp"]))
+            for medication_event_id, entry in (user_events or {}).items()
+        ]
+    except (KeyError, TypeError, ValueError) as ex:
+        current_app.logger.error(f"Invalid event index for user {user_id}: {ex}")
+        raise FirebaseError(500, "Failed to retrieve medication events")
+
+
+def user_event_entry(medication_event: MedicationEvent) -> dict:
+    """
+    Returns the entry of a medication event in its user's event index, /user_events/{user_id}/{medication_event_id}.
+    The medication ID is the one the event is stored under.
+    """
+    return {"medication_id": medication_event.medication_id, "timestamp": medication_event.timestamp.isoformat()}
+
+
+def user_event_index_built(user_id: str) -> bool:
+    """
+    Returns whether a user's event index holds all their events, which is so for users created since the index was
+    introduced, and for others once `rebuild_user_event_index` has run for them.
+    """
+    return reference("/metadata/user_events_built/{user_id}", user_id=user_id).get() is True
+
+
+def rebuild_user_event_index(user_id: str) -> int:
+    """
+    Rebuilds a user's event index from the events of each of their medications, and marks it built. Needed once for
+    users with events created before the index existed. The entries are merged into the index, so events written while
+    it runs keep theirs.
+
+    Args:
+        user_id: (str) The user's ID.
+
+    Returns:
+        int: The number of events indexed.
+
+    Raises:
+        FirebaseError: If an error occurs while interacting with the database.
+        ValueError: If the stored events are not dictionaries.
+    """
+    def get_entries(medication_id: str) -> dict:
+        events = reference("/medication_events/{medication_id}", medication_id=medication_id).get() or {}
+        if not isinstance(events, dict):
+            raise ValueError(f"Expected a dictionary from Firebase, but got a different type. Got: {events}")
+        return {
+            medication_event_id: {"medication_id": medication_id, "timestamp": event_data.get("timestamp")}
+            for medication_event_id, event_data in events.items()
+            if isinstance(event_data, dict) and event_data.get("user_id") == user_id
+        }
+
+    entries = {}
+    for medication_entries in fan_out(get_entries, get_medication_ids(user_id)):
+        entries.update(medication_entries)
+    updates = {f"user_events/{user_id}/{medication_event_id}": entry for medication_event_id, entry in entries.items()}
+    updates[f"metadata/user_events_built/{user_id}"] = True
+    reference("/").update(updates)
+    return len(entries)
+
+
 def create_medication_event(user_id: str, medication_id: str, medication_event_json_dict: dict) -> MedicationEvent:
     """
-    Creates a new medication event in the database.
+    Creates a new medication event in the database, and its entry in the user's event index.
 
     Args:
         user_id: (str) The user's ID.
@@ -274,12 +677,7 @@ def create_medication_event(user_id: str, medication_id: str, medication_event_j
         current_app.logger.error(f"Medication {medication_id} does not exist for user {user_id}")
         raise ResourceNotFoundError(f"Medication {medication_id} does not exist for user {user_id}")
 
-    try:
-        medication_event_id = db.reference(f"/medication_events/{medication_id}").push().key
-    except FirebaseError as ex:
-        current_app.logger.error(f"Firebase failure while trying to generate medication event ID: {ex}")
-        raise ex
-
+    medication_event_id = generate_push_id()
     new_medication_event = MedicationEvent(
         medication_event_id=medication_event_id,
         user_id=user_id,
@@ -288,7 +686,11 @@ def create_medication_event(user_id: str, medication_id: str, medication_event_j
         dosage=dosage
     )
     try:
-        db.reference(f"/medication_events/{medication_id}/{medication_event_id}").set(new_medication_event.to_dict())
+        reference("/").update({
+            f"medication_events/{medication_id}/{medication_event_id}": new_medication_event.to_dict(),
+            f"user_events/{user_id}/{medication_event_id}": user_event_entry(new_medication_event),
+            f"metadata/event_versions/{user_id}": {".sv": {"increment": 1}},
+        })
     except (ValueError, TypeError) as ex:
         current_app.logger.error(
             f"Failed to store medication event {medication_event_id} for medication {medication_id}: {ex}"
@@ -298,6 +700,96 @@ def create_medication_event(user_id: str, medication_id: str, medication_event_j
     return new_medication_event
 
 
+def create_medication_events(user_id: str, medication_event_json_dicts: list) -> list[dict]:
+    """
+    Creates a batch of medication events, such as the taps a device buffered while offline, across any of the user's
+    medications. The medications are checked with one read, and the valid events are written with one multi-path
+    update, along with their entries in the user's event index.
+
+    Each event's ID is derived from the user, the medication and the timestamp, so a batch that is sent again, or an
+    event repeated within a batch, writes the same event rather than a new one.
+
+    Args:
+        user_id: (str) The user's ID.
+        medication_event_json_dicts: (list) The events' data, each with a medication_id, a timestamp and optionally a
+            dosage.
+
+    Returns:
+        list[dict]: The result of each event, in order: whether it succeeded, its status ("created", "duplicate",
+        "invalid" or "not_found"), and its ID or an error message.
+
+    Raises:
+        InvalidRequestError: If the batch is not a list, or is empty or too large.
+        ResourceNotFoundError: If the user does not exist.
+        FirebaseError: If an error occurs while interacting with the database.
+    """
+    if not isinstance(medication_event_json_dicts, list) or not medication_event_json_dicts:
+        raise InvalidRequestError("Expected a non-empty list of medication events")
+    if len(medication_event_json_dicts) > MAX_MEDICATION_EVENTS_PER_BATCH:
+        raise InvalidRequestError(
+            f"Too many medication events. Please send at most {MAX_MEDICATION_EVENTS_PER_BATCH} per batch."
+        )
+
+    medication_ids = set(get_medication_ids(user_id))
+
+    results = []
+    updates = {}
+    for medication_event_json_dict in medication_event_json_dicts:
+        try:
+            medication_id = medication_event_json_dict["medication_id"]
+            timestamp = datetime.fromisoformat(medication_event_json_dict["timestamp"])
+            dosage = medication_event_json_dict.get("dosage", None)
+            if not isinstance(medication_id, str):
+                raise TypeError("medication_id must be a string")
+        except (ValueError, TypeError, KeyError, AttributeError) as ex:
+            results.append({"success": False, "status": "invalid", "message": f"Invalid medication event: {ex}"})
+            continue
+
+        if medication_id not in medication_ids:
+            results.append({
+                "success": False,
+                "status": "not_found",
+                "message": f"Medication {medication_id} does not exist for user {user_id}",
+            })
+            continue
+
+        medication_event_id = derive_push_id(
+            _epoch_millis(timestamp), user_id, medication_id, timestamp.isoformat()
+        )
+        path = f"medication_events/{medication_id}/{medication_event_id}"
+        if path in updates:
+            results.append({"success": True, "status": "duplicate", "medication_event_id": medication_event_id})
+            continue
+
+        medication_event = MedicationEvent(
+            medication_event_id=medication_event_id,
+            user_id=user_id,
+            medication_id=medication_id,
+            timestamp=timestamp,
+            dosage=dosage,
+        )
+        updates[path] = medication_event.to_dict()
+        updates[f"user_events/{user_id}/{medication_event_id}"] = user_event_entry(medication_event)
+        results.append({"success": True, "status": "created", "medication_event_id": medication_event_id})
+
+    if updates:
+        updates[f"metadata/event_versions/{user_id}"] = {".sv": {"increment": 1}}
+        try:
+            reference("/").update(updates)
+        except (ValueError, TypeError) as ex:
+            current_app.logger.error(f"Failed to store a batch of medication events for user {user_id}: {ex}")
+            raise FirebaseError(500, "Failed to store medication events")
+
+    return results
+
+
+def _epoch_millis(timestamp: datetime) -> int:
+    # Naive timestamps are taken as UTC, as the service stores them.
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1000)
+
+
 def update_medication_event(
         user_id: str, medication_id: str, medication_event_id: str, medication_event_json_dict: dict
 ) -> dict:
@@ -314,12 +806,16 @@ def update_medication_event(
         dict: The updated medication event data.
 
     Raises:
-        InvalidRequestError: If the request is invalid.
+        InvalidRequestError: If the request is invalid, or changes the event's medication.
         ResourceNotFoundError: If the medication event does not exist.
         FirebaseError: If an error occurs while interacting with the database.
     """
+    # An event is stored and indexed under its medication, so it cannot be moved to another one.
+    if medication_event_json_dict.get("medication_id", medication_id) != medication_id:
+        raise InvalidRequestError("A medication event cannot be moved to another medication")
+
     updated_medication_event_data = {}
-    keys_to_copy = ["medication_id", "timestamp", "dosage"]
+    keys_to_copy = ["timestamp", "dosage"]
     for key in keys_to_copy:
         if key in medication_event_json_dict:
             updated_medication_event_data[key] = medication_event_json_dict[key]
@@ -327,6 +823,14 @@ def update_medication_event(
     if not updated_medication_event_data:
         raise InvalidRequestError("No valid fields to update")
 
+    timestamp = None
+    if "timestamp" in updated_medication_event_data:
+        try:
+            timestamp = datetime.fromisoformat(updated_medication_event_data["timestamp"])
+        except (ValueError, TypeError):
+            raise InvalidRequestError("Invalid timestamp")
+        updated_medication_event_data["timestamp"] = timestamp.isoformat()
+
     try:
         medication_event = get_medication_event(user_id, medication_id, medication_event_id)
     except ValueError:
@@ -336,8 +840,17 @@ def update_medication_event(
     if medication_event is None:
         raise ResourceNotFoundError(f"Medication event {medication_event_id} not found")
 
+    updates = {
+        f"medication_events/{medication_id}/{medication_event_id}/{key}": value
+        for key, value in updated_medication_event_data.items()
+    }
+    if timestamp is not None:
+        # The whole entry is written, as an event created before the index existed has none to update.
+        medication_event.timestamp = timestamp
+        updates[f"user_events/{user_id}/{medication_event_id}"] = user_event_entry(medication_event)
+    updates[f"metadata/event_versions/{user_id}"] = {".sv": {"increment": 1}}
     try:
-        db.reference(f"/medication_events/{medication_id}/{medication_event_id}").update(updated_medication_event_data)
+        reference("/").update(updates)
     except (ValueError, FirebaseError) as ex:
         current_app.logger.error(f"Error while trying to update medication event {medication_event_id}: {ex}")
         raise FirebaseError(500, "Failed to update medication event")
@@ -369,8 +882,12 @@ def delete_medication_event(user_id: str, medication_id: str, medication_event_i
         raise ResourceNotFoundError(f"Medication event {medication_event_id} not found")
 
     try:
-        db.reference(f"/medication_events/{medication_id}/{medication_event_id}").delete()
-    except FirebaseError as ex:
+        reference("/").update({
+            f"medication_events/{medication_id}/{medication_event_id}": None,
+            f"user_events/{user_id}/{medication_event_id}": None,
+            f"metadata/event_versions/{user_id}": {".sv": {"increment": 1}},
+        })
+    except (ValueError, FirebaseError) as ex:
         current_app.logger.error(f"Failed to delete medication event {medication_event_id}: {ex}")
         raise FirebaseError(500, "Failed to delete medication event")
 
@@ -0,0 +1,266 @@
+import os
+import threading
+import time
+from typing import Callable, Iterator
+
+from firebase_admin.exceptions import FirebaseError
+from flask import Flask, current_app
+
+from src.database.data_access import reference
+from src.utils.constants import USER_SCAN_BATCH_SIZE
+from src.utils.search import medication_names
+from src.utils.trigram_index import TrigramIndex
+
+SEARCH_INDEX_REFRESH_SECONDS = "SEARCH_INDEX_REFRESH_SECONDS"
+
+
+class SearchIndexes:
+    """
+    Trigram indexes over user names and medication names and nicknames, for substring and typo tolerant search.
+
+    The indexes are built at worker start or on the first search from /search_names, which mirrors only the indexed
+    names, and kept current from this worker's writes. The first build on a database whose mirror was never completed
+    completes it from /users with `rebuild_search_names`. Each gunicorn worker keeps its own indexes, so they are rebuilt
+    in the background once they are older than the refresh interval, to pick up other workers' writes.
+    """
+
+    def __init__(self, refresh_seconds: float = 300, clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize empty search indexes
+
+        Args:
+            refresh_seconds: {float} Seconds after a build before the indexes are rebuilt.
+            clock: {Callable[[], float]} Returns a monotonic time in seconds. Optional.
+        """
+        self.refresh_seconds = refresh_seconds
+        self._clock = clock
+        self.users = TrigramIndex()
+        self.medications = TrigramIndex()
+        self.built_at: float | None = None
+        self._lock = threading.Lock()
+        # Held for a whole build, so builds never overlap and each one's replayed writes are kept.
+        self._build_lock = threading.Lock()
+        self._rebuilding = False
+        self._writes_during_rebuild: list[Callable[[], None]] | None = None
+
+    def build(self) -> None:
+        """
+        Rebuilds both indexes from /search_names, reading it a batch at a time, then swaps them in. Writes made while
+        the rebuild runs are replayed onto the new indexes. Waits for a build that is already running.
+
+        Raises:
+            ValueError, FirebaseError: If an error occurs while reading the names.
+        """
+        with self._build_lock:
+            self._build()
+
+    def _build(self) -> None:
+        if not reference("/metadata/search_names_built").get():
+            # Names written before the mirror existed are only in /users.
+            rebuild_search_names()
+
+        with self._lock:
+            self._writes_during_rebuild = []
+        try:
+            users, medications = TrigramIndex(), TrigramIndex()
+            for user_id, names in _scan("/search_names/users"):
+                _add_user(users, user_id, names.get("first_name"), names.get("last_name"))
+            for user_id, medication_names_by_id in _scan("/search_names/medications"):
+                for medication_id, names in medication_names_by_id.items():
+                    _add_medication(medications, user_id, medication_id, names.get("name"), names.get("nickname"))
+        except BaseException:
+            with self._lock:
+                self._writes_during_rebuild = None
+            raise
+
+        with self._lock:
+            self.users, self.medications = users, medications
+            for write in self._writes_during_rebuild:
+                write()
+            self._writes_during_rebuild = None
+            self.built_at = self._clock()
+
+    def ensure_fresh(self, app: Flask) -> None:
+        """
+        Builds the indexes if they have never been built, or starts a background rebuild if they are stale.
+
+        Args:
+            app: (Flask) The app to run a background rebuild in.
+        """
+        if self.built_at is None:
+            with self._build_lock:
+                # Another request may have built them while this one waited.
+                if self.built_at is None:
+                    self._build()
+            return
+        with self._lock:
+            if self._rebuilding or self._clock() - self.built_at < self.refresh_seconds:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild_in_background, args=(app,), daemon=True).start()
+
+    def _rebuild_in_background(self, app: Flask) -> None:
+        try:
+            with app.app_context():
+                self.build()
+        except (ValueError, FirebaseError) as ex:
+            app.logger.error(f"Failed to rebuild search indexes: {ex}")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def apply(self, write: Callable[[], None]) -> None:
+        """
+        Applies a write to the current indexes, and records it for replay if a rebuild is running.
+        """
+        with self._lock:
+            write()
+            if self._writes_during_rebuild is not None:
+                self._writes_during_rebuild.append(write)
+
+
+search_indexes = SearchIndexes(refresh_seconds=float(os.getenv(SEARCH_INDEX_REFRESH_SECONDS, "300")))
+
+
+def _scan(path: str) -> Iterator[tuple[str, dict]]:
+    # Reads the children of a node in key order, a batch at a time.
+    start_key = None
+    while True:
+        query = reference(path).order_by_key()
+        if start_key is not None:
+            query = query.start_at(start_key)
+        batch = list((query.limit_to_first(USER_SCAN_BATCH_SIZE + 1).get() or {}).items())
+        for key, value in batch[:USER_SCAN_BATCH_SIZE]:
+            if isinstance(value, dict):
+                yield key, value
+        if len(batch) <= USER_SCAN_BATCH_SIZE:
+            return
+        start_key = batch[USER_SCAN_BATCH_SIZE][0]
+
+
+def rebuild_search_names() -> int:
+    """
+    Rebuilds /search_names, the mirror of user and medication names the search indexes are built from, from every
+    user, reading /users a batch at a time. Needed once for users written before the mirror existed, which the first
+    build of the search indexes does by itself. Sets /metadata/search_names_built once every user is mirrored.
+
+    Returns:
+        int: The number of users mirrored.
+
+    Raises:
+        ValueError, TypeError, FirebaseError: If an error occurs while reading users or writing the mirror.
+    """
+    mirrored = 0
+    batch = {}
+    for user_id, user_data in _scan("/users"):
+        batch[f"users/{user_id}"] = {
+            "first_name": user_data.get("first_name"),
+            "last_name": user_data.get("last_name"),
+        }
+        batch[f"medications/{user_id}"] = medication_names(user_data.get("medications")) or None
+        mirrored += 1
+        if len(batch) >= 2 * USER_SCAN_BATCH_SIZE:
+            reference("/search_names").update(batch)
+            batch = {}
+    if batch:
+        reference("/search_names").update(batch)
+    reference("/metadata/search_names_built").set(True)
+    return mirrored
+
+
+def _add_user(index: TrigramIndex, user_id: str, first_name: str | None, last_name: str | None) -> None:
+    index.add(user_id, (first_name, last_name), {"user_id": user_id, "first_name": first_name, "last_name": last_name})
+
+
+def _add_medication(
+        index: TrigramIndex, user_id: str, medication_id: str, name: str | None, nickname: str | None
+) -> None:
+    index.add(
+        (user_id, medication_id),
+        (name, nickname),
+        {"medication_id": medication_id, "name": name, "nickname": nickname},
+        scope=user_id,
+    )
+
+
+def index_user(user_id: str, first_name: str | None, last_name: str | None) -> None:
+    """
+    Adds or replaces a user in the user name index.
+    """
+    search_indexes.apply(lambda: _add_user(search_indexes.users, user_id, first_name, last_name))
+
+
+def index_medication(user_id: str, medication_id: str, name: str | None, nickname: str | None) -> None:
+    """
+    Adds or replaces a medication in the medication name index.
+    """
+    search_indexes.apply(lambda: _add_medication(search_indexes.medications, user_id, medication_id, name, nickname))
+
+
+def reindex_medication(user_id: str, medication_id: str, updated_medication_data: dict) -> None:
+    """
+    Applies an update to a medication's name or nickname to the medication name index, keeping the indexed value of
+    whichever was not updated. Medications that are not indexed yet are picked up by the next build.
+    """
+    if "name" not in updated_medication_data and "nickname" not in updated_medication_data:
+        return
+
+    def write():
+        indexed = search_indexes.medications.get((user_id, medication_id))
+        if indexed is not None:
+            _add_medication(
+                search_indexes.medications,
+                user_id,
+                medication_id,
+                updated_medication_data.get("name", indexed["name"]),
+                updated_medication_data.get("nickname", indexed["nickname"]),
+            )
+
+    search_indexes.apply(write)
+
+
+def unindex_medication(user_id: str, medication_id: str) -> None:
+    """
+    Removes a medication from the medication name index.
+    """
+    search_indexes.apply(lambda: search_indexes.medications.remove((user_id, medication_id)))
+
+
+def search_users(query: str, limit: int = 10) -> list[dict]:
+    """
+    Searches user first and last names, tolerating partial words and typos.
+
+    Args:
+        query: (str) The text to search for.
+        limit: (int) Maximum number of users to return.
+
+    Returns:
+        list[dict]: The UID, names and match score of the best matching users, best first.
+
+    Raises:
+        ValueError, FirebaseError: If the index has to be built and an error occurs while reading names.
+    """
+    search_indexes.ensure_fresh(current_app._get_current_object())
+    return [dict(result.payload, score=result.score) for result in search_indexes.users.search(query, limit)]
+
+
+def search_medications(user_id: str, query: str, limit: int = 10) -> list[dict]:
+    """
+    Searches the names and nicknames of a user's medications, tolerating partial words and typos.
+
+    Args:
+        user_id: (str) UID for the user owning the medications.
+        query: (str) The text to search for.
+        limit: (int) Maximum number of medications to return.
+
+    Returns:
+        list[dict]: The ID, name, nickname and match score of the best matching medications, best first.
+
+    Raises:
+        ValueError, FirebaseError: If the index has to be built and an error occurs while reading names.
+    """
+    search_indexes.ensure_fresh(current_app._get_current_object())
+    return [
+        dict(result.payload, score=result.score)
+        for result in search_indexes.medications.search(query, limit, scope=user_id)
+    ]
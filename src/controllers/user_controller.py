@@ -1,40 +1,194 @@
-from firebase_admin import db, exceptions
+from firebase_admin import exceptions
 from flask import current_app
 
+from src.controllers.authorization_controller import relationship_index
+from src.controllers.search_controller import index_user
+from src.database.data_access import fan_out, reference, seed_counter
 from src.models.User import User
 from src.models.errors.invalid_request_error import InvalidRequestError
 from src.models.errors.resource_already_exists_error import ResourceAlreadyExistsError
 from src.models.errors.resource_not_found_error import ResourceNotFoundError
+from src.utils.constants import USER_SCAN_BATCH_SIZE
+from src.utils.pagination import decode_cursor, encode_cursor
+from src.utils.search import (
+    PREFIX_RANGE_END, matches_search, medication_names, name_tokens, user_name_updates, user_search_entries
+)
 
 
-def get_users(offset=0, limit=50, name=None):
+def get_users(start_token: str = None, limit: int = 50, name: str = None) -> tuple[list, int | None, str | None]:
     """
-    Fetches a list of users from the database.
+    Fetches a page of users from the database, ordered by UID. Pages are read from the database with a key range
+    query, so only the requested users are downloaded.
+
+    A name filter matches users having, for every word of the filter, a word of their name starting with it, through
+    the /user_search index. Until `rebuild_user_search_index` has indexed the users created before the index existed,
+    users are scanned instead and matched by a case-insensitive substring of their first or last name, as they were
+    before the index.
+
     Args:
-        start_at: (int) Offset to start at, for cursor-based pagination
+        start_token: (str) The token to retrieve the next page of users. Optional.
         limit: (int) Maximum number of users to fetch
-        name: (str) Filter users by name
+        name: (str) Filter users by name. Optional.
 
     Returns:
-        tuple: The list of users & the total number of users.
+        tuple[list, int | None, str | None]: The page of (UID, user data) pairs, the total number of users & the
+        token for the next page, or None if this is the last page. The total is None when filtering by name, as
+        counting the matches would mean reading all of them.
 
     Raises:
+        InvalidRequestError: If the start token is invalid.
         ValueError, TypeError, exceptions.FirebaseError: If an error occurs while trying to fetch the users.
     """
-    # Fetch all users
-    users = list(db.reference("/users").order_by_key().get().items())
+    try:
+        start_key = decode_cursor(start_token) if start_token else None
+    except ValueError:
+        raise InvalidRequestError("Invalid next_token.")
+
+    search_tokens = name_tokens(name)
+    if search_tokens and not reference("/metadata/user_search_built").get():
+        return _scan_users_by_name(start_key, limit, name)
+    if search_tokens:
+        matches = _search_user_ids(start_key, limit + 1, search_tokens)
+        next_token = encode_cursor(matches[limit][0]) if len(matches) > limit else None
+        # Each user is read once, however many of their index entries matched, and the reads run concurrently.
+        user_ids = list(dict.fromkeys(user_id for _, user_id in matches[:limit]))
+        user_data_list = fan_out(lambda user_id: reference("/users/{user_id}", user_id=user_id).get(), user_ids)
+        users = [
+            (user_id, user_data) for user_id, user_data in zip(user_ids, user_data_list) if user_data is not None
+        ]
+        return users, None, next_token
+
+    users = _get_users_page(start_key, limit + 1)
+    next_token = encode_cursor(users[limit][0]) if len(users) > limit else None
+    return users[:limit], get_user_count(), next_token
+
+
+def get_user_count() -> int:
+    """
+    Fetches the total number of users from the counter at /metadata/user_count, which `create_user` seeds and
+    increments. Until a user has been created, the users are counted with a shallow read of /users instead, without
+    writing the counter.
 
-    # Filter users by name
-    if name:
-        users = [user for user in users if name.lower() in user[1]["first_name"].lower() or name.lower() in user[1]["last_name"].lower()]
+    Returns:
+        int: The total number of users.
 
-    # Determine the total number of users
-    total_users = len(users)
+    Raises:
+        ValueError, TypeError, exceptions.FirebaseError: If an error occurs while trying to fetch the count.
+    """
+    user_count = reference("/metadata/user_count").get()
+    if user_count is not None:
+        return user_count
+    return len(reference("/users").get(shallow=True) or {})
 
-    # Paginate the results
-    users = users[offset:offset + limit]
 
-    return users, total_users
+def seed_user_count() -> int:
+    """
+    Sets the counter at /metadata/user_count to the number of users, from a shallow read of /users. `create_user`
+    seeds a missing counter itself, so this only repairs a counter that has drifted. Users created between the read
+    and the write are not counted.
+
+    Returns:
+        int: The number of users.
+
+    Raises:
+        ValueError, TypeError, exceptions.FirebaseError: If an error occurs while counting the users or writing the
+        counter.
+    """
+    user_count = len(reference("/users").get(shallow=True) or {})
+    reference("/metadata/user_count").set(user_count)
+    return user_count
+
+
+def _get_users_page(start_key: str | None, limit: int) -> list:
+    query = reference("/users").order_by_key()
+    if start_key is not None:
+        query = query.start_at(start_key)
+    return list((query.limit_to_first(limit).get() or {}).items())
+
+
+def _scan_users_by_name(start_key: str | None, limit: int, name: str) -> tuple[list, None, str | None]:
+    """
+    Finds a page of users whose first or last name contains the name, ignoring case, reading /users a batch at a time.
+    Used for name filters until the /user_search index has been built.
+
+    Returns:
+        tuple[list, None, str | None]: The page of (UID, user data) pairs, no total & the token for the next page.
+    """
+    name = name.lower()
+    matches = []
+    while len(matches) <= limit:
+        batch = _get_users_page(start_key, USER_SCAN_BATCH_SIZE + 1)
+        for user_id, user_data in batch[:USER_SCAN_BATCH_SIZE]:
+            names = (user_data.get("first_name"), user_data.get("last_name")) if isinstance(user_data, dict) else ()
+            if any(isinstance(user_name, str) and name in user_name.lower() for user_name in names):
+                matches.append((user_id, user_data))
+        if len(batch) <= USER_SCAN_BATCH_SIZE:
+            break
+        start_key = batch[USER_SCAN_BATCH_SIZE][0]
+    next_token = encode_cursor(matches[limit][0]) if len(matches) > limit else None
+    return matches[:limit], None, next_token
+
+
+def _search_user_ids(start_key: str | None, limit: int, search_tokens: list[str]) -> list[tuple[str, str]]:
+    """
+    Finds users whose names match every search token, with key range queries on the /user_search index for the
+    longest token. A user is only matched through the first of their tokens that starts with that token, so users
+    with several such tokens appear once.
+
+    Returns:
+        list[tuple[str, str]]: Up to `limit` pairs of index key and UID, in index key order.
+    """
+    prefix = max(search_tokens, key=len)
+    start_key = start_key if start_key is not None else prefix
+    matches = []
+    while len(matches) < limit:
+        batch = list((
+            reference("/user_search")
+            .order_by_key()
+            .start_at(start_key)
+            .end_at(prefix + PREFIX_RANGE_END)
+            .limit_to_first(limit + 1)
+            .get()
+            or {}
+        ).items())
+        for key, entry in batch[:limit]:
+            token, user_id = key.split(" ", 1)
+            entry_tokens = entry.split(" ")
+            first_match = next(entry_token for entry_token in entry_tokens if entry_token.startswith(prefix))
+            if token == first_match and matches_search(search_tokens, entry_tokens):
+                matches.append((key, user_id))
+        if len(batch) <= limit:
+            break
+        start_key = batch[limit][0]
+    return matches[:limit]
+
+
+def rebuild_user_search_index() -> int:
+    """
+    Rebuilds the /user_search index from every user, reading /users a batch at a time. Needed once for users created
+    before the index existed. Once every user is indexed, /metadata/user_search_built is set and name filters switch
+    from scanning the users to the index.
+
+    Returns:
+        int: The number of users indexed.
+
+    Raises:
+        ValueError, TypeError, exceptions.FirebaseError: If an error occurs while reading users or writing the index.
+    """
+    indexed = 0
+    start_key = None
+    while True:
+        batch = _get_users_page(start_key, USER_SCAN_BATCH_SIZE + 1)
+        entries = {}
+        for user_id, user_data in batch[:USER_SCAN_BATCH_SIZE]:
+            entries.update(user_search_entries(user_id, user_data.get("first_name"), user_data.get("last_name")))
+        if entries:
+            reference("/user_search").update(entries)
+        indexed += len(batch[:USER_SCAN_BATCH_SIZE])
+        if len(batch) <= USER_SCAN_BATCH_SIZE:
+            reference("/metadata/user_search_built").set(True)
+            return indexed
+        start_key = batch[USER_SCAN_BATCH_SIZE][0]
 
 
 def get_user(user_id) -> dict:
@@ -51,12 +205,34 @@ def get_user(user_id) -> dict:
         ValueError, TypeError, exceptions.FirebaseError: If an error occurs while trying to fetch the user.
     """
 
-    user_data = db.reference(f"/users/{user_id}").get()
+    user_data = reference("/users/{user_id}", user_id=user_id).get()
     if user_data is None:
         raise ResourceNotFoundError(f"User {user_id} does not exist")
     return user_data
 
 
+def get_user_if_changed(user_id: str, etag: str | None) -> tuple[bool, dict | None, str | None]:
+    """
+    Fetches a user from the database, unless the caller's copy is still current. The user node's database ETag
+    identifies the copy, so an unchanged user is not downloaded.
+
+    Args:
+        user_id: (str) Username for user.
+        etag: (str | None) The ETag of the caller's copy, or None if it has none.
+
+    Returns:
+        tuple[bool, dict | None, str | None]: Whether the user changed, the user's data if it did, and its ETag.
+
+    Raises:
+        ResourceNotFoundError: If the user is not found.
+        ValueError, TypeError, exceptions.FirebaseError: If an error occurs while trying to fetch the user.
+    """
+    changed, user_data, etag = reference("/users/{user_id}", user_id=user_id).conditional_get(etag)
+    if changed and user_data is None:
+        raise ResourceNotFoundError(f"User {user_id} does not exist")
+    return changed, user_data, etag
+
+
 def create_user(user_id: str, user_json_dict: dict) -> User:
     """
     Creates a new user in the database.
@@ -76,12 +252,12 @@ def create_user(user_id: str, user_json_dict: dict) -> User:
     """
 
     try:
-        user_data = db.reference(f"/users/{user_id}").get()
+        user_exists = reference("/users/{user_id}", user_id=user_id).exists()
     except exceptions.FirebaseError as ex:
         current_app.logger.error(f"Firebase failure while trying to retrieve user {user_id}: {ex}")
         raise ex
 
-    if user_data is not None:
+    if user_exists:
         current_app.logger.error(f"User {user_id} already exists")
         raise ResourceAlreadyExistsError(f"User {user_id} already exists")
 
@@ -109,7 +285,21 @@ def create_user(user_id: str, user_json_dict: dict) -> User:
     )
 
     try:
-        db.reference(f"/users/{user_id}").set(new_user.to_dict())
+        seed_counter(reference("/metadata/user_count"), lambda: len(reference("/users").get(shallow=True) or {}))
+        reference("/").update({
+            f"users/{user_id}": new_user.to_dict(),
+            "metadata/user_count": {".sv": {"increment": 1}},
+            f"metadata/medication_counts/{user_id}": len(medications or {}),
+            f"metadata/medication_versions/{user_id}": {".sv": {"increment": 1}},
+            # A new user has no events, so their event index is complete from the start.
+            f"metadata/user_events_built/{user_id}": True,
+            f"search_names/users/{user_id}": {"first_name": first_name, "last_name": last_name},
+            f"search_names/medications/{user_id}": medication_names(medications) or None,
+            **{
+                f"user_search/{key}": entry
+                for key, entry in user_search_entries(user_id, first_name, last_name).items()
+            },
+        })
     except (ValueError, TypeError) as ex:
         current_app.logger.error(f"Error while trying to store user {user_id}: {ex}")
         raise ex
@@ -117,6 +307,9 @@ def create_user(user_id: str, user_json_dict: dict) -> User:
         current_app.logger.error(f"Firebase failure while trying to store user {user_id}: {ex}")
         raise ex
 
+    relationship_index.invalidate(user_id)
+    index_user(user_id, first_name, last_name)
+
     return new_user
 
 
@@ -137,12 +330,12 @@ def update_user(user_id: str, user_json_dict: dict) -> dict:
         exceptions.FirebaseError: If an error occurs while interacting with the database.
     """
     try:
-        user_data = db.reference(f"/users/{user_id}").get()
+        user_exists = reference("/users/{user_id}", user_id=user_id).exists()
     except exceptions.FirebaseError as ex:
         current_app.logger.error(f"Firebase failure while trying to retrieve user {user_id}: {ex}")
         raise ex
 
-    if user_data is None:
+    if not user_exists:
         current_app.logger.error(f"User {user_id} does not exist")
         raise ResourceNotFoundError(f"User {user_id} does not exist")
 
@@ -157,8 +350,30 @@ def update_user(user_id: str, user_json_dict: dict) -> dict:
     if not updated_user_data:
         raise InvalidRequestError("No valid fields to update")
 
+    # Keep the user's /user_search entries in step with their name, in the same write as the user.
+    updates = {f"users/{user_id}/{key}": value for key, value in updated_user_data.items()}
+    updates.update(user_name_updates(user_id, updated_user_data))
+    if "medications" in updated_user_data:
+        updates[f"metadata/medication_counts/{user_id}"] = len(updated_user_data["medications"])
+        updates[f"metadata/medication_versions/{user_id}"] = {".sv": {"increment": 1}}
+        # The events of medications that are replaced drop out of the user's event lists.
+        updates[f"metadata/event_versions/{user_id}"] = {".sv": {"increment": 1}}
+        updates[f"search_names/medications/{user_id}"] = medication_names(updated_user_data["medications"]) or None
+    if "first_name" in updated_user_data or "last_name" in updated_user_data:
+        # Only the names are read, rather than the whole user.
+        old_first_name, old_last_name = fan_out(
+            lambda key: reference("/users/{user_id}/{key}", user_id=user_id, key=key).get(),
+            ["first_name", "last_name"],
+        )
+        first_name = updated_user_data.get("first_name", old_first_name)
+        last_name = updated_user_data.get("last_name", old_last_name)
+        old_entries = user_search_entries(user_id, old_first_name, old_last_name)
+        new_entries = user_search_entries(user_id, first_name, last_name)
+        updates.update({f"user_search/{key}": None for key in old_entries.keys() - new_entries.keys()})
+        updates.update({f"user_search/{key}": entry for key, entry in new_entries.items()})
+
     try:
-        db.reference(f"/users/{user_id}").update(updated_user_data)
+        reference("/").update(updates)
     except (ValueError, TypeError) as ex:
         current_app.logger.error(f"Node {user_id} is invalid: {ex}")
         raise ex
@@ -166,4 +381,9 @@ def update_user(user_id: str, user_json_dict: dict) -> dict:
         current_app.logger.error(f"Firebase failure while trying to update user {user_id}: {ex}")
         raise ex
 
+    if "monitoring_users" in updated_user_data or "monitored_by_users" in updated_user_data:
+        relationship_index.invalidate(user_id)
+    if "first_name" in updated_user_data or "last_name" in updated_user_data:
+        index_user(user_id, first_name, last_name)
+
     return updated_user_data
@@ -0,0 +1,410 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional, TypeVar
+
+from firebase_admin import db
+from flask import Flask, current_app, g, has_app_context, has_request_context
+
+from src.database.memory_db import MemoryDatabase
+from src.database.request_cache import RequestReadCache
+from src.utils.metrics import record_firebase_call
+
+FIREBASE_DB_BACKEND = "FIREBASE_DB_BACKEND"
+DB_BACKEND_FIREBASE = "firebase"
+DB_BACKEND_MEMORY = "memory"
+REQUEST_READ_CACHE_ENABLED = "REQUEST_READ_CACHE_ENABLED"
+DATABASE_FAN_OUT_WORKERS = "DATABASE_FAN_OUT_WORKERS"
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Set in fan-out worker threads, so that a fan-out started from one runs inline instead of waiting on its own pool.
+_in_fan_out_worker = contextvars.ContextVar("in_fan_out_worker", default=False)
+
+# Query methods of `db.Reference`/`db.Query`, mapped to the REST parameter recorded in the query shape. Only the
+# ordering key is part of the shape; range and limit values are not, so calls group by how they query.
+_QUERY_METHODS = {
+    "order_by_child": "orderBy",
+    "order_by_key": "orderBy",
+    "order_by_value": "orderBy",
+    "start_at": "startAt",
+    "end_at": "endAt",
+    "equal_to": "equalTo",
+    "limit_to_first": "limitToFirst",
+    "limit_to_last": "limitToLast",
+}
+
+
+class DatabaseCall(NamedTuple):
+    """
+    A single call to the Realtime Database.
+
+    Attributes:
+        path: (str) The path template, e.g. `/users/{user_id}/medications`.
+        operation: (str) The operation, e.g. `get`, `get_if_changed`, `set`, `update`, `push`, `delete` or
+            `transaction`.
+        query: (str) The query shape, e.g. `orderBy=timestamp&startAt&endAt&limitToLast`. Empty for plain reads.
+        duration_seconds: (float) The wall time of the call.
+        request_bytes: (int) The size of the JSON payload sent, or None if there was none or sizes were not measured.
+        response_bytes: (int) The size of the JSON response, or None if there was none or sizes were not measured.
+        error: (str) The exception type if the call failed, otherwise None.
+    """
+    path: str
+    operation: str
+    query: str
+    duration_seconds: float
+    request_bytes: Optional[int]
+    response_bytes: Optional[int]
+    error: Optional[str]
+
+
+_listeners: list[Callable[[DatabaseCall], None]] = []
+_listeners_lock = threading.Lock()
+
+
+def add_listener(listener: Callable[[DatabaseCall], None]) -> None:
+    """
+    Registers a callable that receives every `DatabaseCall` made in this process.
+
+    Args:
+        listener: (Callable[[DatabaseCall], None]) The listener.
+    """
+    with _listeners_lock:
+        _listeners.append(listener)
+
+
+def remove_listener(listener: Callable[[DatabaseCall], None]) -> None:
+    """
+    Unregisters a listener added with `add_listener`.
+
+    Args:
+        listener: (Callable[[DatabaseCall], None]) The listener.
+    """
+    with _listeners_lock:
+        _listeners.remove(listener)
+
+
+@contextmanager
+def record_calls() -> Iterator[list[DatabaseCall]]:
+    """
+    Collects the database calls made while the context is active.
+
+    Yields:
+        list[DatabaseCall]: The calls, in the order they completed.
+    """
+    calls = []
+    add_listener(calls.append)
+    try:
+        yield calls
+    finally:
+        remove_listener(calls.append)
+
+
+def _measuring_sizes() -> bool:
+    # Payload sizes cost a serialization each, so they are only measured while a listener (e.g. `record_calls`) is
+    # collecting calls or the current request is being profiled.
+    if _listeners:
+        return True
+    return has_request_context() and g.get("request_profile") is not None
+
+
+def _json_size(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return len(json.dumps(value, separators=(",", ":")))
+    except (TypeError, ValueError):
+        return None
+
+
+def _record(call: DatabaseCall) -> None:
+    if has_app_context():
+        sizes = ""
+        if call.request_bytes is not None or call.response_bytes is not None:
+            sizes = f" (sent {call.request_bytes or 0}B, received {call.response_bytes or 0}B)"
+        current_app.logger.debug(
+            f"Firebase {call.operation} {call.path}"
+            f"{'?' + call.query if call.query else ''} took {call.duration_seconds * 1000:.1f}ms{sizes}"
+            f"{' failed with ' + call.error if call.error else ''}"
+        )
+    record_firebase_call(call.path, call.operation, call.duration_seconds)
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        listener(call)
+
+
+class InstrumentedReference:
+    """
+    Wraps a `db.Reference` or `db.Query` so that every call to the database is timed and recorded against its path
+    template. Query methods return a new wrapper that extends the recorded query shape. During a request, plain reads
+    go through the request's `RequestReadCache` and writes invalidate it.
+    """
+
+    def __init__(self, target: Any, path_template: str, path: str = None, query: tuple[str, ...] = ()):
+        """
+        Initialize a new instrumented reference
+
+        Args:
+            target: {db.Reference | db.Query} The wrapped reference or query.
+            path_template: {str} The path template, used to group calls independently of IDs.
+            path: {str} The formatted path, used to key the request read cache. Optional.
+            query: {tuple[str, ...]} The query parameters applied so far.
+        """
+        self._target = target
+        self.path_template = path_template
+        self.path = path
+        self.query = query
+
+    def __getattr__(self, name: str) -> Any:
+        if name not in _QUERY_METHODS:
+            return getattr(self._target, name)
+
+        def build_query(*args, **kwargs) -> InstrumentedReference:
+            parameter = _QUERY_METHODS[name]
+            if name == "order_by_child":
+                parameter += f"={args[0]}"
+            elif name == "order_by_key":
+                parameter += "=$key"
+            elif name == "order_by_value":
+                parameter += "=$value"
+            return InstrumentedReference(
+                getattr(self._target, name)(*args, **kwargs), self.path_template, self.path, self.query + (parameter,)
+            )
+
+        return build_query
+
+    @property
+    def key(self) -> Optional[str]:
+        return self._target.key
+
+    def _call(self, operation: str, payload: Any, *args, **kwargs) -> Any:
+        query = "&".join(self.query + (("shallow",) if kwargs.get("shallow") else ()))
+        result = None
+        error = None
+        start = time.perf_counter()
+        try:
+            result = getattr(self._target, operation)(*args, **kwargs)
+            return result
+        except Exception as ex:
+            error = type(ex).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            request_bytes = response_bytes = None
+            if _measuring_sizes():
+                response = result
+                if operation == "get" and kwargs.get("etag") and isinstance(result, tuple):
+                    response = result[0]
+                elif operation == "get_if_changed" and isinstance(result, tuple):
+                    response = result[1]
+                request_bytes = _json_size(payload)
+                if operation in ("get", "get_if_changed", "transaction"):
+                    response_bytes = _json_size(response)
+            _record(DatabaseCall(
+                path=self.path_template,
+                operation=operation,
+                query=query,
+                duration_seconds=duration,
+                request_bytes=request_bytes,
+                response_bytes=response_bytes,
+                error=error,
+            ))
+
+    def _segments(self) -> list[str]:
+        return [segment for segment in self.path.split("/") if segment]
+
+    def get(self, etag: bool = False, shallow: bool = False) -> Any:
+        # Queries and ETag reads always go to the database; plain and shallow reads may be served from the cache.
+        cache = _request_read_cache() if self.path is not None and not self.query and not etag else None
+        if cache is None:
+            if etag or shallow:
+                return self._call("get", None, etag=etag, shallow=shallow)
+            return self._call("get", None)
+
+        cached, value = cache.lookup(self._segments())
+        if cached:
+            current_app.logger.debug(f"Firebase get {self.path_template} served from the request read cache")
+            if shallow and isinstance(value, dict):
+                return {key: True for key in value}
+            return value
+
+        if shallow:
+            return self._call("get", None, shallow=True)
+        value = self._call("get", None)
+        cache.store(self._segments(), value)
+        return value
+
+    def exists(self) -> bool:
+        """
+        Checks whether there is a value at the location with a shallow read, which returns only the keys of an object's
+        direct children rather than its whole subtree.
+
+        Returns:
+            bool: Whether there is a value at the location.
+        """
+        return self.get(shallow=True) is not None
+
+    def get_if_changed(self, etag: str) -> tuple[bool, Any, Optional[str]]:
+        # Always goes to the database, which only sends the value if it no longer matches the ETag.
+        return self._call("get_if_changed", None, etag)
+
+    def conditional_get(self, etag: Optional[str]) -> tuple[bool, Any, Optional[str]]:
+        """
+        Reads the value and its ETag, unless a copy with the given ETag is still current.
+
+        Args:
+            etag: (str) The ETag of the caller's copy, or None if it has none.
+
+        Returns:
+            tuple[bool, Any, str]: Whether the value changed, the value if it did, and its current ETag.
+        """
+        if etag:
+            changed, value, new_etag = self.get_if_changed(etag)
+            if not changed:
+                return False, None, etag
+            return True, value, new_etag
+        value, new_etag = self.get(etag=True)
+        return True, value, new_etag
+
+    def _write(self, operation: str, payload: Any, *args) -> Any:
+        cache = _request_read_cache() if self.path is not None else None
+        if cache is not None:
+            cache.invalidate(self._segments())
+        return self._call(operation, payload, *args)
+
+    def set(self, value: Any) -> None:
+        return self._write("set", value, value)
+
+    def update(self, value: dict) -> None:
+        return self._write("update", value, value)
+
+    def push(self, value: Any = "") -> db.Reference:
+        return self._write("push", value or None, value)
+
+    def delete(self) -> None:
+        return self._write("delete", None)
+
+    def transaction(self, transaction_update: Callable[[Any], Any]) -> Any:
+        return self._write("transaction", None, transaction_update)
+
+
+def _request_read_cache() -> Optional[RequestReadCache]:
+    if not has_request_context() or not current_app.config.get(REQUEST_READ_CACHE_ENABLED, False):
+        return None
+    if "database_read_cache" not in g:
+        g.database_read_cache = RequestReadCache()
+    return g.database_read_cache
+
+
+def clear_request_read_cache(exception: BaseException | None) -> None:
+    g.pop("database_read_cache", None)
+
+
+def init_database(app: Flask) -> None:
+    """
+    Selects the database backend for the Flask app.
+
+    Args:
+        app: (Flask) The Flask app to configure.
+
+    Notes:
+        if FIREBASE_DB_BACKEND is set to 'memory', all database access goes to an empty `MemoryDatabase` held by the
+        app instead of Firebase. Intended for local development, hermetic tests and benchmarks.
+
+        Unless REQUEST_READ_CACHE_ENABLED is set to 'false', reads within a request go through a `RequestReadCache`.
+
+        `fan_out` runs calls on a thread pool of DATABASE_FAN_OUT_WORKERS threads (default 8), shared by every request
+        in the worker process. Set it to 0 to run them one after another. Threads are only started on first use, so
+        the pool is safe to create before gunicorn forks.
+    """
+    if os.getenv(FIREBASE_DB_BACKEND, DB_BACKEND_FIREBASE) == DB_BACKEND_MEMORY:
+        app.extensions["memory_database"] = MemoryDatabase()
+
+    fan_out_workers = int(os.getenv(DATABASE_FAN_OUT_WORKERS, "8"))
+    if fan_out_workers > 0:
+        app.extensions["database_executor"] = ThreadPoolExecutor(
+            max_workers=fan_out_workers, thread_name_prefix="database-fan-out"
+        )
+
+    app.config[REQUEST_READ_CACHE_ENABLED] = os.getenv(REQUEST_READ_CACHE_ENABLED, "true").lower() != "false"
+    app.teardown_request(clear_request_read_cache)
+
+
+def reference(path_template: str, **path_params: str) -> InstrumentedReference:
+    """
+    Returns an instrumented reference to a database location. All database access goes through here, so that every
+    call is logged, counted in the app's metrics and visible to `record_calls`.
+
+    Args:
+        path_template: (str) The path, with IDs as `str.format` placeholders, e.g. `/users/{user_id}`.
+        **path_params: (str) The values of the placeholders.
+
+    Returns:
+        InstrumentedReference: The instrumented reference.
+    """
+    path = path_template.format(**path_params)
+    memory_database = current_app.extensions.get("memory_database") if has_app_context() else None
+    if memory_database is not None:
+        return InstrumentedReference(memory_database.reference(path), path_template, path)
+    return InstrumentedReference(db.reference(path), path_template, path)
+
+
+def fan_out(function: Callable[[T], R], items: Iterable[T]) -> Iterator[R]:
+    """
+    Calls a function on each item concurrently on the app's database thread pool, yielding the results in the order of
+    the items. Each call runs in a copy of the caller's context, so it sees the same app, request and `flask.g`.
+
+    Calls that have not started are cancelled when the caller stops iterating, so a caller that only needs the first
+    few results can break out of the loop, or close the iterator, to save the remaining round trips. Without a pool,
+    or inside another fan-out, the calls run one after another in the calling thread.
+
+    Args:
+        function: (Callable[[T], R]) The function to call. It should only do I/O through `reference`.
+        items: (Iterable[T]) The items to call it on.
+
+    Yields:
+        R: The result of each call, in order. A call's exception is raised when its result is reached.
+    """
+    items = list(items)
+    executor = current_app.extensions.get("database_executor") if has_app_context() else None
+    if executor is None or len(items) < 2 or _in_fan_out_worker.get():
+        yield from map(function, items)
+        return
+
+    # Created up front, so the calls share one cache rather than racing to create it.
+    _request_read_cache()
+    futures = [
+        executor.submit(contextvars.copy_context().run, _run_in_fan_out_worker, function, item) for item in items
+    ]
+    try:
+        for future in futures:
+            yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _run_in_fan_out_worker(function: Callable[[T], R], item: T) -> R:
+    _in_fan_out_worker.set(True)
+    return function(item)
+
+
+def seed_counter(counter: InstrumentedReference, count: Callable[[], int]) -> None:
+    """
+    Starts a counter kept with server-side increments from a count of what it counts, if the counter is missing. An
+    increment of a missing counter starts it from 0, so writers call this before the update that increments it. The
+    counter is seeded in a transaction, so concurrent writers seed it once and their increments all apply on top.
+
+    Args:
+        counter: (InstrumentedReference) The counter's location.
+        count: (Callable[[], int]) Counts what the counter counts, before the caller's write.
+    """
+    if counter.get() is not None:
+        return
+    counter.transaction(lambda current: current if current is not None else count())
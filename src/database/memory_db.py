@@ -0,0 +1,376 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Any, Callable, Optional
+
+from src.utils.push_id import PushIdGenerator
+
+
+def _segments(path: str) -> list[str]:
+    return [segment for segment in (path or "").split("/") if segment]
+
+
+def _ordering_key(value: Any) -> tuple:
+    # Realtime Database ordering: null, false, true, numbers, strings, then objects.
+    if value is None:
+        return 0,
+    if value is False:
+        return 1,
+    if value is True:
+        return 2,
+    if isinstance(value, (int, float)):
+        return 3, value
+    if isinstance(value, str):
+        return 4, value
+    return 5,
+
+
+def _key_ordering_key(key: str) -> tuple:
+    # Keys that parse as 32-bit integers sort numerically before all other keys.
+    try:
+        number = int(key)
+        if -2 ** 31 <= number < 2 ** 31 and str(number) == key:
+            return 0, number, ""
+    except ValueError:
+        pass
+    return 1, 0, key
+
+
+def _child(value: Any, path: str) -> Any:
+    for segment in _segments(path):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(segment)
+    return value
+
+
+def etag_of(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+class MemoryDatabase:
+    """
+    A thread-safe, in-memory JSON tree with Realtime Database semantics: writing null deletes a node, empty objects are
+    pruned, arrays are stored as objects keyed by index and read back as arrays, multi-path updates and server values
+    are applied, and queries order, filter and limit the children of a node the way the Realtime Database does.
+
+    `reference` returns objects implementing the parts of the `firebase_admin.db.Reference` and `db.Query` API used by
+    the controllers, so the app can run against it instead of Firebase.
+    """
+
+    def __init__(self, data: Optional[dict] = None):
+        """
+        Initialize a new in-memory database
+
+        Args:
+            data: {dict} The initial contents of the database. Optional.
+        """
+        self._root = self._prune(deepcopy(data)) if data else None
+        self._lock = threading.RLock()
+        self._generate_push_id = PushIdGenerator()
+
+    @property
+    def lock(self) -> threading.RLock:
+        return self._lock
+
+    def reference(self, path: str = "/") -> "MemoryReference":
+        """
+        Args:
+            path: (str) The database path.
+
+        Returns:
+            MemoryReference: A reference to the location, mirroring `db.reference(path)`.
+        """
+        return MemoryReference(self, _segments(path))
+
+    def _resolve_server_values(self, value: Any, current: Any) -> Any:
+        if isinstance(value, dict):
+            server_value = value.get(".sv")
+            if server_value == "timestamp":
+                return int(time.time() * 1000)
+            if isinstance(server_value, dict) and "increment" in server_value:
+                base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+                return base + server_value["increment"]
+            return {
+                key: self._resolve_server_values(child, current.get(key) if isinstance(current, dict) else None)
+                for key, child in value.items()
+            }
+        return value
+
+    @staticmethod
+    def _prune(value: Any) -> Any:
+        if isinstance(value, (list, tuple)):
+            value = {str(index): item for index, item in enumerate(value)}
+        if not isinstance(value, dict):
+            return value
+        pruned = {}
+        for key, child in value.items():
+            child = MemoryDatabase._prune(child)
+            if child is not None:
+                pruned[str(key)] = child
+        return pruned or None
+
+    @staticmethod
+    def _to_arrays(value: Any) -> Any:
+        # As the Realtime Database does when reading, objects whose keys are all array indexes are returned as arrays
+        # if more than half of the indexes up to the largest one are present. The missing ones are null.
+        if not isinstance(value, dict):
+            return value
+        value = {key: MemoryDatabase._to_arrays(child) for key, child in value.items()}
+        if all(key.isdigit() and str(int(key)) == key for key in value):
+            length = max(int(key) for key in value) + 1
+            if len(value) * 2 > length:
+                return [value.get(str(index)) for index in range(length)]
+        return value
+
+    def _get(self, segments: list[str]) -> Any:
+        node = self._root
+        for segment in segments:
+            if not isinstance(node, dict):
+                return None
+            node = node.get(segment)
+        return node
+
+    def _set(self, segments: list[str], value: Any) -> None:
+        value = self._prune(self._resolve_server_values(deepcopy(value), self._get(segments)))
+        if not segments:
+            self._root = value
+            return
+
+        if not isinstance(self._root, dict):
+            self._root = {}
+        parents = [self._root]
+        for segment in segments[:-1]:
+            child = parents[-1].get(segment)
+            if not isinstance(child, dict):
+                child = parents[-1][segment] = {}
+            parents.append(child)
+
+        if value is None:
+            parents[-1].pop(segments[-1], None)
+            # Remove ancestors left empty by the delete.
+            for depth in range(len(parents) - 1, 0, -1):
+                if parents[depth]:
+                    break
+                parents[depth - 1].pop(segments[depth - 1], None)
+            if not self._root:
+                self._root = None
+        else:
+            parents[-1][segments[-1]] = value
+
+    def get(self, path: str, shallow: bool = False) -> Any:
+        """
+        Returns:
+            Any: A copy of the value at the path, or None. If shallow, objects have their children replaced by True.
+        """
+        with self._lock:
+            value = self._get(_segments(path))
+            if shallow and isinstance(value, dict):
+                return {key: True for key in value}
+            return self._to_arrays(deepcopy(value))
+
+    def set(self, path: str, value: Any) -> None:
+        with self._lock:
+            self._set(_segments(path), value)
+
+    def update(self, path: str, values: dict) -> None:
+        """
+        Sets each of the given children, whose keys may themselves be paths relative to `path`.
+        """
+        with self._lock:
+            base = _segments(path)
+            for child_path, value in values.items():
+                self._set(base + _segments(child_path), value)
+
+    def push(self, path: str, value: Any) -> str:
+        """
+        Returns:
+            str: The generated, chronologically ordered child key.
+        """
+        with self._lock:
+            key = self._generate_push_id()
+            self._set(_segments(path) + [key], value)
+            return key
+
+    def delete(self, path: str) -> None:
+        self.set(path, None)
+
+    def query(
+            self,
+            path: str,
+            order_by: str,
+            start_at: Any = None,
+            end_at: Any = None,
+            equal_to: Any = None,
+            limit_to_first: Optional[int] = None,
+            limit_to_last: Optional[int] = None,
+    ) -> OrderedDict:
+        """
+        Orders the children of a node by `order_by` ("$key", "$value" or a child path), keeps those within the range,
+        then applies the limit.
+
+        Returns:
+            OrderedDict: The matching children, in order.
+        """
+        with self._lock:
+            node = self._get(_segments(path))
+            if not isinstance(node, dict):
+                return OrderedDict()
+
+            if order_by == "$key":
+                def sort_key(item):
+                    return _key_ordering_key(item[0])
+                bound = _key_ordering_key
+            else:
+                def sort_key(item):
+                    index = item[1] if order_by == "$value" else _child(item[1], order_by)
+                    return _ordering_key(index), _key_ordering_key(item[0])
+
+                def bound(value):
+                    return _ordering_key(value),
+
+            entries = sorted(node.items(), key=sort_key)
+            if equal_to is not None:
+                start_at = end_at = equal_to
+            if start_at is not None:
+                entries = [entry for entry in entries if sort_key(entry)[:len(bound(start_at))] >= bound(start_at)]
+            if end_at is not None:
+                entries = [entry for entry in entries if sort_key(entry)[:len(bound(end_at))] <= bound(end_at)]
+            if limit_to_first is not None:
+                entries = entries[:limit_to_first]
+            if limit_to_last is not None:
+                entries = entries[-limit_to_last:] if limit_to_last else []
+            return OrderedDict((key, self._to_arrays(deepcopy(child))) for key, child in entries)
+
+
+class MemoryReference:
+    """
+    A location in a `MemoryDatabase`, mirroring `firebase_admin.db.Reference`.
+    """
+
+    def __init__(self, database: MemoryDatabase, segments: list[str]):
+        self._database = database
+        self._segments = segments
+
+    @property
+    def key(self) -> Optional[str]:
+        return self._segments[-1] if self._segments else None
+
+    @property
+    def path(self) -> str:
+        return "/" + "/".join(self._segments)
+
+    @property
+    def parent(self) -> Optional["MemoryReference"]:
+        return MemoryReference(self._database, self._segments[:-1]) if self._segments else None
+
+    def child(self, path: str) -> "MemoryReference":
+        if not path or not isinstance(path, str) or path.startswith("/"):
+            raise ValueError(f'Invalid path argument: "{path}". Child path must be a non-empty relative path.')
+        return MemoryReference(self._database, self._segments + _segments(path))
+
+    def get(self, etag: bool = False, shallow: bool = False) -> Any:
+        if etag and shallow:
+            raise ValueError("etag and shallow cannot both be set to True.")
+        value = self._database.get(self.path, shallow=shallow)
+        if etag:
+            return value, etag_of(value)
+        return value
+
+    def get_if_changed(self, etag: str) -> tuple[bool, Any, Optional[str]]:
+        if not isinstance(etag, str):
+            raise ValueError("ETag must be a string.")
+        value = self._database.get(self.path)
+        if etag_of(value) == etag:
+            return False, None, None
+        return True, value, etag_of(value)
+
+    def set(self, value: Any) -> None:
+        if value is None:
+            raise ValueError("Value must not be None.")
+        self._database.set(self.path, value)
+
+    def update(self, value: dict) -> None:
+        if not value or not isinstance(value, dict):
+            raise ValueError("Value argument must be a non-empty dictionary.")
+        if None in value.keys():
+            raise ValueError("Dictionary must not contain None keys.")
+        self._database.update(self.path, value)
+
+    def push(self, value: Any = "") -> "MemoryReference":
+        if value is None:
+            raise ValueError("Value must not be None.")
+        return self.child(self._database.push(self.path, value))
+
+    def delete(self) -> None:
+        self._database.delete(self.path)
+
+    def transaction(self, transaction_update: Callable[[Any], Any]) -> Any:
+        if not callable(transaction_update):
+            raise ValueError("transaction_update must be a function.")
+        with self._database.lock:
+            new_value = transaction_update(self._database.get(self.path))
+            self._database.set(self.path, new_value)
+            return new_value
+
+    def order_by_child(self, path: str) -> "MemoryQuery":
+        if path in ("$key", "$value", "$priority"):
+            raise ValueError(f"Illegal child path: {path}")
+        return MemoryQuery(self._database, self.path, path)
+
+    def order_by_key(self) -> "MemoryQuery":
+        return MemoryQuery(self._database, self.path, "$key")
+
+    def order_by_value(self) -> "MemoryQuery":
+        return MemoryQuery(self._database, self.path, "$value")
+
+
+class MemoryQuery:
+    """
+    A query over the children of a `MemoryDatabase` location, mirroring `firebase_admin.db.Query`.
+    """
+
+    def __init__(self, database: MemoryDatabase, path: str, order_by: str):
+        self._database = database
+        self._path = path
+        self._params = {"order_by": order_by}
+
+    def limit_to_first(self, limit: int) -> "MemoryQuery":
+        if not isinstance(limit, int) or limit < 0:
+            raise ValueError("Limit must be a non-negative integer.")
+        if "limit_to_last" in self._params:
+            raise ValueError("Cannot set both first and last limits.")
+        self._params["limit_to_first"] = limit
+        return self
+
+    def limit_to_last(self, limit: int) -> "MemoryQuery":
+        if not isinstance(limit, int) or limit < 0:
+            raise ValueError("Limit must be a non-negative integer.")
+        if "limit_to_first" in self._params:
+            raise ValueError("Cannot set both first and last limits.")
+        self._params["limit_to_last"] = limit
+        return self
+
+    def start_at(self, start: Any) -> "MemoryQuery":
+        if start is None:
+            raise ValueError("Start value must not be None.")
+        self._params["start_at"] = start
+        return self
+
+    def end_at(self, end: Any) -> "MemoryQuery":
+        if end is None:
+            raise ValueError("End value must not be None.")
+        self._params["end_at"] = end
+        return self
+
+    def equal_to(self, value: Any) -> "MemoryQuery":
+        if value is None:
+            raise ValueError("Equal to value must not be None.")
+        self._params["equal_to"] = value
+        return self
+
+    def get(self) -> OrderedDict:
+        return self._database.query(self._path, **self._params)
@@ -0,0 +1,55 @@
+import threading
+from copy import deepcopy
+from typing import Any
+
+
+class RequestReadCache:
+    """
+    Identity map of the database nodes read during one request, so the request never reads the same node twice.
+
+    A read is served from the cache if the node itself, or any of its ancestors, has already been read. Writes
+    invalidate the written node along with its ancestors and descendants. Values are copied in and out, so callers can
+    mutate what they are given without corrupting the cache.
+    """
+
+    def __init__(self):
+        self._values: dict[tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, segments: list[str]) -> tuple[bool, Any]:
+        """
+        Args:
+            segments: (list[str]) The segments of the node's path.
+
+        Returns:
+            tuple[bool, Any]: Whether the node is cached, and if so a copy of its value, which may be None.
+        """
+        with self._lock:
+            for depth in range(len(segments), -1, -1):
+                ancestor = tuple(segments[:depth])
+                if ancestor not in self._values:
+                    continue
+                value = self._values[ancestor]
+                for segment in segments[depth:]:
+                    value = value.get(segment) if isinstance(value, dict) else None
+                self.hits += 1
+                return True, deepcopy(value)
+            self.misses += 1
+            return False, None
+
+    def store(self, segments: list[str], value: Any) -> None:
+        with self._lock:
+            self._values[tuple(segments)] = deepcopy(value)
+
+    def invalidate(self, segments: list[str]) -> None:
+        """
+        Evicts the node at the given path, and every cached ancestor or descendant of it.
+        """
+        written = tuple(segments)
+        with self._lock:
+            for cached in list(self._values):
+                shorter = min(len(cached), len(written))
+                if cached[:shorter] == written[:shorter]:
+                    del self._values[cached]
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+
+class Principal:
+    user_id: str | None
+    claims: dict
+    development: bool
+
+    def __init__(self, user_id: str | None, claims: dict = None, development: bool = False):
+        """
+        Initialize a new principal, the authenticated caller of a request
+
+        Args:
+            user_id: {str} The caller's UID. None if the token does not carry one.
+            claims: {dict} The claims of the caller's verified ID token. Optional.
+            development: {bool} Whether the request was authenticated in development mode, which bypasses ownership
+                checks. Optional.
+        """
+        self.user_id = user_id
+        self.claims = claims or {}
+        self.development = development
+
+    def __eq__(self, other):
+        return all(getattr(self, attr) == getattr(other, attr) for attr in vars(self))
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} user_id=({self.user_id}), development=({self.development})>'
+
+    @staticmethod
+    def from_decoded_token(decoded_token: dict):
+        user_id = decoded_token.get("user_id") if isinstance(decoded_token, dict) else None
+        return Principal(
+            user_id=user_id if isinstance(user_id, str) else None,
+            claims=decoded_token if isinstance(decoded_token, dict) else {},
+        )
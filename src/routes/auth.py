@@ -1,94 +1,203 @@
 import os
-from functools import wraps
 from typing import Optional
 
 import firebase_admin
-import flask
 from dotenv import load_dotenv
 from firebase_admin import auth
-from flask import request, jsonify, Response, current_app
+from flask import Flask, g, request, jsonify, Response, current_app
+
+from src.models.Principal import Principal
+from src.utils.id_token_verifier import IdTokenVerifier, SigningKeyStore
+from src.utils.token_cache import TokenCache
 
 load_dotenv()
 
+ID_TOKEN_CACHE_SIZE = "ID_TOKEN_CACHE_SIZE"
+FIREBASE_AUTH_VERIFIER = "FIREBASE_AUTH_VERIFIER"
+FIREBASE_SIGNING_KEYS_PATH = "FIREBASE_SIGNING_KEYS_PATH"
+FIREBASE_PROJECT_ID = "FIREBASE_PROJECT_ID"
 
-def firebase_auth_required(f):
+AUTH_MODE = "AUTH_MODE"
+AUTH_MODE_DEVELOPMENT = "development"
+AUTH_MODE_FIREBASE = "firebase"
+
+# Verified ID tokens, so repeat callers skip signature verification until their token expires.
+token_cache = TokenCache(max_size=int(os.getenv(ID_TOKEN_CACHE_SIZE, "1024")))
+
+
+def init_id_token_verifier(app: Flask) -> None:
     """
-    Decorator to require Firebase Auth for a route.
+    Selects the engine used to verify ID tokens for the Flask app.
+
     Args:
-        f: The function to decorate.
+        app: (Flask) The Flask app to configure.
 
     Notes:
-        if FLASK_ENV is set to 'development', this decorator will bypass Firebase Auth.
+        if FIREBASE_AUTH_VERIFIER is set to 'local', tokens are verified in-process with PyJWT against signing keys
+        held in memory. The keys are read from FIREBASE_SIGNING_KEYS_PATH when it is set, otherwise they are fetched
+        from Google and refreshed on a background thread. Any other value keeps `auth.verify_id_token`.
+    """
+    if os.getenv(FIREBASE_AUTH_VERIFIER, "firebase") != "local":
+        return
 
-    Returns:
-        The decorated function.
+    keys_path = os.getenv(FIREBASE_SIGNING_KEYS_PATH)
+    if keys_path:
+        key_store = SigningKeyStore.from_file(keys_path)
+    else:
+        key_store = SigningKeyStore()
+        key_store.start()
+
+    project_id = os.getenv(FIREBASE_PROJECT_ID) or firebase_admin.get_app().project_id
+    app.extensions["id_token_verifier"] = IdTokenVerifier(project_id, key_store)
+
+
+def verify_id_token(id_token: str) -> dict:
     """
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if os.getenv('FLASK_ENV') == 'development':
-            return f(*args, **kwargs)
+    Verifies an ID token with the app's verification engine, serving repeat tokens from the token cache.
 
-        if not firebase_admin._apps:
-            raise ValueError("Firebase app is not initialized")
+    Args:
+        id_token: (str) The raw ID token.
 
-        if 'Authorization' not in request.headers:
-            return jsonify({"message": "Authorization header is missing"}), 401
+    Returns:
+        dict: The decoded token.
 
-        id_token = request.headers['Authorization']
+    Raises:
+        auth.ExpiredIdTokenError, auth.RevokedIdTokenError, auth.InvalidIdTokenError: If the token is not valid.
+    """
+    decoded_token = token_cache.get(id_token)
+    if decoded_token is not None:
+        return decoded_token
+
+    verifier = current_app.extensions.get("id_token_verifier")
+    if verifier is None:
+        decoded_token = auth.verify_id_token(id_token)
+    else:
+        decoded_token = verifier.verify_id_token(id_token)
+    token_cache.put(id_token, decoded_token)
+    return decoded_token
 
-        try:
-            decoded_token = auth.verify_id_token(id_token)
-            request.decoded_token = decoded_token
-        except auth.ExpiredIdTokenError:
-            return jsonify({"message": "ID token has expired"}), 403
-        except auth.RevokedIdTokenError:
-            return jsonify({"message": "ID token has been revoked"}), 403
-        except auth.InvalidIdTokenError:
-            return jsonify({"message": "Invalid ID token"}), 403
 
-        return f(*args, **kwargs)
-    return decorated_function
+def init_auth(app: Flask) -> None:
+    """
+    Resolves the authentication mode once for the Flask app and registers the hook that authenticates each request.
 
+    Args:
+        app: (Flask) The Flask app to configure.
 
-def get_user_id(req: flask.Request) -> Optional[str]:
+    Notes:
+        if FLASK_ENV is set to 'development', requests bypass Firebase Auth and the Authorization header is taken as
+        the caller's UID.
     """
-    Retrieves the user ID from the request.
+    if os.getenv('FLASK_ENV') == 'development':
+        app.config[AUTH_MODE] = AUTH_MODE_DEVELOPMENT
+    else:
+        app.config[AUTH_MODE] = AUTH_MODE_FIREBASE
+        init_id_token_verifier(app)
+
+    app.before_request(authenticate_request)
 
+
+def firebase_auth_required(f):
+    """
+    Decorator to require Firebase Auth for a route. The caller is authenticated by `authenticate_request` before the
+    route runs, and the resulting principal is available through `get_principal`.
     Args:
-        req: (flask.Request) The request object.
+        f: The function to decorate.
 
     Returns:
-        Optional[str]: The user ID if found, otherwise None.
+        The decorated function.
+    """
+    f.auth_required = True
+    return f
+
+
+def authenticate_request() -> Optional[tuple[Response, int]]:
+    """
+    Authenticates the caller of a route decorated with `firebase_auth_required` and stores the resulting principal on
+    `flask.g`. Registered as a `before_request` hook by `init_auth`, so every request is authenticated at most once.
+
+    Returns:
+        Optional[tuple[Response, int]]: The error response and status code if authentication failed, otherwise None.
     """
-    if os.environ.get('FLASK_ENV') == 'development':
-        return req.headers.get('Authorization', None)
+    view = current_app.view_functions.get(request.endpoint)
+    if not getattr(view, "auth_required", False):
+        return None
+    return authenticate_caller()
+
+
+def authenticate_caller() -> Optional[tuple[Response, int]]:
+    """
+    Authenticates the caller of the current request from its Authorization header and stores the resulting principal
+    on `flask.g`. For routes that only need Firebase Auth in some cases, and so are not decorated with
+    `firebase_auth_required`.
+
+    Returns:
+        Optional[tuple[Response, int]]: The error response and status code if authentication failed, otherwise None.
+    """
+    if current_app.config[AUTH_MODE] == AUTH_MODE_DEVELOPMENT:
+        g.principal = Principal(user_id=request.headers.get('Authorization', None), development=True)
+        return None
+
+    id_token = request.headers.get('Authorization')
+    if id_token is None:
+        return jsonify({"message": "Authorization header is missing"}), 401
 
     try:
-        return req.decoded_token['user_id']
-    except (AttributeError, KeyError, ValueError, TypeError):
+        decoded_token = verify_id_token(id_token)
+    except auth.ExpiredIdTokenError:
+        return jsonify({"message": "ID token has expired"}), 403
+    except auth.RevokedIdTokenError:
+        return jsonify({"message": "ID token has been revoked"}), 403
+    except auth.InvalidIdTokenError:
+        return jsonify({"message": "Invalid ID token"}), 403
+
+    g.principal = Principal.from_decoded_token(decoded_token)
+    return None
+
+
+def get_principal() -> Optional[Principal]:
+    """
+    Retrieves the authenticated caller of the current request.
+
+    Returns:
+        Optional[Principal]: The principal if the request was authenticated, otherwise None.
+    """
+    return g.get("principal", None)
+
+
+def get_user_id() -> Optional[str]:
+    """
+    Retrieves the user ID of the authenticated caller of the current request.
+
+    Returns:
+        Optional[str]: The user ID if found, otherwise None.
+    """
+    principal = get_principal()
+    if principal is None:
         return None
+    return principal.user_id
 
 
-def verify_user(user_id: str, req: flask.Request) -> tuple[bool, Optional[tuple[Response, int]]]:
+def verify_user(user_id: str) -> tuple[bool, Optional[tuple[Response, int]]]:
     """
     Verifies that the user making the request is the same as the user being requested.
 
     Args:
         user_id: (str) Username for user.
-        req: (flask.Request) The request object.
 
     Notes:
-        if FLASK_ENV is set to 'development', this function will bypass Firebase Auth.
+        Requests authenticated in development mode are always verified.
 
     Returns:
         tuple[bool, Optional[tuple[Response, int]]]: A tuple containing a boolean representing whether the user was
         verified and an optional tuple of Response and int representing the error response and status code if there was
         an error.
     """
-    if os.getenv('FLASK_ENV') == 'development':
+    principal = get_principal()
+    if principal is not None and principal.development:
         return True, None
 
-    requesting_user_id = get_user_id(req)
+    requesting_user_id = principal.user_id if principal is not None else None
 
     if requesting_user_id is None or user_id != requesting_user_id:
         current_app.logger.error(f"Insufficient permissions: {requesting_user_id} != {user_id}")
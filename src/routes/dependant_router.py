@@ -44,7 +44,7 @@ def handle_get_dependants(user_id):
             description: Internal Server Error
 
     """
-    user_verified, error_response = verify_user(user_id, request)
+    user_verified, error_response = verify_user(user_id)
     if not user_verified:
         return error_response
 
@@ -94,7 +94,7 @@ def handle_get_dependant(user_id, dependant_id):
         500:
             description: Internal Server Error
     """
-    user_verified, error_response = verify_user(user_id, request)
+    user_verified, error_response = verify_user(user_id)
     if not user_verified:
         return error_response
 
@@ -162,7 +162,7 @@ def handle_create_dependant(user_id):
         500:
             description: Internal Server Error
     """
-    user_verified, error_response = verify_user(user_id, request)
+    user_verified, error_response = verify_user(user_id)
     if not user_verified:
         return error_response
 
@@ -244,7 +244,7 @@ def handle_update_dependant(user_id, dependant_id):
         500:
             description: Internal Server Error
     """
-    user_verified, error_response = verify_user(user_id, request)
+    user_verified, error_response = verify_user(user_id)
     if not user_verified:
         return error_response
 
@@ -310,7 +310,7 @@ def handle_delete_dependant(user_id, dependant_id):
         500:
             description: Internal Server Error
     """
-    user_verified, error_response = verify_user(user_id, request)
+    user_verified, error_response = verify_user(user_id)
     if not user_verified:
         return error_response
 
@@ -1,21 +1,30 @@
 from datetime import datetime
 
+import click
 from flask import Blueprint, request, jsonify
 
+from src.controllers.authorization_controller import authorize_user_data_access
 from src.controllers.medication_event_controller import (
     create_medication_event,
+    create_medication_events,
     get_medication_event,
+    get_event_version_if_changed,
     update_medication_event,
     delete_medication_event,
-    get_medication_events_for_medication_controller, get_medication_events_for_user
+    get_medication_events_for_medication_controller, get_medication_events_for_user, get_medication_event_timeline,
+    rebuild_user_event_index
 )
+from src.controllers.user_controller import get_users
 from src.models.errors.invalid_request_error import InvalidRequestError
 from src.models.errors.resource_not_found_error import ResourceNotFoundError
 from src.routes.auth import firebase_auth_required, get_user_id
-from src.utils.constants import MAX_MEDICATION_EVENTS_PER_PAGE
+from src.utils.conditional_requests import if_none_match, not_modified, with_etag
+from src.utils.constants import (
+    EVENTS_MODE_MEDICATION, EVENTS_MODE_TIMELINE, MAX_MEDICATION_EVENTS_PER_PAGE, MAX_USERS_PER_PAGE
+)
 from src.utils.validators import validate_json
 
-medication_events_bp = Blueprint('medication_events_bp', __name__)
+medication_events_bp = Blueprint('medication_events_bp', __name__, cli_group='events')
 
 
 @medication_events_bp.route('/<medication_id>/events/<medication_event_id>', methods=['GET'])
@@ -37,6 +46,11 @@ def handle_get_medication_event(medication_id, medication_event_id):
         required: true
         description: The medication event's ID.
         type: string
+      - name: user_id
+        in: query
+        required: false
+        description: The ID of the user owning the medication. Defaults to the requesting user. Monitoring users may read the events of the users they monitor.
+        type: string
     responses:
         200:
             description: Medication event retrieved successfully.
@@ -58,13 +72,15 @@ def handle_get_medication_event(medication_id, medication_event_id):
         500:
             description: Internal server error.
     """
-    # TODO: add authorization for monitoring users to access their monitored users events
-    requesting_user_id = get_user_id(request)
+    requesting_user_id = get_user_id()
     if requesting_user_id is None:
         raise InvalidRequestError("User ID not included in authorization header.")
 
+    user_id = request.args.get("user_id", requesting_user_id)
+    authorize_user_data_access(requesting_user_id, user_id)
+
     try:
-        medication_event = get_medication_event(requesting_user_id, medication_id, medication_event_id)
+        medication_event = get_medication_event(user_id, medication_id, medication_event_id)
     except ValueError:
         return jsonify({
             "success": False,
@@ -117,6 +133,16 @@ def handle_get_medication_events_for_medication(medication_id):
         required: false
         description: The token to start retrieving events from. Will be returned in the response if there are more events to retrieve.
         type: string
+      - name: user_id
+        in: query
+        required: false
+        description: The ID of the user owning the medication. Defaults to the requesting user. Monitoring users may read the events of the users they monitor.
+        type: string
+      - name: If-None-Match
+        in: header
+        required: false
+        description: The ETag of the client's copy of the events. Any write to the user's events changes it.
+        type: string
     responses:
         200:
           description: Medication events retrieved successfully.
@@ -133,16 +159,20 @@ def handle_get_medication_events_for_medication(medication_id):
                   $ref: '#/definitions/MedicationEvent'
               next_token:
                 type: string
+        304:
+          description: None of the user's events changed since the client's copy.
         400:
             description: Invalid request.
         500:
             description: Internal server error.
     """
-    # TODO: add authorization for monitoring users to access their monitored users events
-    requesting_user_id = get_user_id(request)
+    requesting_user_id = get_user_id()
     if requesting_user_id is None:
         raise InvalidRequestError("User ID not included in authorization header.")
 
+    user_id = request.args.get("user_id", requesting_user_id)
+    authorize_user_data_access(requesting_user_id, user_id)
+
     try:
         start_at = datetime.fromisoformat(request.args.get("start_at")) if request.args.get("start_at") else datetime.min
         end_at = datetime.fromisoformat(request.args.get("end_at")) if request.args.get("end_at") else datetime.utcnow()
@@ -160,8 +190,12 @@ def handle_get_medication_events_for_medication(medication_id):
             f"Please use a positive integer value that is less than or equal to {MAX_MEDICATION_EVENTS_PER_PAGE}."
         )
 
+    changed, etag = get_event_version_if_changed(user_id, if_none_match())
+    if not changed:
+        return not_modified(etag)
+
     medications, next_token = get_medication_events_for_medication_controller(
-        user_id=requesting_user_id,
+        user_id=user_id,
         medication_id=medication_id,
         start_at=start_at,
         end_at=end_at,
@@ -169,12 +203,12 @@ def handle_get_medication_events_for_medication(medication_id):
         start_token=request.args.get("start_token"),
     )
 
-    return jsonify({
+    return with_etag(jsonify({
         "success": True,
         "message": "Medication events retrieved successfully",
         "data": [medication_event.to_dict() for medication_event in medications],
         "next_token": next_token
-    }), 200
+    }), etag), 200
 
 
 @medication_events_bp.route('/events/users/<user_id>', methods=['GET'])
@@ -213,6 +247,20 @@ def handle_get_medication_events_for_user(user_id):
         required: false
         description: The token to start retrieving events from. Will be returned in the response if there are more events to retrieve.
         type: string
+      - name: mode
+        in: query
+        required: false
+        description: >
+          How the events are ordered. 'medication' (the default) orders them by medication, then oldest first.
+          'timeline' orders them across all medications, newest first. A start_token only works with the mode it was
+          returned for.
+        type: string
+        enum: [medication, timeline]
+      - name: If-None-Match
+        in: header
+        required: false
+        description: The ETag of the client's copy of the events. Any write to the user's events changes it.
+        type: string
     responses:
         200:
           description: Medication events retrieved successfully.
@@ -229,6 +277,8 @@ def handle_get_medication_events_for_user(user_id):
                   $ref: '#/definitions/MedicationEvent'
               next_token:
                 type: string
+        304:
+          description: None of the user's events changed since the client's copy.
         400:
             description: Invalid request.
         404:
@@ -236,12 +286,10 @@ def handle_get_medication_events_for_user(user_id):
         500:
             description: Internal server error.
     """
-    # TODO: add authorization for monitoring users to access their monitored users events
-    requesting_user_id = get_user_id(request)
+    requesting_user_id = get_user_id()
     if requesting_user_id is None:
         raise InvalidRequestError("User ID not included in authorization header.")
-    if requesting_user_id != user_id:
-        raise InvalidRequestError("User does not have access to this users medications")
+    authorize_user_data_access(requesting_user_id, user_id)
 
     try:
         start_at = datetime.fromisoformat(request.args.get("start_at")) if request.args.get("start_at") else datetime.min
@@ -260,9 +308,21 @@ def handle_get_medication_events_for_user(user_id):
             f"Please use a positive integer value that is less than or equal to {MAX_MEDICATION_EVENTS_PER_PAGE}."
         )
 
+    mode = request.args.get("mode", EVENTS_MODE_MEDICATION)
+    if mode == EVENTS_MODE_MEDICATION:
+        get_events = get_medication_events_for_user
+    elif mode == EVENTS_MODE_TIMELINE:
+        get_events = get_medication_event_timeline
+    else:
+        raise InvalidRequestError(f"Invalid mode. Please use '{EVENTS_MODE_MEDICATION}' or '{EVENTS_MODE_TIMELINE}'.")
+
+    changed, etag = get_event_version_if_changed(user_id, if_none_match())
+    if not changed:
+        return not_modified(etag)
+
     try:
-        medication_events, next_token = get_medication_events_for_user(
-            user_id=requesting_user_id,
+        medication_events, next_token = get_events(
+            user_id=user_id,
             start_at=start_at,
             end_at=end_at,
             limit=limit,
@@ -274,12 +334,12 @@ def handle_get_medication_events_for_user(user_id):
             "message": "Failed to retrieve medication events",
         }), 500
 
-    return jsonify({
+    return with_etag(jsonify({
         "success": True,
         "message": "Medication events retrieved successfully",
         "data": [medication_event.to_dict() for medication_event in medication_events],
         "next_token": next_token
-    }), 200
+    }), etag), 200
 
 
 @medication_events_bp.route('/<medication_id>/events/', methods=['POST'])
@@ -330,7 +390,7 @@ def handle_create_medication_event(medication_id):
             description: Internal server error.
 
     """
-    requesting_user_id = get_user_id(request)
+    requesting_user_id = get_user_id()
     if requesting_user_id is None:
         raise InvalidRequestError("User ID not included in authorization header.")
 
@@ -344,6 +404,85 @@ def handle_create_medication_event(medication_id):
     }), 201
 
 
+@medication_events_bp.route('/events/batch', methods=['POST'])
+@firebase_auth_required
+@validate_json("events")
+def handle_create_medication_events():
+    """
+    Creates a batch of medication events across the requesting user's medications, e.g. taps buffered by a device while
+    it was offline. Events are identified by their medication and timestamp, so sending a batch again is safe.
+    ---
+    tags:
+      - medication events
+    parameters:
+        - in: body
+          name: body
+          required: true
+          properties:
+            events:
+              type: array
+              required: true
+              description: The events to create. At most 500.
+              items:
+                type: object
+                properties:
+                  medication_id:
+                    type: string
+                    required: true
+                  timestamp:
+                    type: string
+                    format: date-time
+                    required: true
+                  dosage:
+                    type: string
+                    required: false
+    responses:
+        200:
+            description: The batch was processed. Each event's result is reported in order.
+            content:
+              application/json:
+                schema:
+                  type: object
+                  properties:
+                    success:
+                      type: boolean
+                    message:
+                      type: string
+                    data:
+                      type: array
+                      items:
+                        type: object
+                        properties:
+                          success:
+                            type: boolean
+                          status:
+                            type: string
+                            enum: [created, duplicate, invalid, not_found]
+                          medication_event_id:
+                            type: string
+                          message:
+                            type: string
+        400:
+            description: Invalid request.
+        404:
+            description: User not found.
+        500:
+            description: Internal server error.
+    """
+    requesting_user_id = get_user_id()
+    if requesting_user_id is None:
+        raise InvalidRequestError("User ID not included in authorization header.")
+
+    # All errors are handled by the src/models/errors/error_handlers.py flask error handlers
+    results = create_medication_events(requesting_user_id, request.json["events"])
+
+    return jsonify({
+        "success": all(result["success"] for result in results),
+        "message": "Medication events processed",
+        "data": results,
+    }), 200
+
+
 @medication_events_bp.route('/<medication_id>/events/<medication_event_id>', methods=['PUT'])
 @firebase_auth_required
 def handle_update_medication_event(medication_id, medication_event_id):
@@ -393,7 +532,7 @@ def handle_update_medication_event(medication_id, medication_event_id):
         500:
             description: Internal server error.
     """
-    requesting_user_id = get_user_id(request)
+    requesting_user_id = get_user_id()
     if requesting_user_id is None:
         raise InvalidRequestError("User ID not included in authorization header.")
 
@@ -449,7 +588,7 @@ def handle_delete_medication_event(medication_id, medication_event_id):
         500:
             description: Failed to delete medication
     """
-    requesting_user_id = get_user_id(request)
+    requesting_user_id = get_user_id()
     if requesting_user_id is None:
         raise InvalidRequestError("User ID not included in authorization header.")
 
@@ -458,3 +597,19 @@ def handle_delete_medication_event(medication_id, medication_event_id):
         "success": True,
         "message": "Medication event deleted successfully"
     }), 204
+
+
+@medication_events_bp.cli.command('rebuild-user-index')
+def rebuild_user_index_command():
+    """
+    Rebuilds every user's event index from their medications' events. Run with
+    `flask --app wsgi events rebuild-user-index`.
+    """
+    indexed, next_token = 0, None
+    while True:
+        users, _, next_token = get_users(next_token, MAX_USERS_PER_PAGE)
+        for user_id, _ in users:
+            indexed += rebuild_user_event_index(user_id)
+        if next_token is None:
+            break
+    click.echo(f"Indexed {indexed} medication events")
@@ -1,23 +1,37 @@
 from datetime import datetime
 
+import click
 from firebase_admin.exceptions import FirebaseError
 from flask import Blueprint, request, jsonify
 
 from src.controllers.medication_controller import (
     create_medication,
     get_medication,
+    get_medication_if_changed,
+    get_medication_version_if_changed,
     update_medication,
     delete_medication,
     get_medications,
     get_scheduled_medications_for_user,
+    get_scheduled_medication_timeline,
+    save_medications,
+    seed_medication_counts,
 )
+from src.controllers.search_controller import search_medications
 from src.models.errors.invalid_request_error import InvalidRequestError
 from src.models.errors.resource_not_found_error import ResourceNotFoundError
 from src.routes.auth import firebase_auth_required, get_user_id
-from src.utils.constants import MAX_MEDICATION_SCHEDULED_TIMES_PER_PAGE
+from src.utils.conditional_requests import if_none_match, not_modified, with_etag
+from src.utils.constants import (
+    MAX_MEDICATION_SCHEDULED_TIMES_PER_PAGE,
+    MAX_MEDICATIONS_PER_PAGE,
+    MAX_SEARCH_RESULTS,
+    SCHEDULE_MODE_MEDICATION,
+    SCHEDULE_MODE_TIMELINE,
+)
 from src.utils.validators import validate_json
 
-medications_bp = Blueprint("medications_bp", __name__)
+medications_bp = Blueprint("medications_bp", __name__, cli_group="medications")
 
 
 @medications_bp.route("/", methods=["GET"])
@@ -29,21 +43,29 @@ def handle_get_medications():
     tags:
         - medications
     parameters:
-        - name: page
+        - name: next_token
           in: query
-          type: integer
+          type: string
           required: false
-          description: The page number to retrieve
-          default: 1
+          description: The token for the next page, from a previous response
         - name: limit
           in: query
           type: integer
           required: false
           description: The number of medications to retrieve, max limit of 50
           default: 50
+        - name: If-None-Match
+          in: header
+          type: string
+          required: false
+          description: The ETag of the client's copy of the page
     responses:
         200:
-            description: A list of medications and the total number of medications
+            description: A page of medications, the total number of medications and the token for the next page
+            headers:
+                ETag:
+                    type: string
+                    description: Identifies this version of the page
             schema:
                 type: object
                 properties:
@@ -61,6 +83,13 @@ def handle_get_medications():
                     total:
                         type: integer
                         description: The total number of medications
+                    next_token:
+                        type: string
+                        description: The token for the next page, or null if this is the last page
+        304:
+            description: The client's copy of the page is current
+        400:
+            description: Invalid request
         401:
             description: Unauthorized
         403:
@@ -68,28 +97,108 @@ def handle_get_medications():
         500:
             description: Failed to fetch medications
     """
-    requesting_user_id = get_user_id(request)
+    requesting_user_id = get_user_id()
     if requesting_user_id is None:
         return jsonify({"success": False, "message": "User not found"}), 403
 
-    page = request.args.get("page", 1, type=int)
-    limit = request.args.get("limit", 50, type=int)
+    limit = request.args.get("limit", MAX_MEDICATIONS_PER_PAGE, type=int)
+    if not 0 < limit <= MAX_MEDICATIONS_PER_PAGE:
+        raise InvalidRequestError(
+            f"Invalid limit value. Please use an integer between 1 and {MAX_MEDICATIONS_PER_PAGE}."
+        )
 
     try:
-        (medications, total) = get_medications(requesting_user_id, page, limit)
+        changed, etag = get_medication_version_if_changed(requesting_user_id, if_none_match())
+        if not changed:
+            return not_modified(etag)
+        (medications, total, next_token) = get_medications(requesting_user_id, request.args.get("next_token"), limit)
     except (ValueError, FirebaseError):
         return (
             jsonify({"success": False, "message": "Failed to retrieve medications"}),
             500,
         )
 
-    return (
+    return with_etag(
         jsonify(
             {
                 "success": True,
                 "message": "Medications found",
                 "data": [medication.to_dict() for medication in medications],
                 "total": total,
+                "next_token": next_token,
+            }
+        ),
+        etag,
+    )
+
+
+@medications_bp.route("/search", methods=["GET"])
+@firebase_auth_required
+def handle_search_medications():
+    """
+    Search the user's medications by name or nickname, matching partial words and tolerating typos
+    ---
+    tags:
+        - medications
+    parameters:
+        - name: q
+          in: query
+          type: string
+          required: true
+          description: The text to search for
+        - name: limit
+          in: query
+          type: integer
+          required: false
+          description: The maximum number of medications to return, max limit of 50
+          default: 10
+    responses:
+        200:
+            description: The best matching medications, best first
+            schema:
+                type: object
+                properties:
+                    success:
+                        type: boolean
+                        description: The status of the response
+                    message:
+                        type: string
+                        description: The message of the response
+                    data:
+                        type: array
+                        description: The medication ID, name, nickname and match score of each match
+        400:
+            description: Invalid request
+        403:
+            description: Forbidden
+        500:
+            description: Failed to search medications
+    """
+    requesting_user_id = get_user_id()
+    if requesting_user_id is None:
+        return jsonify({"success": False, "message": "User not found"}), 403
+
+    query = request.args.get("q", "")
+    limit = request.args.get("limit", 10, type=int)
+    if not query.strip():
+        raise InvalidRequestError("Required query parameter: q")
+    if not 0 < limit <= MAX_SEARCH_RESULTS:
+        raise InvalidRequestError(f"Invalid limit value. Please use an integer between 1 and {MAX_SEARCH_RESULTS}.")
+
+    try:
+        medications = search_medications(requesting_user_id, query, limit)
+    except (ValueError, FirebaseError):
+        return (
+            jsonify({"success": False, "message": "Failed to search medications"}),
+            500,
+        )
+
+    return (
+        jsonify(
+            {
+                "success": True,
+                "message": "Medications found",
+                "data": medications,
             }
         ),
         200,
@@ -110,9 +219,18 @@ def handle_get_medication(medication_id):
           type: string
           required: true
           description: The ID of the medication
+        - name: If-None-Match
+          in: header
+          type: string
+          required: false
+          description: The ETag of the client's copy of the medication
     responses:
         200:
             description: The medication
+            headers:
+                ETag:
+                    type: string
+                    description: Identifies this version of the medication
             schema:
                 type: object
                 properties:
@@ -124,6 +242,8 @@ def handle_get_medication(medication_id):
                         description: The message of the response
                     data:
                         $ref: '#/definitions/Medication'
+        304:
+            description: The client's copy of the medication is current
         401:
             description: Unauthorized
         404:
@@ -132,12 +252,14 @@ def handle_get_medication(medication_id):
             description: Failed to retrieve medication
 
     """
-    requesting_user_id = get_user_id(request)
+    requesting_user_id = get_user_id()
     if requesting_user_id is None:
         return jsonify({"success": False, "message": "User not found"}), 403
 
     try:
-        medication = get_medication(requesting_user_id, medication_id)
+        changed, medication, etag = get_medication_if_changed(requesting_user_id, medication_id, if_none_match())
+        if not changed:
+            return not_modified(etag)
         if medication is None:
             return jsonify({"success": False, "message": "Medication not found"}), 404
     except (ValueError, FirebaseError):
@@ -147,12 +269,15 @@ def handle_get_medication(medication_id):
         )
 
     return (
-        jsonify(
-            {
-                "success": True,
-                "message": "Medication found",
-                "data": medication.to_dict(),
-            }
+        with_etag(
+            jsonify(
+                {
+                    "success": True,
+                    "message": "Medication found",
+                    "data": medication.to_dict(),
+                }
+            ),
+            etag,
         ),
         200,
     )
@@ -194,7 +319,7 @@ def handle_create_medication():
         500:
             description: Internal server error
     """
-    requesting_user_id = get_user_id(request)
+    requesting_user_id = get_user_id()
     if requesting_user_id is None:
         return jsonify({"success": False, "message": "User not found"}), 403
 
@@ -224,6 +349,94 @@ def handle_create_medication():
     )
 
 
+@medications_bp.route("/bulk", methods=["POST"])
+@firebase_auth_required
+@validate_json("medications")
+def handle_save_medications():
+    """
+    Create and update several medications at once, e.g. a discharge list when onboarding a patient
+    ---
+    tags:
+        - medications
+    parameters:
+        - in: body
+          name: body
+          required: true
+          schema:
+            type: object
+            properties:
+                medications:
+                    type: array
+                    description: >
+                        At most 50 medications. Items with a medication_id update that medication, the others create
+                        a new one.
+                    items:
+                        $ref: '#/definitions/Medication'
+    responses:
+        200:
+            description: The medications were processed. Each item's result is reported in order.
+            schema:
+                type: object
+                properties:
+                    success:
+                        type: boolean
+                        description: Whether every item succeeded
+                    message:
+                        type: string
+                        description: The message of the response
+                    data:
+                        type: array
+                        items:
+                            type: object
+                            properties:
+                                success:
+                                    type: boolean
+                                status:
+                                    type: string
+                                    enum: [created, updated, invalid, not_found]
+                                medication_id:
+                                    type: string
+                                data:
+                                    type: object
+                                message:
+                                    type: string
+        400:
+            description: Invalid request
+        403:
+            description: User not found
+        500:
+            description: Internal server error
+    """
+    requesting_user_id = get_user_id()
+    if requesting_user_id is None:
+        return jsonify({"success": False, "message": "User not found"}), 403
+
+    try:
+        results = save_medications(requesting_user_id, request.json["medications"])
+    except InvalidRequestError as ex:
+        return (
+            jsonify(
+                {"success": False, "error": ex.message, "message": "Invalid request"}
+            ),
+            400,
+        )
+    except ResourceNotFoundError:
+        return jsonify({"success": False, "message": "User not found"}), 403
+    except (ValueError, TypeError, FirebaseError):
+        return jsonify({"success": False, "message": "Internal server error"}), 500
+
+    return (
+        jsonify(
+            {
+                "success": all(result["success"] for result in results),
+                "message": "Medications processed",
+                "data": results,
+            }
+        ),
+        200,
+    )
+
+
 @medications_bp.route("/<medication_id>", methods=["PUT"])
 @firebase_auth_required
 def handle_update_medication(medication_id):
@@ -264,7 +477,7 @@ def handle_update_medication(medication_id):
         500:
             description: Failed to update medication
     """
-    requesting_user_id = get_user_id(request)
+    requesting_user_id = get_user_id()
     if requesting_user_id is None:
         return jsonify({"success": False, "message": "User not found"}), 403
 
@@ -345,7 +558,7 @@ def handle_delete_medication(medication_id):
         500:
             description: Failed to delete medication
     """
-    requesting_user_id = get_user_id(request)
+    requesting_user_id = get_user_id()
     if requesting_user_id is None:
         return jsonify({"success": False, "message": "User not found"}), 403
 
@@ -424,6 +637,15 @@ def handle_get_scheduled_medications(user_id):
         required: false
         description: The token to start retrieving events from. Will be returned in the response if there are more events to retrieve.
         type: string
+      - name: mode
+        in: query
+        required: false
+        description: >
+          How the timestamps are ordered. 'medication' (the default) orders them by medication, then by time.
+          'timeline' orders them by time across all medications. A next_token only works with the mode it was
+          returned for.
+        type: string
+        enum: [medication, timeline]
     responses:
         200:
           description: Medication scheduled timestamps retrieved successfully.
@@ -458,7 +680,7 @@ def handle_get_scheduled_medications(user_id):
         500:
             description: Internal server error.
     """
-    requesting_user_id = get_user_id(request)
+    requesting_user_id = get_user_id()
     if requesting_user_id is None:
         raise InvalidRequestError("User ID not included in ID token.")
     if requesting_user_id != user_id:
@@ -487,7 +709,17 @@ def handle_get_scheduled_medications(user_id):
             f"Please use a positive integer value that is less than or equal to {MAX_MEDICATION_SCHEDULED_TIMES_PER_PAGE}."
         )
 
-    timestamps, nxt_token = get_scheduled_medications_for_user(
+    mode = request.args.get("mode", SCHEDULE_MODE_MEDICATION)
+    if mode == SCHEDULE_MODE_MEDICATION:
+        get_scheduled_times = get_scheduled_medications_for_user
+    elif mode == SCHEDULE_MODE_TIMELINE:
+        get_scheduled_times = get_scheduled_medication_timeline
+    else:
+        raise InvalidRequestError(
+            f"Invalid mode. Please use '{SCHEDULE_MODE_MEDICATION}' or '{SCHEDULE_MODE_TIMELINE}'."
+        )
+
+    timestamps, nxt_token = get_scheduled_times(
         user_id=user_id,
         start_at=start_at_dt,
         end_at=end_at_dt,
@@ -501,3 +733,14 @@ def handle_get_scheduled_medications(user_id):
         "data": timestamps,
         "next_token": nxt_token
     }), 200
+
+
+@medications_bp.cli.command("seed-counts")
+def seed_medication_counts_command():
+    """
+    Resets every user's medication counter to the number of medications they have, should the counters drift. Run
+    with `flask --app wsgi medications seed-counts`.
+    """
+    counted = seed_medication_counts()
+    click.echo(f"Counted the medications of {counted} users")
+
@@ -0,0 +1,108 @@
+import hmac
+import os
+import tempfile
+import time
+
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, request
+
+from src.utils.metrics import MetricsRegistry
+
+METRICS_ENABLED = "METRICS_ENABLED"
+METRICS_DIR = "METRICS_DIR"
+METRICS_TOKEN = "METRICS_TOKEN"
+
+metrics_bp = Blueprint('metrics_bp', __name__)
+
+
+def init_metrics(app: Flask) -> None:
+    """
+    Registers request metrics and the `/metrics` endpoint for the Flask app. Must be called before any other
+    `before_request` hook is registered, so that requests they reject are measured too.
+
+    Args:
+        app: (Flask) The Flask app to configure.
+
+    Notes:
+        if METRICS_ENABLED is set to 'false', no metrics are recorded. Worker processes aggregate their metrics through
+        the directory at METRICS_DIR. Without it, each app gets a directory of its own in the temporary directory;
+        gunicorn_config.py sets one up for its workers to share. `/metrics` is only served when METRICS_TOKEN is set,
+        to scrapers that send it as a bearer token.
+    """
+    if os.getenv(METRICS_ENABLED, "true").lower() == "false":
+        return
+
+    app.config[METRICS_TOKEN] = os.getenv(METRICS_TOKEN)
+
+    app.extensions["metrics"] = MetricsRegistry(os.getenv(METRICS_DIR) or tempfile.mkdtemp(prefix="taprx_metrics_"))
+    app.before_request(start_request_metrics)
+    app.after_request(record_request_metrics)
+    app.teardown_request(finish_request_metrics)
+    app.register_blueprint(metrics_bp)
+
+
+def start_request_metrics() -> None:
+    g.metrics_started_at = time.perf_counter()
+    g.metrics_recorded = False
+    current_app.extensions["metrics"].inc("http_requests_in_flight")
+
+
+def record_request_metrics(response: Response) -> Response:
+    _record_request(response.status_code)
+    return response
+
+
+def finish_request_metrics(exception: BaseException | None) -> None:
+    if "metrics_started_at" not in g:
+        return
+    if not g.metrics_recorded:
+        # after_request does not run for unhandled exceptions, which are served as 500s.
+        _record_request(500)
+    current_app.extensions["metrics"].inc("http_requests_in_flight", value=-1)
+
+
+def _record_request(status_code: int) -> None:
+    if "metrics_started_at" not in g or g.metrics_recorded:
+        return
+    g.metrics_recorded = True
+
+    registry = current_app.extensions["metrics"]
+    endpoint = request.endpoint or "unmatched"
+    duration = time.perf_counter() - g.metrics_started_at
+    registry.inc("http_requests_total", {"endpoint": endpoint, "method": request.method, "status": str(status_code)})
+    registry.observe("http_request_duration_seconds", {"endpoint": endpoint, "method": request.method}, duration)
+    registry.observe("http_request_firebase_calls", {"endpoint": endpoint}, g.get("firebase_calls", 0))
+    registry.observe("http_request_firebase_seconds", {"endpoint": endpoint}, g.get("firebase_seconds", 0.0))
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def handle_get_metrics():
+    """
+    Retrieve the API's metrics, aggregated across worker processes, in the Prometheus text exposition format
+    ---
+    tags:
+      - metrics
+    produces:
+      - text/plain
+    parameters:
+      - name: Authorization
+        in: header
+        type: string
+        required: true
+        description: Bearer followed by the metrics token
+    responses:
+      200:
+        description: The metrics
+      401:
+        description: The metrics token is missing or wrong
+      404:
+        description: No metrics token is configured
+    """
+    token = current_app.config.get(METRICS_TOKEN)
+    if not token:
+        return jsonify({"success": False, "message": "Not found"}), 404
+
+    expected = f"Bearer {token}".encode()
+    if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected):
+        return jsonify({"success": False, "message": "Invalid metrics token"}), 401
+
+    return Response(current_app.extensions["metrics"].render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,229 @@
+import hmac
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, request, send_file
+
+from src.routes.auth import authenticate_caller, get_principal
+from src.utils.profiler import RequestProfile, prune_profiles
+
+PROFILER_ENABLED = "PROFILER_ENABLED"
+PROFILER_TOKEN = "PROFILER_TOKEN"
+PROFILER_DIR = "PROFILER_DIR"
+PROFILER_MAX_PER_MINUTE = "PROFILER_MAX_PER_MINUTE"
+PROFILER_MAX_PROFILES = "PROFILER_MAX_PROFILES"
+DEFAULT_PROFILER_DIR = os.path.join(tempfile.gettempdir(), "taprx_profiles")
+
+PROFILE_HEADER = "X-Profile-Token"
+PROFILE_QUERY_FLAG = "_profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+ADMIN_CLAIM = "admin"
+
+_PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+profiling_bp = Blueprint('profiling_bp', __name__)
+
+
+class ProfilingBudget:
+    """
+    Limits profiling to one request at a time, and to a number of requests per sliding minute, per worker process.
+    """
+
+    def __init__(self, max_per_minute: int, clock=time.monotonic):
+        """
+        Initialize a new profiling budget
+
+        Args:
+            max_per_minute: {int} The number of requests that may be profiled per minute.
+            clock: {Callable[[], float]} Returns the current time in seconds. Optional.
+        """
+        self.max_per_minute = max_per_minute
+        self._clock = clock
+        self._started: deque[float] = deque()
+        self._lock = threading.Lock()
+        self._active = False
+
+    def acquire(self) -> bool:
+        """
+        Returns:
+            bool: Whether a request may be profiled now. Must be followed by `release` if True.
+        """
+        with self._lock:
+            now = self._clock()
+            while self._started and self._started[0] <= now - 60:
+                self._started.popleft()
+            if self._active or len(self._started) >= self.max_per_minute:
+                return False
+            self._started.append(now)
+            self._active = True
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._active = False
+
+
+def init_profiler(app: Flask) -> None:
+    """
+    Registers on-demand request profiling for the Flask app. Must be called after `init_auth` and `init_rate_limiter`,
+    so that only authenticated, admitted requests are profiled.
+
+    A request is profiled when it carries the X-Profile-Token header set to PROFILER_TOKEN, or when an admin caller
+    (one whose ID token has the `admin` custom claim) adds the `_profile=1` query flag. The profile is stored in
+    PROFILER_DIR as pstats and collapsed stacks, and its ID is returned in the X-Profile-Id header.
+
+    Args:
+        app: (Flask) The Flask app to configure.
+
+    Notes:
+        if PROFILER_ENABLED is set to 'false', no requests are profiled. At most PROFILER_MAX_PER_MINUTE requests
+        (default 6) are profiled per minute per worker, one at a time, and the latest PROFILER_MAX_PROFILES profiles
+        (default 50) are kept.
+    """
+    if os.getenv(PROFILER_ENABLED, "true").lower() == "false":
+        return
+
+    app.config[PROFILER_TOKEN] = os.getenv(PROFILER_TOKEN)
+    app.config[PROFILER_DIR] = os.getenv(PROFILER_DIR, DEFAULT_PROFILER_DIR)
+    app.config[PROFILER_MAX_PROFILES] = int(os.getenv(PROFILER_MAX_PROFILES, "50"))
+    app.extensions["profiling_budget"] = ProfilingBudget(int(os.getenv(PROFILER_MAX_PER_MINUTE, "6")))
+    app.before_request(start_profiling)
+    app.after_request(finish_profiling)
+    app.teardown_request(stop_profiling)
+    app.register_blueprint(profiling_bp)
+
+
+def has_profiler_token() -> bool:
+    """
+    Returns:
+        bool: True if the current request carries the profiler token.
+    """
+    token = current_app.config.get(PROFILER_TOKEN)
+    header = request.headers.get(PROFILE_HEADER)
+    return bool(token and header and hmac.compare_digest(header.encode(), token.encode()))
+
+
+def is_profiling_authorized() -> bool:
+    """
+    Checks whether the caller of the current request may profile requests or read profiles.
+
+    Returns:
+        bool: True if the request carries the profiler token, or was made by an admin principal.
+    """
+    if has_profiler_token():
+        return True
+
+    principal = get_principal()
+    return principal is not None and principal.claims.get(ADMIN_CLAIM) is True
+
+
+def _is_profiling_requested() -> bool:
+    if request.headers.get(PROFILE_HEADER) is not None:
+        return True
+    return request.args.get(PROFILE_QUERY_FLAG) in ("1", "true")
+
+
+def start_profiling() -> None:
+    if request.blueprint == profiling_bp.name or not _is_profiling_requested() or not is_profiling_authorized():
+        return
+
+    budget = current_app.extensions["profiling_budget"]
+    if not budget.acquire():
+        current_app.logger.warning(f"Profiling budget exhausted, not profiling {request.endpoint}")
+        return
+
+    g.request_profile = RequestProfile(uuid.uuid4().hex)
+    g.request_profile.start()
+
+
+def finish_profiling(response: Response) -> Response:
+    profile = _stop_request_profile()
+    if profile is None:
+        return response
+
+    try:
+        profile.save(current_app.config[PROFILER_DIR])
+        prune_profiles(current_app.config[PROFILER_DIR], current_app.config[PROFILER_MAX_PROFILES])
+    except OSError as ex:
+        current_app.logger.error(f"Failed to store profile {profile.profile_id}: {ex}")
+        return response
+
+    current_app.logger.info(
+        f"Profiled {request.method} {request.path} ({request.endpoint}) as {profile.profile_id} "
+        f"in {profile.duration_seconds * 1000:.1f}ms"
+    )
+    response.headers[PROFILE_ID_HEADER] = profile.profile_id
+    return response
+
+
+def stop_profiling(exception: BaseException | None) -> None:
+    # after_request does not run for unhandled exceptions, so the profiler is also released on teardown.
+    _stop_request_profile()
+
+
+def _stop_request_profile() -> RequestProfile | None:
+    profile = g.pop("request_profile", None)
+    if profile is not None:
+        profile.stop()
+        current_app.extensions["profiling_budget"].release()
+    return profile
+
+
+@profiling_bp.route('/profiles/<profile_id>', methods=['GET'])
+def handle_get_profile(profile_id: str):
+    """
+    Download a stored request profile. Requires the profiler token or an admin caller.
+    ---
+    tags:
+      - profiling
+    parameters:
+      - name: profile_id
+        in: path
+        type: string
+        required: true
+        description: The profile ID, from the X-Profile-Id header of the profiled response
+      - name: format
+        in: query
+        type: string
+        enum: [collapsed, pstats]
+        required: false
+        description: collapsed stacks for flame graphs (default), or a cProfile pstats dump
+      - name: X-Profile-Token
+        in: header
+        type: string
+        required: false
+        description: The profiler token. Not needed for admin callers.
+    responses:
+      200:
+        description: The profile
+      401:
+        description: Neither the profiler token nor an Authorization header was sent
+      403:
+        description: The caller may not read profiles
+      404:
+        description: Profile not found
+    """
+    # The profiler token is enough on its own; only callers without it must be admins signed in with Firebase Auth.
+    if not has_profiler_token():
+        auth_error = authenticate_caller()
+        if auth_error is not None:
+            return auth_error
+        if not is_profiling_authorized():
+            return jsonify({"success": False, "message": "Insufficient permissions"}), 403
+
+    profile_format = request.args.get("format", "collapsed")
+    if not _PROFILE_ID_PATTERN.match(profile_id) or profile_format not in ("collapsed", "pstats"):
+        return jsonify({"success": False, "message": "Profile not found"}), 404
+
+    path = os.path.join(current_app.config[PROFILER_DIR], f"{profile_id}.{profile_format}")
+    if not os.path.exists(path):
+        return jsonify({"success": False, "message": "Profile not found"}), 404
+
+    if profile_format == "pstats":
+        return send_file(path, mimetype="application/octet-stream", as_attachment=True)
+    return send_file(path, mimetype="text/plain")
@@ -0,0 +1,115 @@
+import json
+import math
+import os
+import sqlite3
+import tempfile
+from typing import Optional
+
+from flask import Flask, Response, current_app, jsonify, request
+
+from src.routes.auth import get_principal
+from src.utils.rate_limiter import TokenBucketRateLimiter
+
+RATE_LIMIT_ENABLED = "RATE_LIMIT_ENABLED"
+RATE_LIMIT_DB_PATH = "RATE_LIMIT_DB_PATH"
+RATE_LIMIT_CAPACITY = "RATE_LIMIT_CAPACITY"
+RATE_LIMIT_REFILL_PER_SECOND = "RATE_LIMIT_REFILL_PER_SECOND"
+RATE_LIMIT_COSTS = "RATE_LIMIT_COSTS"
+
+# Token cost of each endpoint, for endpoints that cost more than the default of 1. Endpoints that fan out across all
+# of a user's medications or scan many nodes cost more.
+DEFAULT_ENDPOINT_COSTS = {
+    "users_bp.handle_get_users": 5,
+    "medication_events_bp.handle_get_medication_events_for_user": 5,
+    "medications_bp.handle_get_scheduled_medications": 3,
+}
+
+# Batch endpoints also cost tokens for each item of the list under a key of their JSON body, so a batch costs about as
+# much as the requests it replaces. A batch of events is written in one update, so its events cost less than as many
+# single creates. Costs are capped at the bucket capacity, so a full batch can always be admitted.
+ENDPOINT_ITEM_COSTS = {
+    "medication_events_bp.handle_create_medication_events": ("events", 0.1),
+    "medications_bp.handle_save_medications": ("medications", 1),
+}
+
+
+def rate_limiting_enabled() -> bool:
+    return os.getenv(RATE_LIMIT_ENABLED, "true").lower() != "false"
+
+
+def init_rate_limiter(app: Flask) -> None:
+    """
+    Registers per-user rate limiting for the Flask app. Must be called after `init_auth`, as requests are limited by
+    their authenticated principal.
+
+    Args:
+        app: (Flask) The Flask app to configure.
+
+    Notes:
+        if RATE_LIMIT_ENABLED is set to 'false', no limits are enforced. Buckets hold RATE_LIMIT_CAPACITY tokens
+        (default 60), refill at RATE_LIMIT_REFILL_PER_SECOND tokens per second (default 1) and are shared by all
+        workers through the SQLite file at RATE_LIMIT_DB_PATH. Without it, each app gets a file of its own in the
+        temporary directory, which suits a single process; gunicorn_config.py sets one up for its workers to share.
+        RATE_LIMIT_COSTS is an optional JSON object of endpoint costs overriding `DEFAULT_ENDPOINT_COSTS`.
+    """
+    if not rate_limiting_enabled():
+        return
+
+    app.config[RATE_LIMIT_COSTS] = {**DEFAULT_ENDPOINT_COSTS, **json.loads(os.getenv(RATE_LIMIT_COSTS, "{}"))}
+    app.extensions["rate_limiter"] = TokenBucketRateLimiter(
+        path=os.getenv(RATE_LIMIT_DB_PATH) or os.path.join(tempfile.mkdtemp(prefix="taprx_"), "rate_limits.sqlite3"),
+        capacity=float(os.getenv(RATE_LIMIT_CAPACITY, "60")),
+        refill_rate=float(os.getenv(RATE_LIMIT_REFILL_PER_SECOND, "1")),
+    )
+    app.before_request(enforce_rate_limit)
+
+
+def enforce_rate_limit() -> Optional[tuple[Response, int]]:
+    """
+    Charges the authenticated caller for the requested endpoint. Registered as a `before_request` hook by
+    `init_rate_limiter`. Unauthenticated requests are not limited here.
+
+    Returns:
+        Optional[tuple[Response, int]]: A 429 response with a Retry-After header if the caller is out of tokens,
+        otherwise None.
+    """
+    principal = get_principal()
+    if principal is None or principal.user_id is None:
+        return None
+
+    cost = request_cost()
+    try:
+        allowed, retry_after = current_app.extensions["rate_limiter"].acquire(principal.user_id, cost)
+    except sqlite3.Error as ex:
+        # Fail open: an unavailable bucket store must not take the API down with it.
+        current_app.logger.error(f"Rate limiter failure for user {principal.user_id}: {ex}")
+        return None
+
+    if allowed:
+        return None
+
+    response = jsonify({
+        "success": False,
+        "message": "Too many requests",
+        "error": f"Rate limit exceeded. Retry in {math.ceil(retry_after)} seconds."
+    })
+    response.headers["Retry-After"] = str(math.ceil(retry_after))
+    return response, 429
+
+
+def request_cost() -> float:
+    """
+    Returns the token cost of the current request: its endpoint's cost, plus the cost of its items for batch endpoints.
+    A body that is not a valid batch is charged the endpoint's cost only, and rejected by the endpoint itself.
+
+    Returns:
+        float: The number of tokens the request costs.
+    """
+    cost = current_app.config[RATE_LIMIT_COSTS].get(request.endpoint, 1)
+    if request.endpoint in ENDPOINT_ITEM_COSTS:
+        key, item_cost = ENDPOINT_ITEM_COSTS[request.endpoint]
+        body = request.get_json(silent=True)
+        items = body.get(key) if isinstance(body, dict) else None
+        if isinstance(items, list):
+            cost += len(items) * item_cost
+    return cost
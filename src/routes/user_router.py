@@ -1,10 +1,17 @@
+import click
+from firebase_admin.exceptions import FirebaseError
 from flask import Blueprint, current_app, jsonify, request
 
-from src.controllers.user_controller import get_users, update_user, create_user, get_user
+from src.controllers.search_controller import rebuild_search_names, search_users
+from src.controllers.user_controller import (
+    get_users, update_user, create_user, get_user_if_changed, rebuild_user_search_index, seed_user_count
+)
 from src.routes.auth import firebase_auth_required, verify_user
+from src.utils.conditional_requests import if_none_match, not_modified, with_etag
+from src.utils.constants import MAX_SEARCH_RESULTS, MAX_USERS_PER_PAGE
 from src.utils.validators import validate_json
 
-users_bp = Blueprint('users_bp', __name__)
+users_bp = Blueprint('users_bp', __name__, cli_group='users')
 
 
 @users_bp.route('/', methods=['GET'])
@@ -16,26 +23,27 @@ def handle_get_users():
     tags:
         - users
     parameters:
-      - name: page
-        in: query
-        type: integer
-        required: false
-        description: Page number
-        default: 1
       - name: page_size
         in: query
         type: integer
         required: false
         description: Number of users per page
         default: 50
+      - name: next_token
+        in: query
+        type: string
+        required: false
+        description: The token for the next page, from a previous response
       - name: name
         in: query
         type: string
         required: false
-        description: Filter users by name
+        description: >
+          Filter users by name. Matches users with, for every word of the filter, a word of their first or last name
+          starting with it, ignoring case. For example "jo do" matches "John Doe", but "ohn" does not.
     responses:
       200:
-        description: A list of users and the UID for the next page
+        description: A page of users and the token for the next page
         schema:
           type: object
           properties:
@@ -50,9 +58,14 @@ def handle_get_users():
               description: The list of users
               items:
                 $ref: '#/definitions/User'
-            next_page:
+            total:
+              type: integer
+              description: The total number of users. Left out when filtering by name.
+            next_token:
               type: string
-              description: The UID for the next page
+              description: The token for the next page, or null if this is the last page
+      400:
+        description: Invalid query parameters
       401:
         description: Unauthorized
       500:
@@ -60,39 +73,39 @@ def handle_get_users():
     """
 
     # Fetch query parameters for pagination
-    page = request.args.get('page', 1)  # Page number
     page_size = request.args.get('page_size', 50)  # Number of users per page
+    next_token = request.args.get('next_token', None)  # Cursor from the previous page
     name = request.args.get('name', None)  # Filter users by name
 
-    # Check that page and page_size are integers
+    # Check that page_size is an integer
     try:
-        page = int(page)
         page_size = int(page_size)
     except ValueError:
         return jsonify({
             "success": False,
             "message": "Invalid query parameters",
-            "error": "Page and page_size must be integers"
+            "error": "page_size must be an integer"
         }), 400
 
-    if page < 1 or page_size < 1:
+    if not 0 < page_size <= MAX_USERS_PER_PAGE:
         return jsonify({
             "success": False,
             "message": "Invalid query parameters",
-            "error": "Page and page_size must be greater than 0"
+            "error": f"page_size must be between 1 and {MAX_USERS_PER_PAGE}"
         }), 400
 
-    offset = (page - 1) * page_size
-    limit = page_size
-
     try:
-        users, total = get_users(offset, limit, name)
-        return jsonify({
+        users, total, next_token = get_users(next_token, page_size, name)
+        response = {
             "success": True,
             "message": "Users found",
             "data": users,
-            "total": total
-        }), 200
+            "total": total,
+            "next_token": next_token
+        }
+        if total is None:
+            del response["total"]
+        return jsonify(response), 200
     except (ValueError, TypeError) as e:
         current_app.logger.critical(f"Failed to fetch users: {e}")
         return jsonify({
@@ -102,6 +115,83 @@ def handle_get_users():
         }), 500
 
 
+@users_bp.route('/search', methods=['GET'])
+@firebase_auth_required
+def handle_search_users():
+    """
+    Search users by first or last name, matching partial words and tolerating typos
+    ---
+    tags:
+        - users
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: The text to search for
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of users to return
+        default: 10
+    responses:
+      200:
+        description: The best matching users, best first
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+              description: The status of the response
+            message:
+              type: string
+              description: The message of the response
+            data:
+              type: array
+              description: The UID, names and match score of each match
+      400:
+        description: Invalid query parameters
+      401:
+        description: Unauthorized
+      500:
+        description: Failed to search users
+    """
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', 10)
+
+    try:
+        limit = int(limit)
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "message": "Invalid query parameters",
+            "error": "limit must be an integer"
+        }), 400
+
+    if not query.strip() or not 0 < limit <= MAX_SEARCH_RESULTS:
+        return jsonify({
+            "success": False,
+            "message": "Invalid query parameters",
+            "error": f"q is required and limit must be between 1 and {MAX_SEARCH_RESULTS}"
+        }), 400
+
+    try:
+        users = search_users(query, limit)
+        return jsonify({
+            "success": True,
+            "message": "Users found",
+            "data": users
+        }), 200
+    except (ValueError, TypeError, FirebaseError) as e:
+        current_app.logger.critical(f"Failed to search users: {e}")
+        return jsonify({
+            "success": False,
+            "message": "Failed to search users",
+            "error": str(e)
+        }), 500
+
+
 @users_bp.route('/<user_id>', methods=['GET'])
 @firebase_auth_required
 def handle_get_user(user_id):
@@ -116,9 +206,18 @@ def handle_get_user(user_id):
         type: string
         required: true
         description: The UID of the user
+      - name: If-None-Match
+        in: header
+        type: string
+        required: false
+        description: The ETag of the client's copy of the user
     responses:
       200:
         description: A list of users and the UID for the next page
+        headers:
+          ETag:
+            type: string
+            description: Identifies this version of the user
         schema:
           type: object
           properties:
@@ -134,6 +233,8 @@ def handle_get_user(user_id):
               description: The found user
               items:
                 $ref: '#/definitions/User'
+      304:
+        description: The client's copy of the user is current
       401:
         description: Unauthorized
       404:
@@ -141,17 +242,19 @@ def handle_get_user(user_id):
       500:
         description: Failed to fetch user
     """
-    user_verified, error_response = verify_user(user_id, request)
+    user_verified, error_response = verify_user(user_id)
     if not user_verified:
         return error_response
 
     try:
-        user = get_user(user_id)
-        return jsonify({
+        changed, user, etag = get_user_if_changed(user_id, if_none_match())
+        if not changed:
+            return not_modified(etag)
+        return with_etag(jsonify({
             "success": True,
             "message": "User found",
             "data": user
-        }), 200
+        }), etag), 200
     except (ValueError, TypeError) as e:
         current_app.logger.critical(f"Failed to fetch user: {e}")
         return jsonify({
@@ -205,7 +308,7 @@ def handle_create_user():
     """
 
     user_id = request.json["user_id"]
-    user_verified, error_response = verify_user(user_id, request)
+    user_verified, error_response = verify_user(user_id)
     if not user_verified:
         return error_response
 
@@ -270,7 +373,7 @@ def handle_update_user(user_id):
       500:
         description: Internal server error
     """
-    user_verified, error_response = verify_user(user_id, request)
+    user_verified, error_response = verify_user(user_id)
     if not user_verified:
         return error_response
 
@@ -287,3 +390,33 @@ def handle_update_user(user_id):
             "message": "Failed to update user",
             "error": str(e)
         }), 500
+
+
+@users_bp.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """
+    Rebuilds the user name search index from every user. Run with `flask --app wsgi users rebuild-search-index`.
+    """
+    indexed = rebuild_user_search_index()
+    click.echo(f"Indexed {indexed} users")
+
+
+@users_bp.cli.command('seed-user-count')
+def seed_user_count_command():
+    """
+    Resets the user counter to the number of users in the database, should it drift. Run with
+    `flask --app wsgi users seed-user-count`.
+    """
+    user_count = seed_user_count()
+    click.echo(f"Counted {user_count} users")
+
+
+@users_bp.cli.command('rebuild-search-names')
+def rebuild_search_names_command():
+    """
+    Rebuilds the mirror of user and medication names that the search indexes are built from. Run with
+    `flask --app wsgi users rebuild-search-names`.
+    """
+    mirrored = rebuild_search_names()
+    click.echo(f"Mirrored the names of {mirrored} users")
+
@@ -0,0 +1,31 @@
+from flask import Response, request
+
+
+def if_none_match() -> str | None:
+    """
+    Returns the ETag the client sent in If-None-Match, unquoted, or None if it sent none, several or `*`.
+    """
+    etags = request.if_none_match
+    if etags.star_tag:
+        return None
+    candidates = etags.as_set(include_weak=True)
+    return next(iter(candidates)) if len(candidates) == 1 else None
+
+
+def not_modified(etag: str) -> Response:
+    """
+    Returns an empty 304 Not Modified response carrying the ETag.
+    """
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def with_etag(response: Response, etag: str | None) -> Response:
+    """
+    Sets the ETag of a response, if there is one.
+    """
+    if etag:
+        response.set_etag(etag)
+    return response
+
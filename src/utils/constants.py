@@ -1,5 +1,17 @@
 MAX_MEDICATION_EVENTS_PER_PAGE = 250
 GET_MED_EVENTS_FOR_USER_NEXT_TOKEN_DELIMITER = "#"
+EVENTS_MODE_MEDICATION = "medication"
+EVENTS_MODE_TIMELINE = "timeline"
+MAX_MEDICATION_EVENTS_PER_BATCH = 500
 
 MAX_MEDICATION_SCHEDULED_TIMES_PER_PAGE = 250
-GET_MED_SCHEDULED_TIMES_DELIMITER = "#"
\ No newline at end of file
+GET_MED_SCHEDULED_TIMES_DELIMITER = "#"
+SCHEDULE_MODE_MEDICATION = "medication"
+SCHEDULE_MODE_TIMELINE = "timeline"
+
+MAX_USERS_PER_PAGE = 100
+MAX_MEDICATIONS_PER_PAGE = 50
+MAX_MEDICATIONS_PER_BULK_REQUEST = 50
+USER_SCAN_BATCH_SIZE = 200
+
+MAX_SEARCH_RESULTS = 50
@@ -0,0 +1,256 @@
+import json
+import logging
+import re
+import threading
+import time
+from typing import Callable, Optional
+
+import jwt
+import requests
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from firebase_admin import auth
+
+GOOGLE_SIGNING_KEYS_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+)
+FIREBASE_ISSUER_PREFIX = "https://securetoken.google.com/"
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+def load_public_key(pem: str):
+    """
+    Loads an RSA public key from either an X.509 certificate (as served by Google) or a bare public key in PEM format.
+
+    Args:
+        pem: (str) The PEM encoded certificate or public key.
+
+    Returns:
+        The public key object.
+
+    Raises:
+        ValueError: If the PEM data cannot be parsed.
+    """
+    data = pem.encode("utf-8")
+    try:
+        return x509.load_pem_x509_certificate(data).public_key()
+    except ValueError:
+        return serialization.load_pem_public_key(data)
+
+
+class SigningKeyStore:
+    """
+    Keeps the Google signing keys for Firebase ID tokens in memory.
+
+    Keys are either loaded once from a local JSON file mapping key IDs to PEM data, or fetched from Google and kept
+    fresh by a daemon thread that refreshes them before the `Cache-Control: max-age` of the last response runs out.
+    The first fetch also happens on that thread, so starting the store never blocks. Lookups never perform I/O.
+    """
+
+    def __init__(
+            self,
+            url: Optional[str] = GOOGLE_SIGNING_KEYS_URL,
+            refresh_margin: float = 300,
+            retry_interval: float = 30,
+            timeout: float = 10,
+            session: Optional[requests.Session] = None,
+            clock: Callable[[], float] = time.time
+    ):
+        """
+        Initialize a new signing key store
+
+        Args:
+            url: {str} The URL serving the signing certificates. None for a store that is only loaded from files.
+            refresh_margin: {float} Seconds before expiry at which to refresh the keys.
+            retry_interval: {float} Seconds to wait before retrying a failed refresh.
+            timeout: {float} Timeout in seconds for fetching the keys.
+            session: {requests.Session} The session used to fetch the keys. Optional.
+            clock: {Callable[[], float]} Returns the current UNIX time in seconds. Optional.
+        """
+        self.url = url
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self._session = session or requests.Session()
+        self._clock = clock
+        self._keys: dict = {}
+        self.expires_at: float = float("inf")
+        self._loaded = threading.Event()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_file(cls, path: str) -> "SigningKeyStore":
+        """
+        Creates a store holding the keys of a local JSON file, e.g. a saved copy of the Google certificates.
+
+        Args:
+            path: (str) Path to a JSON object mapping key IDs to PEM encoded certificates or public keys.
+
+        Returns:
+            SigningKeyStore: A store that never refreshes.
+        """
+        store = cls(url=None)
+        with open(path, "r") as file:
+            store.set_keys(json.load(file))
+        return store
+
+    def set_keys(self, pem_by_kid: dict, expires_at: float = float("inf")) -> None:
+        keys = {kid: load_public_key(pem) for kid, pem in pem_by_kid.items()}
+        # Swap the whole mapping so concurrent readers never observe a partial update.
+        self._keys = keys
+        self.expires_at = expires_at
+        self._loaded.set()
+
+    def get(self, kid: str):
+        return self._keys.get(kid)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded.is_set()
+
+    def wait_until_loaded(self, timeout: float) -> bool:
+        """
+        Waits for the first set of keys to be loaded.
+
+        Args:
+            timeout: (float) The longest time to wait, in seconds.
+
+        Returns:
+            bool: Whether any keys have been loaded.
+        """
+        return self._loaded.wait(timeout)
+
+    def refresh(self) -> None:
+        """
+        Fetches the current signing keys. Called on the refresh thread.
+
+        Raises:
+            requests.RequestException, ValueError: If the keys cannot be fetched or parsed.
+        """
+        response = self._session.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        match = _MAX_AGE_PATTERN.search(response.headers.get("Cache-Control", ""))
+        max_age = int(match.group(1)) if match else 3600
+        self.set_keys(response.json(), expires_at=self._clock() + max_age)
+        logger.info(f"Refreshed {len(self._keys)} Firebase signing keys, valid for {max_age}s")
+
+    def _next_refresh_delay(self) -> float:
+        return max(self.expires_at - self.refresh_margin - self._clock(), 0)
+
+    def _run(self) -> None:
+        delay = self._next_refresh_delay() if self._loaded.is_set() else 0
+        while not self._stopped.is_set():
+            self._wake.wait(timeout=delay)
+            self._wake.clear()
+            if self._stopped.is_set():
+                return
+            try:
+                self.refresh()
+                delay = self._next_refresh_delay()
+            except (requests.RequestException, ValueError) as ex:
+                logger.error(f"Failed to refresh Firebase signing keys: {ex}")
+                delay = self.retry_interval
+
+    def start(self) -> None:
+        """
+        Starts the background refresh thread, which loads the keys straight away. Does not block, and a failed initial
+        load is retried in the background.
+        """
+        if self.url is None or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="signing-key-refresh", daemon=True)
+        self._thread.start()
+
+    def request_refresh(self) -> None:
+        """
+        Asks the refresh thread to fetch the keys now, e.g. after seeing an unknown key ID. Does not block.
+        """
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+
+
+class IdTokenVerifier:
+    """
+    Verifies Firebase ID tokens locally with PyJWT against the keys of a SigningKeyStore.
+
+    Performs the same checks as `firebase_admin.auth.verify_id_token` (algorithm, signature, expiry, audience, issuer
+    and subject) and raises the same exception types, without ever blocking on I/O.
+    """
+
+    def __init__(self, project_id: str, key_store: SigningKeyStore, clock_skew_seconds: int = 0):
+        """
+        Initialize a new ID token verifier
+
+        Args:
+            project_id: {str} The Firebase project ID the tokens must be issued for.
+            key_store: {SigningKeyStore} The store holding the signing keys.
+            clock_skew_seconds: {int} Leeway in seconds when checking `exp` and `iat`. Optional.
+        """
+        if not project_id:
+            raise ValueError("A Firebase project ID is required to verify ID tokens")
+
+        self.project_id = project_id
+        self.issuer = FIREBASE_ISSUER_PREFIX + project_id
+        self.key_store = key_store
+        self.clock_skew_seconds = clock_skew_seconds
+
+    def verify_id_token(self, id_token: str) -> dict:
+        """
+        Verifies an ID token and returns its claims.
+
+        Args:
+            id_token: (str) The raw ID token.
+
+        Returns:
+            dict: The decoded claims, with `uid` set to the subject like `firebase_admin.auth.verify_id_token`.
+
+        Raises:
+            auth.ExpiredIdTokenError: If the token has expired.
+            auth.InvalidIdTokenError: If the token is malformed, signed by an unknown key or has invalid claims.
+        """
+        try:
+            header = jwt.get_unverified_header(id_token)
+        except jwt.PyJWTError as ex:
+            raise auth.InvalidIdTokenError(f"Malformed ID token: {ex}", cause=ex)
+
+        if header.get("alg") != "RS256":
+            raise auth.InvalidIdTokenError(f"ID token has incorrect algorithm. Expected RS256, got {header.get('alg')}")
+
+        key = self.key_store.get(header.get("kid"))
+        if key is None and not self.key_store.loaded:
+            # The store is still making its first fetch, which is bounded by its timeout.
+            self.key_store.wait_until_loaded(self.key_store.timeout)
+            key = self.key_store.get(header.get("kid"))
+        if key is None:
+            self.key_store.request_refresh()
+            raise auth.InvalidIdTokenError(f"ID token was signed by unknown key {header.get('kid')}")
+
+        try:
+            claims = jwt.decode(
+                id_token,
+                key,
+                algorithms=["RS256"],
+                audience=self.project_id,
+                issuer=self.issuer,
+                leeway=self.clock_skew_seconds,
+                options={"require": ["exp", "iat", "aud", "iss", "sub"]},
+            )
+        except jwt.ExpiredSignatureError as ex:
+            raise auth.ExpiredIdTokenError("ID token has expired", ex)
+        except jwt.PyJWTError as ex:
+            raise auth.InvalidIdTokenError(f"Invalid ID token: {ex}", cause=ex)
+
+        subject = claims["sub"]
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise auth.InvalidIdTokenError("ID token has an invalid sub (subject) claim")
+
+        claims["uid"] = subject
+        return claims
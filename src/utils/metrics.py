@@ -0,0 +1,288 @@
+import glob
+import json
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from flask import current_app, g, has_app_context, has_request_context
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CALL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+# Metric name -> (type, help text, histogram buckets)
+METRIC_DEFINITIONS = {
+    "http_requests_total": (COUNTER, "Total HTTP requests by endpoint, method and status code.", None),
+    "http_request_duration_seconds": (HISTOGRAM, "HTTP request latency by endpoint and method.", LATENCY_BUCKETS),
+    "http_requests_in_flight": (GAUGE, "HTTP requests currently being served.", None),
+    "http_request_firebase_calls": (HISTOGRAM, "Firebase calls made per HTTP request by endpoint.", CALL_COUNT_BUCKETS),
+    "http_request_firebase_seconds": (
+        HISTOGRAM, "Time spent in Firebase calls per HTTP request by endpoint.", LATENCY_BUCKETS
+    ),
+    "firebase_calls_total": (COUNTER, "Total Firebase calls by path template and operation.", None),
+    "firebase_call_duration_seconds": (
+        HISTOGRAM, "Firebase call latency by path template and operation.", LATENCY_BUCKETS
+    ),
+}
+
+
+# Every registry in the process, so that one fork hook can reset them all.
+_registries: "weakref.WeakSet[MetricsRegistry]" = weakref.WeakSet()
+
+
+def _reset_registries_after_fork() -> None:
+    for registry in list(_registries):
+        registry._reset()
+
+
+os.register_at_fork(after_in_child=_reset_registries_after_fork)
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """
+    Process-local store of counters, gauges and histograms that is aggregated across gunicorn workers.
+
+    Each process updates its metrics in memory and periodically writes a snapshot to `metrics_<pid>_<start>.json` in
+    a directory shared by the workers. The start time keeps a worker that reuses an exited worker's PID from
+    overwriting its totals. `render` merges the snapshots of every process into the Prometheus text exposition format:
+    counters and histograms are summed, as are the gauges of live processes.
+    """
+
+    def __init__(self, directory: str, flush_interval: float = 1.0):
+        """
+        Initialize a new metrics registry
+
+        Args:
+            directory: {str} Directory shared by the worker processes for their snapshots.
+            flush_interval: {float} Seconds between snapshots of this process's metrics.
+        """
+        self.directory = directory
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._reset()
+        _registries.add(self)
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, tuple], float] = {}
+        self._histograms: dict[tuple[str, tuple], list] = {}
+        self._dirty = False
+        self._flush_thread = None
+        self._started_at = time.time_ns()
+
+    def _ensure_flush_thread(self) -> None:
+        if self._flush_thread is None:
+            self._flush_thread = threading.Thread(target=self._run_flush, name="metrics-flush", daemon=True)
+            self._flush_thread.start()
+
+    def _run_flush(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                self.flush()
+
+    def inc(self, name: str, labels: dict = None, value: float = 1) -> None:
+        """
+        Increments a counter or gauge.
+
+        Args:
+            name: (str) The metric name, from `METRIC_DEFINITIONS`.
+            labels: (dict) The metric labels. Optional.
+            value: (float) The amount to add; may be negative for gauges. Optional.
+        """
+        key = (name, _labels_key(labels or {}))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+            self._dirty = True
+        self._ensure_flush_thread()
+
+    def observe(self, name: str, labels: dict, value: float) -> None:
+        """
+        Records an observation in a histogram.
+
+        Args:
+            name: (str) The metric name, from `METRIC_DEFINITIONS`.
+            labels: (dict) The metric labels.
+            value: (float) The observed value.
+        """
+        buckets = METRIC_DEFINITIONS[name][2]
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # One count per bucket, one for +Inf, then the sum of the observations.
+                histogram = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            histogram[bisect_left(buckets, value)] += 1
+            histogram[-1] += value
+            self._dirty = True
+        self._ensure_flush_thread()
+
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.directory, f"metrics_{os.getpid()}_{self._started_at}.json")
+
+    def _snapshot(self) -> dict:
+        return {
+            "values": [[name, list(labels), value] for (name, labels), value in self._values.items()],
+            "histograms": [[name, list(labels), list(counts)] for (name, labels), counts in self._histograms.items()],
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self._snapshot()
+
+    def flush(self) -> None:
+        """
+        Writes this process's snapshot atomically, so readers never see a partial file.
+        """
+        # Cleared with the snapshot taken, so an observation recorded after it marks the registry dirty again.
+        with self._lock:
+            snapshot = self._snapshot()
+            self._dirty = False
+        path = self._snapshot_path()
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(snapshot, file)
+        os.replace(temporary_path, path)
+
+    def collect(self) -> tuple[dict, dict]:
+        """
+        Merges the snapshots of every process, including a fresh one of this process.
+
+        Returns:
+            tuple[dict, dict]: Summed counter/gauge values and histogram counts, keyed by (name, labels).
+        """
+        self.flush()
+        values: dict[tuple[str, tuple], float] = {}
+        histograms: dict[tuple[str, tuple], list] = {}
+        for path in glob.glob(os.path.join(self.directory, "metrics_*.json")):
+            try:
+                with open(path, "r") as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in snapshot["values"]:
+                key = (name, tuple(tuple(label) for label in labels))
+                values[key] = values.get(key, 0) + value
+            for name, labels, counts in snapshot["histograms"]:
+                key = (name, tuple(tuple(label) for label in labels))
+                merged = histograms.setdefault(key, [0] * len(counts))
+                for i, count in enumerate(counts):
+                    merged[i] += count
+        return values, histograms
+
+    def render(self) -> str:
+        """
+        Returns:
+            str: The metrics of every process in the Prometheus text exposition format.
+        """
+        values, histograms = self.collect()
+        lines = []
+        for name, (metric_type, help_text, buckets) in METRIC_DEFINITIONS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if metric_type != HISTOGRAM:
+                for (metric_name, labels), value in sorted(values.items()):
+                    if metric_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+
+            for (metric_name, labels), counts in sorted(histograms.items()):
+                if metric_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + [float("inf")], counts[:-1]):
+                    cumulative += count
+                    lines.append(
+                        f"{name}_bucket{_format_labels(labels, (('le', _format_value(bound)),))} {cumulative}"
+                    )
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(counts[-1])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def mark_process_dead(directory: str, pid: int) -> None:
+    """
+    Zeroes the gauges of an exited worker so they no longer count towards the live total. Its counters and histograms
+    are kept, so totals do not go backwards. Intended for gunicorn's `child_exit` hook.
+
+    Args:
+        directory: (str) The metrics directory.
+        pid: (int) The process ID of the exited worker.
+    """
+    # Earlier workers with the same PID have had their gauges zeroed already, so zeroing them again is harmless.
+    for path in glob.glob(os.path.join(directory, f"metrics_{pid}_*.json")):
+        try:
+            with open(path, "r") as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            continue
+        snapshot["values"] = [
+            [name, labels, 0 if METRIC_DEFINITIONS.get(name, (None,))[0] == GAUGE else value]
+            for name, labels, value in snapshot["values"]
+        ]
+        # Replaced atomically like a live snapshot, as `render` may be reading it in another worker.
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(snapshot, file)
+        os.replace(temporary_path, path)
+
+
+def clear_metrics_directory(directory: str) -> None:
+    """
+    Removes the snapshots of a previous run. Intended for gunicorn's `on_starting` hook.
+
+    Args:
+        directory: (str) The metrics directory.
+    """
+    for path in glob.glob(os.path.join(directory, "metrics_*.json*")):
+        os.remove(path)
+
+
+def record_firebase_call(path_template: str, operation: str, duration_seconds: float) -> None:
+    """
+    Records a Firebase call in the app's metrics, and against the current request when there is one.
+
+    Args:
+        path_template: (str) The database path with its IDs replaced by placeholders, e.g. `/users/{user_id}`.
+        operation: (str) The operation, e.g. `get` or `update`.
+        duration_seconds: (float) The wall time of the call.
+    """
+    if not has_app_context():
+        return
+    registry = current_app.extensions.get("metrics")
+    if registry is None:
+        return
+
+    labels = {"path": path_template, "operation": operation}
+    registry.inc("firebase_calls_total", labels)
+    registry.observe("firebase_call_duration_seconds", labels, duration_seconds)
+    if has_request_context():
+        g.firebase_calls = g.get("firebase_calls", 0) + 1
+        g.firebase_seconds = g.get("firebase_seconds", 0.0) + duration_seconds
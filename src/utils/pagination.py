@@ -1,3 +1,7 @@
+import base64
+import binascii
+
+
 def create_next_token(fields: list[str], delimiter: str) -> str | None:
     if not fields or not delimiter:
         return None
@@ -13,3 +17,23 @@ def parse_start_tkn(start_token: str | None, delimiter: str, expected_len: int =
         return [None] * expected_len if expected_len else None
     start_token_fields = start_token.split(delimiter)
     return start_token_fields
+
+
+def encode_cursor(key: str) -> str:
+    """
+    Encodes a database key as an opaque, URL-safe page cursor.
+    """
+    return base64.urlsafe_b64encode(key.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    """
+    Decodes a page cursor created by `encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError) as ex:
+        raise ValueError(f"Invalid cursor: {cursor}") from ex
@@ -0,0 +1,129 @@
+import cProfile
+import glob
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples the call stack of one thread at a fixed interval from a background thread, and counts the samples by
+    stack in the collapsed format used by flame graph tools.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005, max_samples: int = 10000):
+        """
+        Initialize a new stack sampler
+
+        Args:
+            thread_id: {int} The identifier of the thread to sample.
+            interval: {float} Seconds between samples.
+            max_samples: {int} The number of samples after which sampling stops, bounding the cost of long requests.
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_samples = max_samples
+        self.stacks: Counter[str] = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        samples = 0
+        while samples < self.max_samples and not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(labels))] += 1
+            samples += 1
+
+    def collapsed(self) -> str:
+        """
+        Returns:
+            str: One `frame;frame;frame count` line per sampled stack, root frame first.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+class RequestProfile:
+    """
+    Profiles the current thread with cProfile, while a `StackSampler` records its collapsed stacks.
+    """
+
+    def __init__(self, profile_id: str, sample_interval: float = 0.005):
+        """
+        Initialize a new request profile
+
+        Args:
+            profile_id: {str} The identifier the profile is stored under.
+            sample_interval: {float} Seconds between stack samples.
+        """
+        self.profile_id = profile_id
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), interval=sample_interval)
+        self.duration_seconds = None
+        self._started_at = None
+
+    def start(self) -> None:
+        self._started_at = time.perf_counter()
+        self.sampler.start()
+        self.profiler.enable()
+
+    def stop(self) -> None:
+        self.profiler.disable()
+        self.sampler.stop()
+        self.duration_seconds = time.perf_counter() - self._started_at
+
+    def save(self, directory: str) -> tuple[str, str]:
+        """
+        Writes the profile to `<profile_id>.pstats` and `<profile_id>.collapsed` in the given directory.
+
+        Args:
+            directory: (str) The directory to write to.
+
+        Returns:
+            tuple[str, str]: The paths of the pstats and collapsed stack files.
+        """
+        os.makedirs(directory, exist_ok=True)
+        pstats_path = os.path.join(directory, f"{self.profile_id}.pstats")
+        collapsed_path = os.path.join(directory, f"{self.profile_id}.collapsed")
+        pstats.Stats(self.profiler).dump_stats(pstats_path)
+        with open(collapsed_path, "w") as file:
+            file.write(self.sampler.collapsed())
+        return pstats_path, collapsed_path
+
+
+def prune_profiles(directory: str, max_profiles: int) -> None:
+    """
+    Deletes the oldest profiles so that at most `max_profiles` remain in the directory.
+
+    Args:
+        directory: (str) The profile directory.
+        max_profiles: (int) The number of profiles to keep.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "*.pstats")), key=os.path.getmtime)
+    for pstats_path in paths[:max(len(paths) - max_profiles, 0)]:
+        for path in (pstats_path, pstats_path[:-len(".pstats")] + ".collapsed"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,82 @@
+import hashlib
+import random
+import threading
+import time
+from typing import Callable
+
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+
+class PushIdGenerator:
+    """
+    Generates child keys in the format of the Firebase clients' push IDs, without a round trip to the database: 8
+    characters of the time in milliseconds, then 12 random characters. IDs sort in the order they were generated, as
+    keys generated by `push()` do, so they can be mixed with them.
+
+    Within a millisecond, or if the clock goes back, the previous time is kept and the random part is incremented, so
+    the IDs from one generator stay strictly increasing.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time, rng: random.Random = None):
+        """
+        Initialize a new push ID generator
+
+        Args:
+            clock: {Callable[[], float]} Returns the time in seconds since the epoch. Optional.
+            rng: {random.Random} Source of the random part. Optional.
+        """
+        self._clock = clock
+        self._random = rng or random.SystemRandom()
+        self._last_time = 0
+        self._last_random = [0] * 12
+        self._lock = threading.Lock()
+
+    def __call__(self) -> str:
+        with self._lock:
+            now = int(self._clock() * 1000)
+            if now <= self._last_time:
+                now = self._last_time
+                for i in range(11, -1, -1):
+                    if self._last_random[i] != 63:
+                        self._last_random[i] += 1
+                        break
+                    self._last_random[i] = 0
+                else:
+                    # All 64^12 IDs of the millisecond are used; move on to the next one.
+                    now += 1
+                    self._last_random = [self._random.randrange(64) for _ in range(12)]
+            else:
+                self._last_random = [self._random.randrange(64) for _ in range(12)]
+            self._last_time = now
+            random_chars = "".join(PUSH_CHARS[i] for i in self._last_random)
+
+        return _encode_time(now) + random_chars
+
+
+generate_push_id = PushIdGenerator()
+
+
+def derive_push_id(timestamp_millis: int, *parts: str) -> str:
+    """
+    Derives a push ID from a time and the parts identifying a record, so that writing the same record twice writes the
+    same key. The ID sorts by the given time, like a push ID generated at that time; the random part is replaced by a
+    hash of the parts.
+
+    Args:
+        timestamp_millis: (int) The time in milliseconds since the epoch. Times before the epoch count as the epoch.
+        *parts: (str) The parts identifying the record.
+
+    Returns:
+        str: The push ID.
+    """
+    digest = int.from_bytes(hashlib.sha256("\x00".join(parts).encode()).digest()[:9], "big")
+    hash_chars = "".join(PUSH_CHARS[(digest >> (6 * i)) % 64] for i in range(11, -1, -1))
+    return _encode_time(max(timestamp_millis, 0)) + hash_chars
+
+
+def _encode_time(timestamp_millis: int) -> str:
+    timestamp_chars = []
+    for _ in range(8):
+        timestamp_chars.append(PUSH_CHARS[timestamp_millis % 64])
+        timestamp_millis //= 64
+    return "".join(reversed(timestamp_chars))
@@ -0,0 +1,127 @@
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+
+class TokenBucketRateLimiter:
+    """
+    Per-key token-bucket rate limiter whose buckets live in a local SQLite file, so every gunicorn worker process and
+    thread sharing the file enforces the same budget.
+
+    Each bucket holds up to `capacity` tokens and refills continuously at `refill_rate` tokens per second. A request is
+    admitted if its bucket holds at least the request's cost. Buckets are read and updated in a single immediate
+    transaction, so concurrent workers never double-spend tokens. A bucket that has refilled completely is the same as
+    no bucket, so such buckets are deleted every `prune_interval` seconds to keep the file from growing with every
+    user ever seen.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            capacity: float,
+            refill_rate: float,
+            prune_interval: float = 300,
+            clock: Callable[[], float] = time.time
+    ):
+        """
+        Initialize a new rate limiter
+
+        Args:
+            path: {str} Path to the SQLite file shared by the worker processes.
+            capacity: {float} The maximum number of tokens in a bucket, i.e. the largest burst allowed.
+            refill_rate: {float} The number of tokens added to a bucket per second.
+            prune_interval: {float} Seconds between deletions of full buckets. Optional.
+            clock: {Callable[[], float]} Returns the current UNIX time in seconds. Optional.
+        """
+        if capacity <= 0 or refill_rate <= 0:
+            raise ValueError("capacity and refill_rate must be positive")
+
+        self.path = path
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.prune_interval = prune_interval
+        self._clock = clock
+        self._local = threading.local()
+        self._next_prune_at = clock() + prune_interval
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections are opened lazily per thread, so each forked worker gets its own.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets "
+                "(bucket_key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def acquire(self, key: str, cost: float = 1) -> tuple[bool, float]:
+        """
+        Takes `cost` tokens from the bucket for `key` if it holds enough of them.
+
+        Args:
+            key: (str) The bucket key, e.g. the requesting user's ID.
+            cost: (float) The number of tokens the request costs. Capped at the bucket capacity.
+
+        Returns:
+            tuple[bool, float]: Whether the request is admitted, and if not, the seconds until enough tokens are
+            available.
+
+        Raises:
+            sqlite3.Error: If the bucket store cannot be read or written.
+        """
+        cost = min(cost, self.capacity)
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = self._clock()
+            row = connection.execute(
+                "SELECT tokens, updated_at FROM token_buckets WHERE bucket_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                tokens = self.capacity
+            else:
+                tokens = min(self.capacity, row[0] + max(now - row[1], 0) * self.refill_rate)
+
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+                retry_after = 0.0
+            else:
+                retry_after = (cost - tokens) / self.refill_rate
+
+            connection.execute(
+                "INSERT INTO token_buckets (bucket_key, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(bucket_key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (key, tokens, now),
+            )
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            connection.execute("ROLLBACK")
+            raise
+
+        if now >= self._next_prune_at:
+            self._next_prune_at = now + self.prune_interval
+            self.prune()
+
+        return allowed, retry_after
+
+    def prune(self) -> int:
+        """
+        Deletes the buckets that have refilled to capacity since they were last used.
+
+        Returns:
+            int: The number of buckets deleted.
+
+        Raises:
+            sqlite3.Error: If the bucket store cannot be written.
+        """
+        cursor = self._connection().execute(
+            "DELETE FROM token_buckets WHERE updated_at + (? - tokens) / ? <= ?",
+            (self.capacity, self.refill_rate, self._clock()),
+        )
+        return cursor.rowcount
@@ -0,0 +1,91 @@
+import re
+
+# Appended to a prefix to form the end of a key range query matching every key that starts with the prefix.
+PREFIX_RANGE_END = "\uf8ff"
+
+_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+def name_tokens(*names: str | None) -> list[str]:
+    """
+    Normalizes names into the tokens they are searchable by: lowercase runs of letters and digits.
+
+    Args:
+        *names: (str | None) The names to tokenize. Anything that is not a string is ignored.
+
+    Returns:
+        list[str]: The distinct tokens, sorted.
+    """
+    tokens = set()
+    for name in names:
+        if isinstance(name, str):
+            tokens.update(_TOKEN_PATTERN.findall(name.lower()))
+    return sorted(tokens)
+
+
+def user_search_key(token: str, user_id: str) -> str:
+    """
+    Returns the key of a user's entry for a token in the /user_search index. Keys start with the token, so every entry
+    whose token starts with a prefix falls in one key range.
+    """
+    return f"{token} {user_id}"
+
+
+def user_search_entries(user_id: str, first_name: str | None, last_name: str | None) -> dict[str, str]:
+    """
+    Builds a user's entries in the /user_search index: one per name token, keyed by `user_search_key`. Each entry holds
+    all of the user's tokens, space separated, so multi-word searches can be filtered without loading the user.
+
+    Returns:
+        dict[str, str]: The index entries, by key.
+    """
+    tokens = name_tokens(first_name, last_name)
+    return {user_search_key(token, user_id): " ".join(tokens) for token in tokens}
+
+
+def matches_search(search_tokens: list[str], entry_tokens: list[str]) -> bool:
+    """
+    Returns whether every search token is a prefix of at least one of the entry's tokens.
+    """
+    return all(any(token.startswith(search_token) for token in entry_tokens) for search_token in search_tokens)
+
+
+def user_name_updates(user_id: str, user_data: dict) -> dict:
+    """
+    Builds the multi-path update entries that mirror a user's names into /search_names/users, the small node the
+    in-memory search indexes are built from. Only the names present in `user_data` are included.
+
+    Returns:
+        dict: The update entries, by path relative to the root.
+    """
+    return {
+        f"search_names/users/{user_id}/{key}": user_data[key] for key in ("first_name", "last_name") if key in user_data
+    }
+
+
+def medication_name_updates(user_id: str, medication_id: str, medication_data: dict) -> dict:
+    """
+    Builds the multi-path update entries that mirror a medication's name and nickname into /search_names/medications.
+    Only the fields present in `medication_data` are included.
+
+    Returns:
+        dict: The update entries, by path relative to the root.
+    """
+    return {
+        f"search_names/medications/{user_id}/{medication_id}/{key}": medication_data[key]
+        for key in ("name", "nickname")
+        if key in medication_data
+    }
+
+
+def medication_names(medications: dict | None) -> dict:
+    """
+    Returns the /search_names/medications node of a user with the given medications, by medication ID.
+    """
+    if not isinstance(medications, dict):
+        return {}
+    return {
+        medication_id: {"name": medication_data.get("name"), "nickname": medication_data.get("nickname")}
+        for medication_id, medication_data in medications.items()
+        if isinstance(medication_data, dict)
+    }
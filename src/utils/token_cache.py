@@ -0,0 +1,105 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class TokenCache:
+    """
+    A bounded, thread-safe LRU cache of verified Firebase ID tokens.
+
+    Entries are keyed by the SHA-256 digest of the raw token, so the tokens themselves are never held in memory, and
+    each entry expires at the token's `exp` claim.
+    """
+
+    def __init__(self, max_size: int = 1024, clock: Callable[[], float] = time.time):
+        """
+        Initialize a new token cache
+
+        Args:
+            max_size: {int} The maximum number of tokens to keep before evicting the least recently used one.
+            clock: {Callable[[], float]} Returns the current UNIX time in seconds. Optional.
+        """
+        if max_size <= 0:
+            raise ValueError("max_size must be a positive, non-zero integer")
+
+        self.max_size = max_size
+        self._clock = clock
+        self._entries: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _key(id_token: str) -> bytes:
+        return hashlib.sha256(id_token.encode("utf-8")).digest()
+
+    def get(self, id_token: str) -> Optional[dict]:
+        """
+        Looks up the decoded claims of a previously verified token.
+
+        Args:
+            id_token: (str) The raw ID token.
+
+        Returns:
+            Optional[dict]: The decoded claims if the token is cached and has not expired, otherwise None.
+        """
+        key = self._key(id_token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, decoded_token = entry
+            if self._clock() >= expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return decoded_token
+
+    def put(self, id_token: str, decoded_token: dict) -> None:
+        """
+        Stores the decoded claims of a verified token until its `exp` claim. Tokens without a numeric `exp` claim, or
+        that have already expired, are not cached.
+
+        Args:
+            id_token: (str) The raw ID token.
+            decoded_token: (dict) The claims returned by the verifier.
+        """
+        expires_at = decoded_token.get("exp") if isinstance(decoded_token, dict) else None
+        if not isinstance(expires_at, (int, float)) or self._clock() >= expires_at:
+            return
+
+        key = self._key(id_token)
+        with self._lock:
+            self._entries[key] = (expires_at, decoded_token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: The current size of the cache and its hit/miss counters.
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,200 @@
+import heapq
+import itertools
+import re
+import sys
+import threading
+from collections import Counter
+from typing import Any, Hashable, Iterable, NamedTuple
+
+_WORD_PATTERN = re.compile(r"[^\W_]+")
+
+
+class SearchResult(NamedTuple):
+    document_id: Hashable
+    score: float
+    payload: Any
+
+
+def words(text: str | None) -> set[str]:
+    """
+    Splits text into its lowercase words: runs of letters and digits. Anything that is not a string has no words.
+    """
+    if not isinstance(text, str):
+        return set()
+    return set(_WORD_PATTERN.findall(text.lower()))
+
+
+def trigrams(word: str) -> set[str]:
+    """
+    Splits a word into its trigrams, padded with two leading spaces and one trailing space so the start of a word
+    weighs more than its end.
+    """
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    In-memory index for substring and typo tolerant search over short texts such as names.
+
+    Search is two-level. The distinct words of all documents form a vocabulary, indexed by trigram, so each query word
+    is matched against the vocabulary rather than against every document. A word matches a query word with the share
+    of the query word's trigrams it contains. Documents are then found through the matched words, and score the mean,
+    over the query words, of their best word match. The cost of a search grows with the number of similar words and of
+    documents returned, not with the size of the index.
+
+    Documents can be added under a scope, such as the user owning them, and are then only found by searches in that
+    scope.
+    """
+
+    def __init__(self):
+        self._word_trigrams: dict[str, frozenset[str]] = {}
+        self._trigram_words: dict[str, set[str]] = {}
+        self._word_documents: dict[tuple[Hashable, str], set[Hashable]] = {}
+        self._word_references: dict[str, int] = {}
+        self._documents: dict[Hashable, tuple[Hashable, frozenset[str], Any]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._word_trigrams)
+
+    def add(self, document_id: Hashable, texts: Iterable[str | None], payload: Any = None, scope: Hashable = None):
+        """
+        Adds a document, replacing any document with the same ID.
+
+        Args:
+            document_id: (Hashable) The document's ID.
+            texts: (Iterable[str | None]) The texts the document is found by.
+            payload: (Any) Returned with the document in search results. Optional.
+            scope: (Hashable) The scope the document is searched in. Optional.
+        """
+        # Interned, so every document shares one copy of each word.
+        document_words = frozenset(sys.intern(word) for text in texts for word in words(text))
+        with self._lock:
+            self._remove(document_id)
+            self._documents[document_id] = (scope, document_words, payload)
+            for word in document_words:
+                self._word_documents.setdefault((scope, word), set()).add(document_id)
+                self._word_references[word] = self._word_references.get(word, 0) + 1
+                if word not in self._word_trigrams:
+                    self._word_trigrams[word] = frozenset(trigrams(word))
+                    for gram in self._word_trigrams[word]:
+                        self._trigram_words.setdefault(gram, set()).add(word)
+
+    def get(self, document_id: Hashable) -> Any:
+        """
+        Returns the payload of a document, or None if the document is not in the index.
+        """
+        with self._lock:
+            document = self._documents.get(document_id)
+            return document[2] if document is not None else None
+
+    def remove(self, document_id: Hashable) -> None:
+        with self._lock:
+            self._remove(document_id)
+
+    def _remove(self, document_id: Hashable) -> None:
+        document = self._documents.pop(document_id, None)
+        if document is None:
+            return
+        scope, document_words, _ = document
+        for word in document_words:
+            _discard(self._word_documents, (scope, word), document_id)
+            self._word_references[word] -= 1
+            if self._word_references[word] == 0:
+                del self._word_references[word]
+                for gram in self._word_trigrams.pop(word):
+                    _discard(self._trigram_words, gram, word)
+
+    def _match_words(self, query_word: str, min_score: float) -> dict[str, float]:
+        query_grams = trigrams(query_word)
+        counts = Counter()
+        for gram in query_grams:
+            vocabulary_words = self._trigram_words.get(gram)
+            if vocabulary_words:
+                counts.update(vocabulary_words)
+        min_count = max(1.0, min_score * len(query_grams))
+        return {word: count / len(query_grams) for word, count in counts.items() if count >= min_count}
+
+    def search(self, query: str, limit: int = 10, min_score: float = 0.5, scope: Hashable = None) -> list[SearchResult]:
+        """
+        Finds the documents in a scope whose words best match the query's words.
+
+        Args:
+            query: (str) The text to search for.
+            limit: (int) Maximum number of results.
+            min_score: (float) Minimum score of a document, and of a word match, between 0 and 1. Optional.
+            scope: (Hashable) The scope to search in. Optional.
+
+        Returns:
+            list[SearchResult]: The best matches, best first. Documents with equal scores are ordered by ID.
+        """
+        query_words = sorted(words(query))
+        if not query_words:
+            return []
+
+        with self._lock:
+            matches = [self._match_words(query_word, min_score) for query_word in query_words]
+
+            if len(matches) == 1:
+                results = self._search_word(matches[0], limit, scope)
+            else:
+                results = self._search_words(matches, limit, min_score, scope)
+            return [
+                SearchResult(document_id, round(score, 4), self._documents[document_id][2])
+                for document_id, score in results
+            ]
+
+    def _search_word(self, word_matches: dict[str, float], limit: int, scope: Hashable) -> list[tuple[Hashable, float]]:
+        # A document scores its best word match, so documents can be taken a score at a time, best first, stopping as
+        # soon as the page is full.
+        results = []
+        taken = set()
+        by_score = sorted(word_matches.items(), key=lambda match: -match[1])
+        for score, group in itertools.groupby(by_score, key=lambda match: match[1]):
+            documents = set().union(*(self._word_documents.get((scope, word), ()) for word, _ in group)) - taken
+            page = heapq.nsmallest(limit - len(results), documents)
+            results.extend((document_id, score) for document_id in page)
+            taken.update(page)
+            if len(results) >= limit:
+                break
+        return results
+
+    def _search_words(
+            self, matches: list[dict[str, float]], limit: int, min_score: float, scope: Hashable
+    ) -> list[tuple[Hashable, float]]:
+        # A document missing one of the query words scores at most (n - 1) / n, so when enough documents matching
+        # every query word score higher than that, the other documents need not be scored.
+        matching = [
+            set().union(*(self._word_documents.get((scope, word), ()) for word in word_matches))
+            for word_matches in matches
+        ]
+        results = self._score_documents(set.intersection(*matching), matches, limit, min_score)
+        if len(results) == limit and results[-1][1] > (len(matches) - 1) / len(matches):
+            return results
+        return self._score_documents(set.union(*matching), matches, limit, min_score)
+
+    def _score_documents(
+            self, documents: set[Hashable], matches: list[dict[str, float]], limit: int, min_score: float
+    ) -> list[tuple[Hashable, float]]:
+        scored = []
+        for document_id in documents:
+            document_words = self._documents[document_id][1]
+            score = sum(
+                max((word_matches.get(word, 0.0) for word in document_words), default=0.0)
+                for word_matches in matches
+            ) / len(matches)
+            if score >= min_score:
+                scored.append((document_id, score))
+        return heapq.nsmallest(limit, scored, key=lambda result: (-result[1], result[0]))
+
+
+def _discard(sets: dict[Hashable, set], key: Hashable, member: Hashable) -> None:
+    members = sets[key]
+    members.discard(member)
+    if not members:
+        del sets[key]
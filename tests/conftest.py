@@ -4,6 +4,8 @@ from unittest.mock import patch
 
 import pytest
 
+from src.database.memory_db import MemoryDatabase
+
 
 def mock_decorator(f):
     @wraps(f)
@@ -17,9 +19,11 @@ patch("src.routes.auth.firebase_auth_required", mock_decorator).start()
 
 
 @pytest.fixture
-def app():
+def app(tmp_path, tmp_path_factory):
     os.environ["FIREBASE_CREDENTIALS_PATH"] = "test_credentials.json"
     os.environ["FIREBASE_DB_URL"] = "test_db_url"
+    os.environ["RATE_LIMIT_DB_PATH"] = str(tmp_path / "rate_limits.sqlite3")
+    os.environ["METRICS_DIR"] = str(tmp_path_factory.mktemp("metrics"))
     from src.app import create_app
 
     with patch("src.database.firebase_config.initialize_firebase_app"), \
@@ -37,3 +41,10 @@ def app():
 @pytest.fixture()
 def client(app):
     return app.test_client()
+
+
+@pytest.fixture
+def memory_db(app):
+    database = MemoryDatabase()
+    app.extensions["memory_database"] = database
+    return database
@@ -1,95 +1,136 @@
-import os
-from unittest.mock import MagicMock
-from src.routes.auth import verify_user, get_user_id
+from unittest.mock import patch
+
 import pytest
+from firebase_admin import auth
+from flask import g, jsonify
 
+from src.models.Principal import Principal
+from src.routes.auth import (
+    AUTH_MODE,
+    AUTH_MODE_DEVELOPMENT,
+    AUTH_MODE_FIREBASE,
+    get_principal,
+    get_user_id,
+    token_cache,
+    verify_user,
+)
 
-@pytest.fixture(autouse=True)
-def env_setup_and_teardown():
-    # Save the original value of FLASK_ENV
-    original_flask_env = os.getenv('FLASK_ENV')
 
-    # This code runs before each test
-    yield
+@pytest.fixture
+def protected_client(app):
+    """
+    A client for an app with a route that requires authentication and echoes the resolved principal. The route is
+    marked directly because conftest replaces `firebase_auth_required` for the router tests.
+    """
+    def handle_protected():
+        principal = get_principal()
+        return jsonify({"user_id": principal.user_id, "development": principal.development}), 200
 
-    # This code runs after each test
-    if original_flask_env is None:
-        os.unsetenv('FLASK_ENV')  # Unset if it was not set before
-    else:
-        os.environ['FLASK_ENV'] = original_flask_env  # Reset to original value
+    handle_protected.auth_required = True
+    app.add_url_rule("/protected", "handle_protected", handle_protected)
+    app.config[AUTH_MODE] = AUTH_MODE_FIREBASE
+    token_cache.clear()
+    yield app.test_client()
+    token_cache.clear()
 
 
-# get_user_id()
-def test_get_user_id_called_with_valid_request_returns_user_id(app):
-    mock_request = MagicMock()
-    mock_request.decoded_token = {"user_id": "test_user"}
+# authenticate_request()
+def test_authenticate_request_called_with_valid_token_stores_principal(protected_client):
+    with patch("src.routes.auth.auth.verify_id_token", return_value={"user_id": "test_user"}):
+        response = protected_client.get("/protected", headers={"Authorization": "token"})
+
+    assert response.status_code == 200
+    assert response.json == {"user_id": "test_user", "development": False}
+
+
+def test_authenticate_request_called_twice_with_same_token_verifies_once(protected_client):
+    with patch("src.routes.auth.auth.verify_id_token", return_value={"user_id": "test_user", "exp": 2 ** 40}) \
+            as mock_verify_id_token:
+        protected_client.get("/protected", headers={"Authorization": "token"})
+        protected_client.get("/protected", headers={"Authorization": "token"})
+
+    mock_verify_id_token.assert_called_once_with("token")
+
+
+def test_authenticate_request_called_without_authorization_header_returns_401(protected_client):
+    response = protected_client.get("/protected")
+    assert response.status_code == 401
 
-    user_id = get_user_id(mock_request)
-    assert user_id == "test_user"
 
+def test_authenticate_request_called_with_expired_token_returns_403(protected_client):
+    with patch("src.routes.auth.auth.verify_id_token", side_effect=auth.ExpiredIdTokenError("expired", None)):
+        response = protected_client.get("/protected", headers={"Authorization": "token"})
 
-def test_get_user_id_called_with_no_decoded_token_returns_none(app):
-    mock_request = MagicMock()
-    mock_request.decoded_token = None
+    assert response.status_code == 403
 
-    user_id = get_user_id(mock_request)
-    assert user_id is None
 
+def test_authenticate_request_called_in_development_mode_uses_authorization_header(app, protected_client):
+    app.config[AUTH_MODE] = AUTH_MODE_DEVELOPMENT
 
-def test_get_user_id_called_with_no_user_id_in_decoded_token_returns_none(app):
-    mock_request = MagicMock()
-    mock_request.decoded_token = {"other_key": "test_value"}
+    with patch("src.routes.auth.auth.verify_id_token") as mock_verify_id_token:
+        response = protected_client.get("/protected", headers={"Authorization": "test_user"})
+
+    assert response.json == {"user_id": "test_user", "development": True}
+    mock_verify_id_token.assert_not_called()
+
+
+def test_authenticate_request_called_for_unprotected_route_skips_authentication(app, protected_client):
+    with patch("src.routes.auth.auth.verify_id_token") as mock_verify_id_token:
+        response = protected_client.get("/")
+
+    assert response.status_code == 200
+    mock_verify_id_token.assert_not_called()
+
+
+# get_user_id()
+def test_get_user_id_called_with_principal_returns_user_id(app):
+    with app.test_request_context():
+        g.principal = Principal(user_id="test_user")
+        assert get_user_id() == "test_user"
 
-    user_id = get_user_id(mock_request)
-    assert user_id is None
 
+def test_get_user_id_called_without_principal_returns_none(app):
+    with app.test_request_context():
+        assert get_user_id() is None
 
-def test_get_user_id_called_with_non_dict_decoded_token_returns_none(app):
-    mock_request = MagicMock()
-    mock_request.decoded_token = "non_dict_value"
 
-    user_id = get_user_id(mock_request)
-    assert user_id is None
+def test_get_user_id_called_with_no_user_id_in_token_returns_none(app):
+    with app.test_request_context():
+        g.principal = Principal.from_decoded_token({"other_key": "test_value"})
+        assert get_user_id() is None
 
 
 # verify_user()
-def test_verify_user_called_in_development_environment_returns_true_and_none(app):
-    mock_user_id = "test_user"
-    os.environ['FLASK_ENV'] = 'development'
-    mock_request = MagicMock()
-    mock_request.decoded_token = {"user_id": mock_user_id}
+def test_verify_user_called_in_development_mode_returns_true_and_none(app):
+    with app.test_request_context():
+        g.principal = Principal(user_id="other_user", development=True)
+        verified, error_response = verify_user("test_user")
 
-    verified, error_response = verify_user(mock_user_id, mock_request)
     assert verified is True
     assert error_response is None
 
 
 def test_verify_user_called_with_same_user_id_returns_true_and_none(app):
-    mock_user_id = "test_user"
-    os.environ['FLASK_ENV'] = 'production'
-    mock_request = MagicMock()
-    mock_request.decoded_token = {"user_id": mock_user_id}
+    with app.test_request_context():
+        g.principal = Principal(user_id="test_user")
+        verified, error_response = verify_user("test_user")
 
-    verified, error_response = verify_user(mock_user_id, mock_request)
     assert verified is True
     assert error_response is None
 
 
 def test_verify_user_called_with_different_user_id_returns_false_and_403(app):
-    os.environ['FLASK_ENV'] = 'production'
-    mock_request = MagicMock()
-    mock_request.decoded_token = {"user_id": "test_user"}
+    with app.test_request_context():
+        g.principal = Principal(user_id="test_user")
+        verified, error_response = verify_user("other_user")
 
-    verified, error_response = verify_user("other_user", mock_request)
     assert verified is False
     assert error_response[1] == 403
 
 
-def test_verify_user_called_with_no_decoded_token_returns_false_and_403(app):
-    os.environ['FLASK_ENV'] = 'production'
-    mock_request = MagicMock()
-    mock_request.decoded_token = None
+def test_verify_user_called_without_principal_returns_false_and_403(app):
+    with app.test_request_context():
+        verified, error_response = verify_user("test_user")
 
-    verified, error_response = verify_user("test_user", mock_request)
     assert verified is False
     assert error_response[1] == 403
@@ -0,0 +1,103 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from firebase_admin.exceptions import FirebaseError
+
+from src.controllers.authorization_controller import (
+    RelationshipIndex,
+    authorize_user_data_access,
+    can_read_user_data,
+    relationship_index,
+)
+from src.controllers.user_controller import update_user
+from src.models.errors.invalid_request_error import InvalidRequestError
+
+
+@pytest.fixture(autouse=True)
+def clear_relationship_index():
+    relationship_index.clear()
+    yield
+    relationship_index.clear()
+
+
+def test_can_read_user_data_when_reading_own_data_return_true_without_database_read(app):
+    with patch("firebase_admin.db.reference") as mock_reference:
+        assert can_read_user_data("test_user", "test_user") is True
+        mock_reference.assert_not_called()
+
+
+def test_can_read_user_data_when_requesting_user_is_monitoring_return_true(app):
+    mock_db_ref = MagicMock()
+    mock_db_ref.get.return_value = ["caregiver"]
+
+    with patch("firebase_admin.db.reference", return_value=mock_db_ref) as mock_reference:
+        assert can_read_user_data("caregiver", "test_user") is True
+        mock_reference.assert_called_once_with("/users/test_user/monitored_by_users")
+
+
+def test_can_read_user_data_when_requesting_user_is_not_monitoring_return_false(app):
+    mock_db_ref = MagicMock()
+    mock_db_ref.get.return_value = {"0": "caregiver"}
+
+    with patch("firebase_admin.db.reference", return_value=mock_db_ref):
+        assert can_read_user_data("stranger", "test_user") is False
+
+
+def test_can_read_user_data_when_relationships_are_indexed_dont_read_database(app):
+    mock_db_ref = MagicMock()
+    mock_db_ref.get.return_value = ["caregiver"]
+
+    with patch("firebase_admin.db.reference", return_value=mock_db_ref):
+        for _ in range(5):
+            can_read_user_data("caregiver", "test_user")
+            can_read_user_data("stranger", "test_user")
+
+    mock_db_ref.get.assert_called_once()
+
+
+def test_can_read_user_data_when_read_fails_raise_firebase_error(app):
+    mock_db_ref = MagicMock()
+    mock_db_ref.get.side_effect = FirebaseError(8, "test")
+
+    with patch("firebase_admin.db.reference", return_value=mock_db_ref):
+        with pytest.raises(FirebaseError):
+            can_read_user_data("caregiver", "test_user")
+
+
+def test_update_user_when_monitored_by_users_change_invalidate_index(app):
+    relationship_index.put("test_user", frozenset(["caregiver"]))
+    mock_db_ref = MagicMock()
+    mock_db_ref.get.return_value = MagicMock()
+
+    with patch("firebase_admin.db.reference", return_value=mock_db_ref):
+        update_user("test_user", {"monitored_by_users": []})
+
+    assert relationship_index.get("test_user") is None
+
+
+def test_update_user_when_relationships_are_unchanged_keep_index(app):
+    relationship_index.put("test_user", frozenset(["caregiver"]))
+    mock_db_ref = MagicMock()
+    mock_db_ref.get.return_value = MagicMock()
+
+    with patch("firebase_admin.db.reference", return_value=mock_db_ref):
+        update_user("test_user", {"first_name": "new fname"})
+
+    assert relationship_index.get("test_user") == frozenset(["caregiver"])
+
+
+def test_authorize_user_data_access_when_not_allowed_raise_invalid_request_error(app):
+    relationship_index.put("test_user", frozenset())
+
+    with pytest.raises(InvalidRequestError):
+        authorize_user_data_access("stranger", "test_user")
+
+
+def test_relationship_index_when_entry_is_older_than_ttl_return_none():
+    now = [0.0]
+    index = RelationshipIndex(ttl_seconds=10, clock=lambda: now[0])
+    index.put("test_user", frozenset(["caregiver"]))
+
+    now[0] = 10.0
+
+    assert index.get("test_user") is None
@@ -0,0 +1,180 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from firebase_admin.exceptions import FirebaseError
+
+from src.controllers.medication_event_controller import get_medication_events_for_medication
+from src.controllers.user_controller import get_users
+from flask import g
+
+from src.database.data_access import fan_out, record_calls, reference
+from src.utils.metrics import MetricsRegistry
+
+
+def test_reference_when_path_has_placeholders_format_path(app):
+    with patch("firebase_admin.db.reference") as mock_reference:
+        reference("/users/{user_id}/medications/{medication_id}", user_id="user_1", medication_id="med_1")
+
+    mock_reference.assert_called_once_with("/users/user_1/medications/med_1")
+
+
+def test_get_when_called_record_path_template_and_response_size(app):
+    mock_db_ref = MagicMock()
+    mock_db_ref.get.return_value = {"first_name": "John"}
+
+    with patch("firebase_admin.db.reference", return_value=mock_db_ref), record_calls() as calls:
+        assert reference("/users/{user_id}", user_id="user_1").get() == {"first_name": "John"}
+
+    assert len(calls) == 1
+    assert calls[0].path == "/users/{user_id}"
+    assert calls[0].operation == "get"
+    assert calls[0].query == ""
+    assert calls[0].response_bytes == len('{"first_name":"John"}')
+    assert calls[0].request_bytes is None
+    assert calls[0].error is None
+
+
+def test_update_when_called_record_request_size(app):
+    with patch("firebase_admin.db.reference"), record_calls() as calls:
+        reference("/users/{user_id}", user_id="user_1").update({"phone": "123"})
+
+    assert calls[0].operation == "update"
+    assert calls[0].request_bytes == len('{"phone":"123"}')
+    assert calls[0].response_bytes is None
+
+
+def test_get_when_nothing_collects_calls_skip_size_accounting(app):
+    mock_db_ref = MagicMock()
+    mock_db_ref.get.return_value = {"first_name": "John"}
+
+    with patch("firebase_admin.db.reference", return_value=mock_db_ref), \
+            patch("src.database.data_access._record") as mock_record, \
+            patch("src.database.data_access._json_size") as mock_json_size:
+        reference("/users/{user_id}", user_id="user_1").get()
+
+    mock_json_size.assert_not_called()
+    assert mock_record.call_args.args[0].response_bytes is None
+
+
+def test_get_when_call_fails_record_error_and_reraise(app):
+    mock_db_ref = MagicMock()
+    mock_db_ref.get.side_effect = FirebaseError(500, "test")
+
+    with patch("firebase_admin.db.reference", return_value=mock_db_ref), record_calls() as calls:
+        with pytest.raises(FirebaseError):
+            reference("/users/{user_id}", user_id="user_1").get()
+
+    assert calls[0].error == "FirebaseError"
+
+
+def test_get_users_when_called_record_key_range_read(app):
+    mock_db_ref = MagicMock()
+    mock_db_ref.order_by_key.return_value.limit_to_first.return_value.get.return_value = {
+        "user_1": {"first_name": "John", "last_name": "Doe"}
+    }
+    mock_db_ref.get.return_value = 1
+
+    with patch("firebase_admin.db.reference", return_value=mock_db_ref), record_calls() as calls:
+        get_users(None, 10)
+
+    assert [(call.path, call.operation, call.query) for call in calls] == [
+        ("/users", "get", "orderBy=$key&limitToFirst"),
+        ("/metadata/user_count", "get", ""),
+    ]
+
+
+def test_get_medication_events_for_medication_when_called_record_query_shape(app):
+    mock_db_ref = MagicMock()
+    mock_db_ref.order_by_child.return_value.start_at.return_value.end_at.return_value.limit_to_last.return_value\
+        .get.return_value = {}
+
+    with patch("firebase_admin.db.reference", return_value=mock_db_ref), record_calls() as calls:
+        get_medication_events_for_medication("med_1", datetime(2024, 1, 1), datetime(2024, 1, 2), 10)
+
+    assert calls[0].path == "/medication_events/{medication_id}"
+    assert calls[0].query == "orderBy=timestamp&startAt&endAt&limitToLast"
+
+
+def test_get_when_in_app_context_count_call_in_metrics(app, tmp_path):
+    app.extensions["metrics"] = MetricsRegistry(str(tmp_path))
+
+    with patch("firebase_admin.db.reference"):
+        reference("/users/{user_id}", user_id="user_1").get()
+
+    assert 'firebase_calls_total{operation="get",path="/users/{user_id}"} 1' in app.extensions["metrics"].render()
+
+
+def test_fan_out_when_calls_finish_out_of_order_yield_results_in_order(app):
+    def slow_double(value):
+        time.sleep(0.01 * (3 - value))
+        return value * 2
+
+    assert list(fan_out(slow_double, [0, 1, 2, 3])) == [0, 2, 4, 6]
+
+
+def test_fan_out_when_calls_wait_on_io_run_them_concurrently(app):
+    started = time.perf_counter()
+    list(fan_out(lambda _: time.sleep(0.1), range(6)))
+
+    assert time.perf_counter() - started < 0.3
+
+
+def test_fan_out_when_closed_early_cancel_calls_not_started(app):
+    app.extensions["database_executor"] = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    called = []
+
+    def call(value):
+        called.append(value)
+        release.wait(1)
+        return value
+
+    results = fan_out(call, range(5))
+    release.set()
+    assert next(results) == 0
+    results.close()
+    time.sleep(0.05)
+
+    assert len(called) < 5
+
+
+def test_fan_out_when_in_request_context_share_flask_g(app):
+    with app.test_request_context():
+        g.marker = "request"
+        assert list(fan_out(lambda _: g.marker, range(3))) == ["request"] * 3
+
+
+def test_fan_out_when_nested_run_inner_calls_inline(app):
+    app.extensions["database_executor"] = ThreadPoolExecutor(max_workers=1)
+
+    assert list(fan_out(lambda value: sum(fan_out(lambda inner: inner, range(value))), [2, 3])) == [1, 3]
+
+
+def test_fan_out_when_call_raises_raise_on_its_result(app):
+    def fail_on_one(value):
+        if value == 1:
+            raise ValueError("boom")
+        return value
+
+    results = fan_out(fail_on_one, range(3))
+    assert next(results) == 0
+    with pytest.raises(ValueError):
+        next(results)
+
+
+def test_conditional_get_when_etag_matches_return_unchanged_without_value(app, memory_db):
+    memory_db.reference("/users/user_1").set({"first_name": "John"})
+    _, _, etag = reference("/users/{user_id}", user_id="user_1").conditional_get(None)
+
+    with record_calls() as calls:
+        assert reference("/users/{user_id}", user_id="user_1").conditional_get(etag) == (False, None, etag)
+    memory_db.reference("/users/user_1/first_name").set("Jane")
+    changed, value, new_etag = reference("/users/{user_id}", user_id="user_1").conditional_get(etag)
+
+    assert (changed, value) == (True, {"first_name": "Jane"})
+    assert new_etag != etag
+    assert [(call.operation, call.response_bytes) for call in calls] == [("get_if_changed", None)]
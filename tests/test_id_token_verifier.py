@@ -0,0 +1,129 @@
+import json
+import time
+from unittest.mock import MagicMock
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from firebase_admin import auth
+
+from src.utils.id_token_verifier import IdTokenVerifier, SigningKeyStore
+
+PROJECT_ID = "test-project"
+KEY_ID = "test-kid"
+
+
+@pytest.fixture(scope="module")
+def private_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture(scope="module")
+def public_key_pem(private_key):
+    return private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    ).decode("utf-8")
+
+
+@pytest.fixture
+def keys_file(tmp_path, public_key_pem):
+    path = tmp_path / "signing_keys.json"
+    path.write_text(json.dumps({KEY_ID: public_key_pem}))
+    return str(path)
+
+
+def create_token(private_key, kid=KEY_ID, **overrides):
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": "test_user",
+        "user_id": "test_user",
+        "iat": now,
+        "exp": now + 3600,
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+def test_verify_id_token_when_token_is_valid_return_claims(private_key, keys_file):
+    verifier = IdTokenVerifier(PROJECT_ID, SigningKeyStore.from_file(keys_file))
+
+    claims = verifier.verify_id_token(create_token(private_key))
+
+    assert claims["user_id"] == "test_user"
+    assert claims["uid"] == "test_user"
+
+
+def test_verify_id_token_when_token_has_expired_raise_expired_id_token_error(private_key, keys_file):
+    verifier = IdTokenVerifier(PROJECT_ID, SigningKeyStore.from_file(keys_file))
+    token = create_token(private_key, iat=int(time.time()) - 7200, exp=int(time.time()) - 3600)
+
+    with pytest.raises(auth.ExpiredIdTokenError):
+        verifier.verify_id_token(token)
+
+
+def test_verify_id_token_when_audience_is_wrong_raise_invalid_id_token_error(private_key, keys_file):
+    verifier = IdTokenVerifier(PROJECT_ID, SigningKeyStore.from_file(keys_file))
+
+    with pytest.raises(auth.InvalidIdTokenError):
+        verifier.verify_id_token(create_token(private_key, aud="other-project"))
+
+
+def test_verify_id_token_when_signed_by_other_key_raise_invalid_id_token_error(keys_file):
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    verifier = IdTokenVerifier(PROJECT_ID, SigningKeyStore.from_file(keys_file))
+
+    with pytest.raises(auth.InvalidIdTokenError):
+        verifier.verify_id_token(create_token(other_key))
+
+
+def test_verify_id_token_when_kid_is_unknown_request_refresh_and_raise_invalid_id_token_error(
+        private_key, keys_file
+):
+    key_store = SigningKeyStore.from_file(keys_file)
+    key_store.request_refresh = MagicMock()
+    verifier = IdTokenVerifier(PROJECT_ID, key_store)
+
+    with pytest.raises(auth.InvalidIdTokenError):
+        verifier.verify_id_token(create_token(private_key, kid="rotated-kid"))
+    key_store.request_refresh.assert_called_once()
+
+
+def test_refresh_when_keys_are_fetched_schedule_next_refresh_before_max_age(public_key_pem):
+    mock_session = MagicMock()
+    mock_session.get.return_value.json.return_value = {KEY_ID: public_key_pem}
+    mock_session.get.return_value.headers = {"Cache-Control": "public, max-age=21600, must-revalidate"}
+    key_store = SigningKeyStore(session=mock_session, refresh_margin=300, clock=lambda: 1000.0)
+
+    key_store.refresh()
+
+    assert key_store.get(KEY_ID) is not None
+    assert key_store.expires_at == 22600.0
+    assert key_store._next_refresh_delay() == 21300.0
+
+
+def test_start_when_keys_are_fetched_load_them_on_refresh_thread(public_key_pem):
+    mock_session = MagicMock()
+    mock_session.get.return_value.json.return_value = {KEY_ID: public_key_pem}
+    mock_session.get.return_value.headers = {"Cache-Control": "max-age=21600"}
+    key_store = SigningKeyStore(session=mock_session)
+
+    key_store.start()
+
+    assert key_store.wait_until_loaded(5)
+    assert key_store.get(KEY_ID) is not None
+    key_store.stop()
+
+
+def test_verify_id_token_when_keys_are_loading_wait_for_first_fetch(private_key, public_key_pem):
+    key_store = SigningKeyStore(timeout=5)
+    key_store.wait_until_loaded = MagicMock(side_effect=lambda timeout: key_store.set_keys({KEY_ID: public_key_pem}))
+    verifier = IdTokenVerifier(PROJECT_ID, key_store)
+
+    claims = verifier.verify_id_token(create_token(private_key))
+
+    assert claims["uid"] == "test_user"
+    key_store.wait_until_loaded.assert_called_once_with(5)
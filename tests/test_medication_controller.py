@@ -1,10 +1,15 @@
+from datetime import datetime
 from unittest.mock import MagicMock, patch
 
 import pytest
 from firebase_admin.exceptions import FirebaseError
 
 from src.controllers.medication_controller import create_medication, get_medication, update_medication, \
-    delete_medication
+    delete_medication, get_medications, get_medication_count, get_scheduled_medications_for_user, \
+    get_scheduled_medication_timeline, seed_medication_counts, get_medication_version_if_changed
+from src.controllers.medication_event_controller import create_medication_events
+from src.controllers.user_controller import create_user
+from src.database.data_access import record_calls
 from src.models.Medication import Medication
 from src.models.Schedule import Schedule
 from src.models.errors.invalid_request_error import InvalidRequestError
@@ -79,19 +84,16 @@ def test_create_medication_when_medication_is_created_return_medication(app):
         schedule=Schedule.from_dict(mock_schedule)
     )
 
-    with patch("firebase_admin.db.reference", return_value=mock_db_ref):
+    with patch("firebase_admin.db.reference", return_value=mock_db_ref), \
+            patch("src.controllers.medication_controller.generate_push_id", return_value=mock_medication_id):
         mock_db_ref.get.return_value = MagicMock()
-        mock_db_ref.push.return_value = MagicMock(key=mock_medication_id)
-        mock_db_ref.child.return_value.set.return_value = None
 
         created_medication = create_medication(mock_user_id, mock_json_dict)
 
-        assert mock_db_ref.push.called_once()
-        assert mock_db_ref.child.called_once_with(mock_medication_id)
-
-        mock_user_medications = [mock_medication_id]
-        assert mock_db_ref.child.return_value.set.called_once_with(mock_user_medications)
-        assert mock_db_ref.child.return_value.set.called_once_with(medication.to_dict())
+        mock_db_ref.push.assert_not_called()
+        mock_db_ref.update.assert_called_once()
+        updates = mock_db_ref.update.call_args.args[0]
+        assert updates[f"users/{mock_user_id}/medications/{mock_medication_id}"] == medication.to_dict()
         assert medication == created_medication
 
 
@@ -140,7 +142,7 @@ def test_create_medication_when_user_doesnt_exist_raise_resource_not_found_error
             create_medication(mock_user_id, mock_json_dict)
 
 
-def test_create_medication_when_push_fails_raise_firebase_error(app):
+def test_create_medication_when_write_fails_raise_firebase_error(app):
     mock_db_ref = MagicMock()
     mock_user_id = "test_user"
     mock_medication_id = "test_medication"
@@ -154,7 +156,7 @@ def test_create_medication_when_push_fails_raise_firebase_error(app):
 
     with patch("firebase_admin.db.reference", return_value=mock_db_ref):
         mock_db_ref.get.return_value = MagicMock()
-        mock_db_ref.push.side_effect = FirebaseError(8, "test")
+        mock_db_ref.update.side_effect = FirebaseError(8, "test")
         with pytest.raises(FirebaseError):
             create_medication(mock_user_id, mock_json_dict)
 
@@ -174,7 +176,7 @@ def test_create_medication_when_medication_to_be_stored_is_invalid_raise_value_e
     with patch("firebase_admin.db.reference", return_value=mock_db_ref):
         mock_db_ref.get.return_value = MagicMock()
         mock_db_ref.push.return_value = MagicMock(key=mock_medication_id)
-        mock_db_ref.set.side_effect = ValueError()
+        mock_db_ref.update.side_effect = ValueError()
         with pytest.raises(ValueError):
             create_medication(mock_user_id, mock_json_dict)
 
@@ -194,7 +196,7 @@ def test_create_medication_when_set_fails_raise_firebase_error(app):
     with patch("firebase_admin.db.reference", return_value=mock_db_ref):
         mock_db_ref.get.return_value = MagicMock()
         mock_db_ref.push.return_value = MagicMock(key=mock_medication_id)
-        mock_db_ref.set.side_effect = FirebaseError(8, "test")
+        mock_db_ref.update.side_effect = FirebaseError(8, "test")
         with pytest.raises(FirebaseError):
             create_medication(mock_user_id, mock_json_dict)
 
@@ -283,9 +285,17 @@ def test_delete_medication_when_medication_is_deleted_return_none(app):
 
     with patch("firebase_admin.db.reference", return_value=mock_db_ref), \
             patch("src.controllers.medication_controller.get_medication", return_value=MagicMock()):
-        mock_db_ref.delete.return_value = None
+        mock_db_ref.get.return_value = {"event_1": True}
+        mock_db_ref.update.return_value = None
         delete_medication(mock_user_id, mock_medication_id)
-        assert mock_db_ref.delete.called_once_with(mock_medication_id)
+        mock_db_ref.update.assert_called_once_with({
+            f"users/{mock_user_id}/medications/{mock_medication_id}": None,
+            f"search_names/medications/{mock_user_id}/{mock_medication_id}": None,
+            f"metadata/medication_counts/{mock_user_id}": {".sv": {"increment": -1}},
+            f"metadata/medication_versions/{mock_user_id}": {".sv": {"increment": 1}},
+            f"metadata/event_versions/{mock_user_id}": {".sv": {"increment": 1}},
+            f"user_events/{mock_user_id}/event_1": None,
+        })
 
 
 def test_delete_medication_when_delete_fails_raise_firebase_error(app):
@@ -295,7 +305,7 @@ def test_delete_medication_when_delete_fails_raise_firebase_error(app):
 
     with patch("firebase_admin.db.reference", return_value=mock_db_ref), \
             patch("src.controllers.medication_controller.get_medication", return_value=MagicMock()):
-        mock_db_ref.delete.side_effect = FirebaseError(8, "test")
+        mock_db_ref.update.side_effect = FirebaseError(8, "test")
         with pytest.raises(FirebaseError):
             delete_medication(mock_user_id, mock_medication_id)
 
@@ -310,3 +320,214 @@ def test_delete_medication_when_medication_doesnt_exist_raise_resource_not_found
         mock_db_ref.delete.side_effect = ValueError()
         with pytest.raises(ValueError):
             delete_medication(mock_user_id, mock_medication_id)
+
+
+def test_get_medications_when_pages_are_followed_return_each_medication_once(app, memory_db):
+    create_user("user_1", {"first_name": "John", "last_name": "Doe"})
+    medication_ids = sorted(create_medication("user_1", {"name": f"Medication {i}"}).medication_id for i in range(5))
+
+    pages = []
+    next_token = None
+    while True:
+        with record_calls() as calls:
+            medications, total, next_token = get_medications("user_1", next_token, 2)
+        pages.append([medication.medication_id for medication in medications])
+        assert total == 5
+        assert calls[0].query == ("orderBy=$key&startAt&limitToFirst" if pages[1:] else "orderBy=$key&limitToFirst")
+        if next_token is None:
+            break
+
+    assert pages == [medication_ids[0:2], medication_ids[2:4], medication_ids[4:]]
+
+
+def test_get_medications_when_start_token_is_invalid_raise_invalid_request_error(app, memory_db):
+    with pytest.raises(InvalidRequestError):
+        get_medications("user_1", "not a token!", 2)
+
+
+def test_get_medication_count_when_medications_are_deleted_decrement_count(app, memory_db):
+    create_user("user_1", {"first_name": "John", "last_name": "Doe"})
+    medication = create_medication("user_1", {"name": "Aspirin"})
+    create_medication("user_1", {"name": "Ibuprofen"})
+
+    delete_medication("user_1", medication.medication_id)
+
+    assert get_medication_count("user_1") == 1
+
+
+def test_get_medication_count_when_counter_is_missing_count_medications_without_writing(app, memory_db):
+    memory_db.set("/users/user_1/medications", {"med_1": {"medication_id": "med_1", "name": "Aspirin"}})
+
+    assert get_medication_count("user_1") == 1
+    assert memory_db.get("/metadata/medication_counts/user_1") is None
+    assert get_medication_count("user_2") == 0
+
+
+def test_delete_medication_when_counter_is_missing_seed_it_from_medications(app, memory_db):
+    memory_db.set("/users/user_1", {"user_id": "user_1", "first_name": "John", "last_name": "Doe", "medications": {
+        "med_1": {"medication_id": "med_1", "name": "Aspirin"},
+        "med_2": {"medication_id": "med_2", "name": "Ibuprofen"},
+    }})
+
+    delete_medication("user_1", "med_1")
+
+    assert memory_db.get("/metadata/medication_counts/user_1") == 1
+
+
+def test_delete_medication_when_medication_has_events_remove_them_from_user_event_index(app, memory_db):
+    memory_db.set("/users/user_1/medications", {
+        "med_1": {"medication_id": "med_1", "name": "Aspirin"},
+        "med_2": {"medication_id": "med_2", "name": "Ibuprofen"},
+    })
+    create_medication_events("user_1", [
+        {"medication_id": "med_1", "timestamp": "2024-01-01T08:00:00"},
+        {"medication_id": "med_1", "timestamp": "2024-01-02T08:00:00"},
+        {"medication_id": "med_2", "timestamp": "2024-01-01T08:00:00"},
+    ])
+
+    delete_medication("user_1", "med_1")
+
+    assert [entry["medication_id"] for entry in memory_db.get("/user_events/user_1").values()] == ["med_2"]
+
+
+def test_get_medication_count_when_counter_drifted_below_zero_return_zero(app, memory_db):
+    memory_db.set("/users/user_1/medications/med_1", {"medication_id": "med_1", "name": "Aspirin"})
+    memory_db.set("/metadata/medication_counts/user_1", 0)
+
+    delete_medication("user_1", "med_1")
+
+    assert get_medication_count("user_1") == 0
+
+
+def test_create_medication_when_counter_is_missing_seed_it_from_medications(app, memory_db):
+    memory_db.set("/users/user_1", {"user_id": "user_1", "first_name": "John", "last_name": "Doe", "medications": {
+        "med_1": {"medication_id": "med_1", "name": "Aspirin"},
+    }})
+
+    create_medication("user_1", {"name": "Ibuprofen"})
+
+    assert memory_db.get("/metadata/medication_counts/user_1") == 2
+
+
+def test_seed_medication_counts_when_users_have_medications_count_them(app, memory_db):
+    memory_db.set("/users", {
+        "user_1": {"user_id": "user_1", "medications": {"med_1": {"name": "Aspirin"}, "med_2": {"name": "Ibuprofen"}}},
+        "user_2": {"user_id": "user_2"},
+    })
+    memory_db.set("/metadata/medication_counts/user_1", -1)
+
+    assert seed_medication_counts() == 2
+
+    assert memory_db.get("/metadata/medication_counts") == {"user_1": 2, "user_2": 0}
+
+
+def test_get_scheduled_medications_for_user_when_range_is_long_page_through_every_time_once(app, memory_db):
+    create_user("user_1", {"first_name": "John", "last_name": "Doe", "medications": {
+        "med_1": {"medication_id": "med_1", "name": "Aspirin", "schedule": {"minute": "*/5", "hour": "*"}},
+        "med_2": {"medication_id": "med_2", "name": "Metformin", "schedule": {"minute": "0", "hour": "8"}},
+    }})
+    start_at, end_at = datetime(2024, 1, 1), datetime(2025, 1, 1)
+
+    times, next_token = get_scheduled_medications_for_user("user_1", start_at, end_at, 250)
+    more_times, _ = get_scheduled_medications_for_user("user_1", start_at, end_at, 250, next_token)
+
+    assert len(times) == len(more_times) == 250
+    assert times[0] == ("2024-01-01T00:00:00", "med_1")
+    assert more_times[0] == ("2024-01-01T20:50:00", "med_1")
+    assert next_token == "med_1#2024-01-01T20:45:00.000001"
+
+
+def test_get_scheduled_medications_for_user_when_page_holds_every_time_return_no_token(app, memory_db):
+    create_user("user_1", {"first_name": "John", "last_name": "Doe", "medications": {
+        "med_1": {"medication_id": "med_1", "name": "Aspirin", "schedule": {"minute": "0", "hour": "8"}},
+        "med_2": {"medication_id": "med_2", "name": "Metformin", "schedule": {"minute": "0", "hour": "20"}},
+    }})
+
+    times, next_token = get_scheduled_medications_for_user("user_1", datetime(2024, 1, 1), datetime(2024, 1, 3), 4)
+
+    assert times == [
+        ("2024-01-01T08:00:00", "med_1"),
+        ("2024-01-02T08:00:00", "med_1"),
+        ("2024-01-01T20:00:00", "med_2"),
+        ("2024-01-02T20:00:00", "med_2"),
+    ]
+    assert next_token is None
+
+
+
+def test_get_scheduled_medications_for_user_when_page_ends_at_end_of_range_continue_with_next_medication(
+        app, memory_db
+):
+    create_user("user_1", {"first_name": "John", "last_name": "Doe", "medications": {
+        "med_1": {"medication_id": "med_1", "name": "Aspirin", "schedule": {"minute": "0", "hour": "0"}},
+        "med_2": {"medication_id": "med_2", "name": "Metformin", "schedule": {"minute": "0", "hour": "8"}},
+    }})
+    start_at, end_at = datetime(2024, 1, 1), datetime(2024, 1, 2)
+
+    times, next_token = get_scheduled_medications_for_user("user_1", start_at, end_at, 2)
+    more_times, _ = get_scheduled_medications_for_user("user_1", start_at, end_at, 2, next_token)
+
+    assert times == [("2024-01-01T00:00:00", "med_1"), ("2024-01-02T00:00:00", "med_1")]
+    assert more_times == [("2024-01-01T08:00:00", "med_2")]
+
+def test_get_scheduled_medication_timeline_when_medications_overlap_return_times_in_order(app, memory_db):
+    create_user("user_1", {"first_name": "John", "last_name": "Doe", "medications": {
+        "med_1": {"medication_id": "med_1", "name": "Aspirin", "schedule": {"minute": "0", "hour": "8,20"}},
+        "med_2": {"medication_id": "med_2", "name": "Metformin", "schedule": {"minute": "0", "hour": "8"}},
+        "med_3": {"medication_id": "med_3", "name": "Vitamin D"},
+    }})
+
+    times, next_token = get_scheduled_medication_timeline("user_1", datetime(2024, 1, 1), datetime(2024, 1, 3), 10)
+
+    assert times == [
+        ("2024-01-01T08:00:00", "med_1"),
+        ("2024-01-01T08:00:00", "med_2"),
+        ("2024-01-01T20:00:00", "med_1"),
+        ("2024-01-02T08:00:00", "med_1"),
+        ("2024-01-02T08:00:00", "med_2"),
+        ("2024-01-02T20:00:00", "med_1"),
+    ]
+    assert next_token is None
+
+
+def test_get_scheduled_medication_timeline_when_paging_return_every_time_once(app, memory_db):
+    create_user("user_1", {"first_name": "John", "last_name": "Doe", "medications": {
+        "med_1": {"medication_id": "med_1", "name": "Aspirin", "schedule": {"minute": "*/30", "hour": "*"}},
+        "med_2": {"medication_id": "med_2", "name": "Metformin", "schedule": {"minute": "0", "hour": "*"}},
+        "med_3": {"medication_id": "med_3", "name": "Insulin", "schedule": {"minute": "0", "hour": "8"}},
+    }})
+    start_at, end_at = datetime(2024, 1, 1), datetime(2024, 1, 3)
+    expected, _ = get_scheduled_medication_timeline("user_1", start_at, end_at, 250)
+
+    pages, next_token = [], None
+    while True:
+        times, next_token = get_scheduled_medication_timeline("user_1", start_at, end_at, 7, next_token)
+        pages.append(times)
+        if next_token is None:
+            break
+
+    assert len(expected) == 97 + 49 + 2
+    assert [time for page in pages for time in page] == expected
+    assert expected == sorted(expected)
+    assert all(len(page) == 7 for page in pages[:-1])
+
+
+def test_get_scheduled_medication_timeline_when_token_is_invalid_raise_invalid_request_error(app, memory_db):
+    create_user("user_1", {"first_name": "John", "last_name": "Doe"})
+
+    with pytest.raises(InvalidRequestError):
+        get_scheduled_medication_timeline("user_1", datetime(2024, 1, 1), datetime(2024, 1, 3), 10, "not-a-token")
+
+
+def test_get_medication_version_if_changed_when_medications_are_written_change_etag(app, memory_db):
+    create_user("user_1", {"first_name": "John", "last_name": "Doe"})
+    _, etag = get_medication_version_if_changed("user_1", None)
+    assert get_medication_version_if_changed("user_1", etag) == (False, etag)
+
+    medication = create_medication("user_1", {"name": "Aspirin"})
+    changed, created_etag = get_medication_version_if_changed("user_1", etag)
+    assert changed and created_etag != etag
+
+    update_medication("user_1", medication.medication_id, {"nickname": "Blue pill"})
+    changed, updated_etag = get_medication_version_if_changed("user_1", created_etag)
+    assert changed and updated_etag != created_etag
@@ -1,4 +1,5 @@
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -7,13 +8,20 @@ from firebase_admin.exceptions import FirebaseError
 from src.controllers.medication_event_controller import (
     get_medication_event,
     create_medication_event,
+    create_medication_events,
     update_medication_event,
     delete_medication_event,
     get_medication_events_for_medication,
+    get_medication_events_for_user,
+    get_medication_event_timeline,
+    get_user_event_entries,
+    rebuild_user_event_index,
 )
+from src.database.data_access import record_calls
 from src.models.MedicationEvent import MedicationEvent
 from src.models.errors.invalid_request_error import InvalidRequestError
 from src.models.errors.resource_not_found_error import ResourceNotFoundError
+from src.utils.constants import MAX_MEDICATION_EVENTS_PER_BATCH
 
 
 def test_get_medication_events_for_medication_when_events_are_returned_return_events(app):
@@ -150,11 +158,20 @@ def test_create_medication_event_when_event_is_created_return_event(app):
     }
 
     with patch("firebase_admin.db.reference", return_value=mock_db_ref), \
-            patch("src.controllers.medication_event_controller.get_medication", return_value=MagicMock()):
-        mock_db_ref.push.return_value.key = mock_medication_event_id
+            patch("src.controllers.medication_event_controller.get_medication", return_value=MagicMock()), \
+            patch("src.controllers.medication_event_controller.generate_push_id", return_value=mock_medication_event_id):
         med_event = create_medication_event(mock_user_id, mock_medication_id, mock_medication_event_data)
         assert med_event.medication_event_id == mock_medication_event_id
-        mock_db_ref.set.assert_called_once()
+        mock_db_ref.push.assert_not_called()
+        updates = mock_db_ref.update.call_args.args[0]
+        assert set(updates) == {
+            f"medication_events/{mock_medication_id}/{mock_medication_event_id}",
+            f"user_events/{mock_user_id}/{mock_medication_event_id}",
+            f"metadata/event_versions/{mock_user_id}",
+        }
+        assert updates[f"user_events/{mock_user_id}/{mock_medication_event_id}"] == {
+            "medication_id": mock_medication_id, "timestamp": "2021-01-01T00:00:00+00:00"
+        }
 
 
 def test_create_medication_event_when_data_is_missing(app):
@@ -195,7 +212,7 @@ def test_create_medication_event_when_firebase_error_occurs_raise_firebase_error
 
     with patch("firebase_admin.db.reference", return_value=mock_db_ref), \
             patch("src.controllers.medication_event_controller.get_medication", return_value=MagicMock()):
-        mock_db_ref.push.side_effect = FirebaseError(8, "test")
+        mock_db_ref.update.side_effect = FirebaseError(8, "test")
         with pytest.raises(FirebaseError):
             create_medication_event(mock_user_id, mock_medication_id, mock_medication_event_data)
 
@@ -206,18 +223,27 @@ def test_update_medication_event_when_event_is_updated_return_updated_data(app):
     mock_medication_id = "medication_id"
     mock_medication_event_id = "medication_event_id"
     mock_medication_event_data = {
-        "medication_id": "new_medication_id",
         "timestamp": "2021-01-01T00:00:00Z",
         "dosage": "10mg",
     }
 
+    medication_event = MedicationEvent(
+        medication_event_id=mock_medication_event_id,
+        user_id=mock_user_id,
+        medication_id=mock_medication_id,
+        timestamp=datetime(2020, 1, 1),
+    )
+
     with patch("firebase_admin.db.reference", return_value=mock_db_ref), \
-            patch("src.controllers.medication_event_controller.get_medication_event", return_value=MagicMock()):
+            patch("src.controllers.medication_event_controller.get_medication_event", return_value=medication_event):
         updated_med_event_data = update_medication_event(
             mock_user_id, mock_medication_id, mock_medication_event_id, mock_medication_event_data
         )
-        assert updated_med_event_data == mock_medication_event_data
+        assert updated_med_event_data == {"timestamp": "2021-01-01T00:00:00+00:00", "dosage": "10mg"}
         mock_db_ref.update.assert_called_once()
+        assert mock_db_ref.update.call_args.args[0][f"user_events/{mock_user_id}/{mock_medication_event_id}"] == {
+            "medication_id": mock_medication_id, "timestamp": "2021-01-01T00:00:00+00:00"
+        }
 
 
 def test_update_medication_event_when_no_valid_data_to_update_raise_invalid_request_error(app):
@@ -274,7 +300,11 @@ def test_delete_medication_event_when_event_is_deleted_return(app):
     with patch("firebase_admin.db.reference", return_value=mock_db_ref), \
             patch("src.controllers.medication_event_controller.get_medication_event", return_value=MagicMock()):
         delete_medication_event(mock_user_id, mock_medication_id, mock_medication_event_id)
-        mock_db_ref.delete.assert_called_once()
+        mock_db_ref.update.assert_called_once_with({
+            f"medication_events/{mock_medication_id}/{mock_medication_event_id}": None,
+            f"user_events/{mock_user_id}/{mock_medication_event_id}": None,
+            f"metadata/event_versions/{mock_user_id}": {".sv": {"increment": 1}},
+        })
 
 
 def test_delete_medication_event_when_event_doesnt_exist_raise_resource_not_found_error(app):
@@ -297,6 +327,280 @@ def test_delete_medication_event_when_firebase_fails_raise_firebase_error(app):
 
     with patch("firebase_admin.db.reference", return_value=mock_db_ref), \
             patch("src.controllers.medication_event_controller.get_medication_event", return_value=MagicMock()):
-        mock_db_ref.delete.side_effect = FirebaseError(8, "test")
+        mock_db_ref.update.side_effect = FirebaseError(8, "test")
         with pytest.raises(FirebaseError):
             delete_medication_event(mock_user_id, mock_medication_id, mock_medication_event_id)
+
+
+def test_get_medication_events_for_user_when_many_medications_query_them_concurrently(app):
+    medication_ids = [f"med_{i:02d}" for i in range(8)]
+
+    def slow_events(medication_id, start_at, end_at, limit):
+        time.sleep(0.1)
+        return [
+            MedicationEvent(
+                medication_event_id=f"{medication_id}_event",
+                medication_id=medication_id,
+                user_id="test_user",
+                timestamp=datetime(2024, 1, 1),
+            )
+        ]
+
+    with patch("src.controllers.medication_event_controller.get_medication_ids", return_value=medication_ids), \
+            patch("src.controllers.medication_event_controller.get_medication_events_for_medication", slow_events):
+        started = time.perf_counter()
+        events, next_token = get_medication_events_for_user("test_user", limit=10)
+
+    assert time.perf_counter() - started < 0.4
+    assert [event.medication_id for event in events] == medication_ids
+    assert next_token is None
+
+
+def test_get_medication_events_for_user_when_page_fills_early_skip_remaining_medications(app):
+    calls = []
+
+    def events_for(medication_id, start_at, end_at, limit):
+        calls.append((medication_id, limit))
+        return [
+            MedicationEvent(
+                medication_event_id=f"{medication_id}_event_{i}",
+                medication_id=medication_id,
+                user_id="test_user",
+                timestamp=datetime(2024, 1, 1 + i),
+            )
+            for i in range(limit)
+        ]
+
+    app.extensions.pop("database_executor")
+    with patch("src.controllers.medication_event_controller.get_medication_ids", return_value=["med_1", "med_2"]), \
+            patch("src.controllers.medication_event_controller.get_medication_events_for_medication", events_for):
+        events, next_token = get_medication_events_for_user("test_user", limit=3)
+
+    assert calls == [("med_1", 3)]
+    assert len(events) == 3
+    assert next_token == "med_1#2024-01-02T23:59:59.999998"
+
+
+def test_get_medication_event_timeline_when_start_token_is_invalid_raise_invalid_request_error(app):
+    with patch("src.controllers.medication_event_controller.get_user_event_entries") as mock_get_entries:
+        with pytest.raises(InvalidRequestError):
+            get_medication_event_timeline("test_user", start_token="not-a-token")
+
+    mock_get_entries.assert_not_called()
+
+
+def test_get_medication_event_timeline_when_paging_return_every_event_once_newest_first(app, memory_db):
+    start = datetime(2024, 1, 1)
+    medications = {f"med_{m}": {"medication_id": f"med_{m}", "name": f"Medication {m}"} for m in range(3)}
+    memory_db.reference("/users/user_1").set({
+        "user_id": "user_1", "first_name": "John", "last_name": "Doe", "medications": medications
+    })
+    # Uneven spacing per medication, with timestamps shared within and across medications.
+    memory_db.reference("/medication_events").set({
+        f"med_{m}": {
+            f"event_{m}_{e:03d}": {
+                "medication_event_id": f"event_{m}_{e:03d}",
+                "user_id": "user_1",
+                "medication_id": f"med_{m}",
+                "timestamp": (start + timedelta(hours=(e * (m + 1)) // 2)).isoformat(),
+            }
+            for e in range(40 - 10 * m)
+        }
+        for m in range(3)
+    })
+    rebuild_user_event_index("user_1")
+    expected = sorted(
+        (
+            (start + timedelta(hours=(e * (m + 1)) // 2), f"event_{m}_{e:03d}", f"med_{m}")
+            for m in range(3) for e in range(40 - 10 * m)
+        ),
+        reverse=True,
+    )
+
+    timeline, next_token, pages = [], None, 0
+    while True:
+        with record_calls() as calls:
+            events, next_token = get_medication_event_timeline(
+                "user_1", start, start + timedelta(days=10), 7, next_token
+            )
+        timeline.extend((event.timestamp, event.medication_event_id, event.medication_id) for event in events)
+        pages += 1
+        # Only the first page checks that the index is built, later ones continue the index token.
+        assert [call.path for call in calls] == (["/metadata/user_events_built/{user_id}"] if pages == 1 else []) + [
+            "/user_events/{user_id}"
+        ] + ["/medication_events/{medication_id}/{medication_event_id}"] * len(events)
+        if next_token is None:
+            break
+
+    assert timeline == expected
+    assert pages == -(-len(expected) // 7)
+
+
+def test_get_medication_event_timeline_when_index_is_not_built_merge_medications(app, memory_db):
+    start = datetime(2024, 1, 1)
+    memory_db.reference("/users/user_1/medications").set({
+        f"med_{m}": {"medication_id": f"med_{m}", "name": f"Medication {m}"} for m in range(2)
+    })
+    # Events created before the index existed, so none of them have an entry in it.
+    memory_db.reference("/medication_events").set({
+        f"med_{m}": {
+            f"event_{m}_{e:02d}": {
+                "medication_event_id": f"event_{m}_{e:02d}",
+                "user_id": "user_1",
+                "medication_id": f"med_{m}",
+                "timestamp": (start + timedelta(hours=e * (m + 1))).isoformat(),
+            }
+            for e in range(12)
+        }
+        for m in range(2)
+    })
+    expected = sorted(
+        ((start + timedelta(hours=e * (m + 1)), f"med_{m}", f"event_{m}_{e:02d}") for m in range(2) for e in range(12)),
+        reverse=True,
+    )
+
+    timeline, next_token = [], None
+    while True:
+        with record_calls() as calls:
+            events, next_token = get_medication_event_timeline(
+                "user_1", start, start + timedelta(days=2), 5, next_token
+            )
+        timeline.extend((event.timestamp, event.medication_id, event.medication_event_id) for event in events)
+        assert "/user_events/{user_id}" not in [call.path for call in calls]
+        if next_token is None:
+            break
+
+    assert timeline == expected
+
+
+def test_get_medication_event_timeline_when_medication_is_done_skip_it_on_later_pages(app):
+    def events_for(medication_id, start_at, end_at, limit):
+        days = [20] if medication_id == "med_1" else range(1, 11)
+        events = [
+            MedicationEvent(
+                medication_event_id=f"{medication_id}_event_{day}",
+                medication_id=medication_id,
+                user_id="test_user",
+                timestamp=datetime(2024, 1, day),
+            )
+            for day in days
+        ]
+        return [event for event in events if event.timestamp <= end_at][-limit:]
+
+    with patch("src.controllers.medication_event_controller.user_event_index_built", return_value=False), \
+            patch("src.controllers.medication_event_controller.get_medication_ids", return_value=["med_1", "med_2"]), \
+            patch("src.controllers.medication_event_controller.get_medication_events_for_medication",
+                  side_effect=events_for) as mock_get_events:
+        events, next_token = get_medication_event_timeline("test_user", end_at=datetime(2024, 2, 1), limit=3)
+        assert [event.medication_event_id for event in events] == ["med_1_event_20", "med_2_event_10", "med_2_event_9"]
+
+        mock_get_events.reset_mock()
+        get_medication_event_timeline("test_user", end_at=datetime(2024, 2, 1), limit=3, start_token=next_token)
+
+    assert [call.args[0] for call in mock_get_events.call_args_list] == ["med_2"]
+
+
+def test_get_medication_event_timeline_when_page_of_events_share_timestamp_return_each_once(app, memory_db):
+    memory_db.reference("/users/user_1/medications/med_1").set({"medication_id": "med_1", "name": "Aspirin"})
+    created = [create_medication_event("user_1", "med_1", {"timestamp": "2024-01-01T08:00:00"}) for _ in range(20)]
+    create_medication_event("user_1", "med_1", {"timestamp": "2024-01-01T07:00:00"})
+
+    event_ids, next_token = [], None
+    while True:
+        events, next_token = get_medication_event_timeline(
+            "user_1", datetime(2024, 1, 1), datetime(2024, 1, 2), 3, next_token
+        )
+        event_ids.extend(event.medication_event_id for event in events)
+        if next_token is None:
+            break
+
+    assert len(event_ids) == 21
+    assert set(event_ids[:20]) == {event.medication_event_id for event in created}
+    assert events[-1].timestamp == datetime(2024, 1, 1, 7)
+
+
+def test_get_user_event_entries_when_events_change_query_user_index(app, memory_db):
+    for medication_id in ("med_1", "med_2"):
+        memory_db.reference(f"/users/user_1/medications/{medication_id}").set(
+            {"medication_id": medication_id, "name": "Aspirin"}
+        )
+    first = create_medication_event("user_1", "med_1", {"timestamp": "2024-01-01T08:00:00"})
+    second = create_medication_event("user_1", "med_2", {"timestamp": "2024-01-02T08:00:00"})
+    third = create_medication_event("user_1", "med_2", {"timestamp": "2024-01-03T08:00:00"})
+    update_medication_event("user_1", "med_1", first.medication_event_id, {"timestamp": "2024-01-04T08:00:00"})
+    delete_medication_event("user_1", "med_2", second.medication_event_id)
+
+    with record_calls() as calls:
+        entries = get_user_event_entries("user_1", datetime(2024, 1, 1), datetime(2024, 1, 5))
+
+    assert entries == [
+        (third.medication_event_id, "med_2", datetime(2024, 1, 3, 8)),
+        (first.medication_event_id, "med_1", datetime(2024, 1, 4, 8)),
+    ]
+    assert [(call.path, call.query) for call in calls] == [
+        ("/user_events/{user_id}", "orderBy=timestamp&startAt&endAt&limitToLast")
+    ]
+
+
+def test_rebuild_user_event_index_when_events_predate_index_index_them(app, memory_db):
+    memory_db.reference("/users/user_1/medications/med_1").set({"medication_id": "med_1"})
+    memory_db.reference("/medication_events/med_1").set({
+        "event_a": {"medication_event_id": "event_a", "user_id": "user_1", "medication_id": "med_1",
+                    "timestamp": "2024-01-01T08:00:00"},
+        "event_b": {"medication_event_id": "event_b", "user_id": "user_2", "medication_id": "med_1",
+                    "timestamp": "2024-01-01T09:00:00"},
+    })
+
+    # Written by a create that ran while the index was being rebuilt.
+    memory_db.reference("/user_events/user_1/event_c").set(
+        {"medication_id": "med_1", "timestamp": "2024-01-01T10:00:00"}
+    )
+
+    assert rebuild_user_event_index("user_1") == 1
+    assert memory_db.reference("/user_events/user_1").get() == {
+        "event_a": {"medication_id": "med_1", "timestamp": "2024-01-01T08:00:00"},
+        "event_c": {"medication_id": "med_1", "timestamp": "2024-01-01T10:00:00"},
+    }
+    assert memory_db.reference("/metadata/user_events_built/user_1").get() is True
+
+
+def test_update_medication_event_when_event_predates_index_write_whole_entry(app, memory_db):
+    memory_db.reference("/users/user_1/medications/med_1").set({"medication_id": "med_1"})
+    memory_db.reference("/medication_events/med_1/event_a").set({
+        "medication_event_id": "event_a", "user_id": "user_1", "medication_id": "med_1",
+        "timestamp": "2024-01-01T08:00:00"
+    })
+
+    update_medication_event("user_1", "med_1", "event_a", {"timestamp": "2024-01-02T08:00:00"})
+
+    assert get_user_event_entries("user_1", datetime(2024, 1, 1), datetime(2024, 1, 3)) == [
+        ("event_a", "med_1", datetime(2024, 1, 2, 8))
+    ]
+
+
+def test_update_medication_event_when_timestamp_is_invalid_raise_invalid_request_error(app):
+    with patch("src.controllers.medication_event_controller.reference") as mock_reference:
+        with pytest.raises(InvalidRequestError):
+            update_medication_event("user_id", "medication_id", "medication_event_id", {"timestamp": "yesterday"})
+
+    mock_reference.assert_not_called()
+
+
+def test_update_medication_event_when_medication_id_changes_raise_invalid_request_error(app):
+    with patch("src.controllers.medication_event_controller.reference") as mock_reference:
+        with pytest.raises(InvalidRequestError):
+            update_medication_event("user_id", "medication_id", "medication_event_id", {
+                "medication_id": "new_medication_id", "dosage": "10mg"
+            })
+
+    mock_reference.assert_not_called()
+
+
+def test_create_medication_events_when_batch_is_too_large_raise_invalid_request_error(app):
+    batch = [{"medication_id": "med_1", "timestamp": "2024-01-01T08:00:00"}] * (MAX_MEDICATION_EVENTS_PER_BATCH + 1)
+
+    with patch("src.controllers.medication_event_controller.get_medication_ids") as mock_get_medication_ids:
+        with pytest.raises(InvalidRequestError):
+            create_medication_events("test_user", batch)
+
+    mock_get_medication_ids.assert_not_called()
@@ -76,3 +76,84 @@ def test_handle_delete_medication_event_when_event_is_deleted_return_204(app, cl
             patch("src.routes.medication_event_router.delete_medication_event", return_value=None):
         response = client.delete(f"/medications/{medication_id}/events/{medication_event_id}")
         assert response.status_code == 204
+
+
+def test_handle_get_medication_events_for_user_when_requesting_user_is_monitoring_return_200(app, client):
+    medication_events = [
+        MedicationEvent(
+            medication_event_id="medication_event_id",
+            user_id="monitored_user",
+            medication_id="medication_id",
+            timestamp=datetime.now(),
+        )
+    ]
+
+    with patch("src.routes.medication_event_router.get_user_id", return_value="caregiver"), \
+            patch("src.controllers.authorization_controller.get_monitoring_user_ids",
+                  return_value=frozenset(["caregiver"])), \
+            patch("src.routes.medication_event_router.get_event_version_if_changed", return_value=(True, "etag_1")), \
+            patch("src.routes.medication_event_router.get_medication_events_for_user",
+                  return_value=(medication_events, None)) as mock_get_events:
+        response = client.get("/medications/events/users/monitored_user")
+        assert response.status_code == 200
+        assert mock_get_events.call_args.kwargs["user_id"] == "monitored_user"
+
+
+def test_handle_get_medication_events_for_user_when_requesting_user_is_not_monitoring_return_400(app, client):
+    with patch("src.routes.medication_event_router.get_user_id", return_value="stranger"), \
+            patch("src.controllers.authorization_controller.get_monitoring_user_ids", return_value=frozenset()), \
+            patch("src.routes.medication_event_router.get_medication_events_for_user") as mock_get_events:
+        response = client.get("/medications/events/users/monitored_user")
+        assert response.status_code == 400
+        mock_get_events.assert_not_called()
+
+
+def test_handle_get_medication_events_for_user_when_mode_is_timeline_return_timeline(app, client):
+    with patch("src.routes.medication_event_router.get_user_id", return_value="user_1"), \
+            patch("src.routes.medication_event_router.get_event_version_if_changed", return_value=(True, "etag_1")), \
+            patch("src.routes.medication_event_router.get_medication_event_timeline",
+                  return_value=([], "token")) as mock_get_timeline, \
+            patch("src.routes.medication_event_router.get_medication_events_for_user") as mock_get_events:
+        response = client.get("/medications/events/users/user_1?mode=timeline&start_token=abc")
+        assert response.status_code == 200
+        assert response.json["next_token"] == "token"
+        assert mock_get_timeline.call_args.kwargs["start_token"] == "abc"
+        mock_get_events.assert_not_called()
+
+
+def test_handle_get_medication_events_for_user_when_mode_is_invalid_return_400(app, client):
+    with patch("src.routes.medication_event_router.get_user_id", return_value="user_1"):
+        response = client.get("/medications/events/users/user_1?mode=sideways")
+        assert response.status_code == 400
+
+
+def test_handle_create_medication_events_when_some_events_fail_return_results(app, client):
+    results = [
+        {"success": True, "status": "created", "medication_event_id": "event_1"},
+        {"success": False, "status": "not_found", "message": "Medication med_2 does not exist for user user_1"},
+    ]
+    events = [
+        {"medication_id": "med_1", "timestamp": "2024-01-01T08:00:00"},
+        {"medication_id": "med_2", "timestamp": "2024-01-01T08:00:00"},
+    ]
+
+    with patch("src.routes.medication_event_router.get_user_id", return_value="user_1"), \
+            patch("src.routes.medication_event_router.create_medication_events",
+                  return_value=results) as mock_create_events:
+        response = client.post("/medications/events/batch", json={"events": events})
+        assert response.status_code == 200
+        assert response.json["success"] is False
+        assert response.json["data"] == results
+        mock_create_events.assert_called_once_with("user_1", events)
+
+
+def test_handle_get_medication_events_for_user_when_events_are_unchanged_return_304(app, client):
+    with patch("src.routes.medication_event_router.get_user_id", return_value="user_1"), \
+            patch("src.routes.medication_event_router.get_event_version_if_changed",
+                  return_value=(False, "etag_1")) as mock_get_version, \
+            patch("src.routes.medication_event_router.get_medication_events_for_user") as mock_get_events:
+        response = client.get("/medications/events/users/user_1", headers={"If-None-Match": '"etag_1"'})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == '"etag_1"'
+        mock_get_version.assert_called_once_with("user_1", "etag_1")
+        mock_get_events.assert_not_called()
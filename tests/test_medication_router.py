@@ -14,20 +14,33 @@ def test_handle_get_medication_when_medication_is_found_return_200(app, client):
     mock_medication = Medication(name="test_medication", medication_id=medication_id)
 
     with patch("src.routes.medication_router.get_user_id", return_value=user_id), \
-            patch("src.routes.medication_router.get_medication", return_value=mock_medication):
+            patch("src.routes.medication_router.get_medication_if_changed",
+                  return_value=(True, mock_medication, "etag_1")):
         response = client.get(f"/medications/{medication_id}")
         assert response.status_code == 200
+        assert response.headers["ETag"] == '"etag_1"'
         assert response.json["success"] is True
         assert response.json["message"] == "Medication found"
         assert response.json["data"] == mock_medication.to_dict()
 
 
+def test_handle_get_medication_when_client_copy_is_current_return_304(app, client):
+    with patch("src.routes.medication_router.get_user_id", return_value="test_user"), \
+            patch("src.routes.medication_router.get_medication_if_changed",
+                  return_value=(False, None, "etag_1")) as mock_get_medication:
+        response = client.get("/medications/test_medication_id", headers={"If-None-Match": '"etag_1"'})
+        assert response.status_code == 304
+        assert response.data == b""
+        assert response.headers["ETag"] == '"etag_1"'
+        mock_get_medication.assert_called_once_with("test_user", "test_medication_id", "etag_1")
+
+
 def test_handle_get_medication_when_medication_is_not_found_return_404(app, client):
     medication_id = "test_medication_id"
     user_id = "test_user"
 
     with patch("src.routes.medication_router.get_user_id", return_value=user_id), \
-            patch("src.routes.medication_router.get_medication", return_value=None):
+            patch("src.routes.medication_router.get_medication_if_changed", return_value=(True, None, "etag_1")):
         response = client.get(f"/medications/{medication_id}")
         assert response.status_code == 404
 
@@ -37,7 +50,7 @@ def test_handle_get_medication_when_firebase_fails_return_500(app, client):
     user_id = "test_user"
 
     with patch("src.routes.medication_router.get_user_id", return_value=user_id), \
-            patch("src.routes.medication_router.get_medication", side_effect=FirebaseError(8, "Test")):
+            patch("src.routes.medication_router.get_medication_if_changed", side_effect=FirebaseError(8, "Test")):
         response = client.get(f"/medications/{medication_id}")
         assert response.status_code == 500
 
@@ -287,3 +300,104 @@ def test_handle_delete_medication_when_firebase_fails_during_get_return_500(app,
             patch("src.routes.medication_router.get_medication", side_effect=FirebaseError(8, "Test")):
         response = client.delete(f"/medications/{medication_id}")
         assert response.status_code == 500
+
+
+def test_handle_search_medications_when_query_is_given_search_requesting_users_medications(app, client):
+    user_id = "test_user"
+    mock_medications = [{"medication_id": "med_1", "name": "Metformin", "nickname": None, "score": 0.86}]
+
+    with patch("src.routes.medication_router.get_user_id", return_value=user_id), \
+            patch("src.routes.medication_router.search_medications", return_value=mock_medications) as mock_search:
+        response = client.get("/medications/search?q=metfor")
+
+    mock_search.assert_called_once_with(user_id, "metfor", 10)
+    assert response.status_code == 200
+    assert response.json["data"] == mock_medications
+
+
+def test_handle_search_medications_when_limit_is_too_large_return_400(app, client):
+    with patch("src.routes.medication_router.get_user_id", return_value="test_user"):
+        response = client.get("/medications/search?q=metfor&limit=500")
+
+    assert response.status_code == 400
+
+
+def test_handle_get_medications_when_medications_exist_return_page_and_next_token(app, client):
+    mock_medication = Medication(name="test_medication", medication_id="med_1")
+
+    with patch("src.routes.medication_router.get_user_id", return_value="test_user"), \
+            patch("src.routes.medication_router.get_medication_version_if_changed", return_value=(True, "etag_1")), \
+            patch("src.routes.medication_router.get_medications", return_value=([mock_medication], 3, "bWVkXzI")) \
+            as mock_get_medications:
+        response = client.get("/medications/?limit=1&next_token=bWVkXzE")
+
+    mock_get_medications.assert_called_once_with("test_user", "bWVkXzE", 1)
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"etag_1"'
+    assert response.json["data"] == [mock_medication.to_dict()]
+    assert response.json["total"] == 3
+    assert response.json["next_token"] == "bWVkXzI"
+
+
+def test_handle_get_medications_when_client_copy_is_current_return_304(app, client):
+    with patch("src.routes.medication_router.get_user_id", return_value="test_user"), \
+            patch("src.routes.medication_router.get_medication_version_if_changed", return_value=(False, "etag_1")) \
+            as mock_get_version, \
+            patch("src.routes.medication_router.get_medications") as mock_get_medications:
+        response = client.get("/medications/", headers={"If-None-Match": '"etag_1"'})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == '"etag_1"'
+    mock_get_version.assert_called_once_with("test_user", "etag_1")
+    mock_get_medications.assert_not_called()
+
+
+def test_handle_get_medications_when_limit_is_too_large_return_400(app, client):
+    with patch("src.routes.medication_router.get_user_id", return_value="test_user"):
+        response = client.get("/medications/?limit=51")
+
+    assert response.status_code == 400
+
+
+def test_handle_save_medications_when_medications_are_saved_return_results(app, client):
+    results = [{"success": True, "status": "created", "medication_id": "med_1", "data": {"name": "Aspirin"}}]
+
+    with patch("src.routes.medication_router.get_user_id", return_value="test_user"), \
+            patch("src.routes.medication_router.save_medications", return_value=results) as mock_save:
+        response = client.post("/medications/bulk", json={"medications": [{"name": "Aspirin"}]})
+        assert response.status_code == 200
+        assert response.json["success"] is True
+        assert response.json["data"] == results
+        mock_save.assert_called_once_with("test_user", [{"name": "Aspirin"}])
+
+
+def test_handle_save_medications_when_list_is_invalid_return_400(app, client):
+    with patch("src.routes.medication_router.get_user_id", return_value="test_user"), \
+            patch("src.routes.medication_router.save_medications", side_effect=InvalidRequestError):
+        response = client.post("/medications/bulk", json={"medications": []})
+        assert response.status_code == 400
+
+
+def test_handle_get_scheduled_medications_when_mode_is_timeline_return_timeline(app, client):
+    with patch("src.routes.medication_router.get_user_id", return_value="user_1"), \
+            patch("src.routes.medication_router.get_scheduled_medication_timeline",
+                  return_value=([("2024-01-01T08:00:00", "med_1")], "token")) as mock_get_timeline, \
+            patch("src.routes.medication_router.get_scheduled_medications_for_user") as mock_get_scheduled:
+        response = client.get(
+            "/medications/schedule/user_1?start_at=2024-01-01T00:00:00&end_at=2024-01-02T00:00:00"
+            "&mode=timeline&next_token=abc"
+        )
+        assert response.status_code == 200
+        assert response.json["data"] == [["2024-01-01T08:00:00", "med_1"]]
+        assert response.json["next_token"] == "token"
+        assert mock_get_timeline.call_args.kwargs["start_token"] == "abc"
+        mock_get_scheduled.assert_not_called()
+
+
+def test_handle_get_scheduled_medications_when_mode_is_invalid_return_400(app, client):
+    with patch("src.routes.medication_router.get_user_id", return_value="user_1"):
+        response = client.get(
+            "/medications/schedule/user_1?start_at=2024-01-01T00:00:00&end_at=2024-01-02T00:00:00&mode=sideways"
+        )
+        assert response.status_code == 400
+
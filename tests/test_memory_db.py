@@ -0,0 +1,255 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.controllers.medication_event_controller import (
+    create_medication_event,
+    create_medication_events,
+    delete_medication_event,
+    get_event_version_if_changed,
+    get_medication_events_for_user,
+)
+from src.controllers.medication_controller import get_medication_count, save_medications
+from src.database.data_access import record_calls
+from src.database.memory_db import MemoryDatabase
+
+
+@pytest.fixture
+def database():
+    return MemoryDatabase({
+        "medication_events": {
+            "med_1": {
+                "event_c": {"timestamp": "2024-01-03T00:00:00"},
+                "event_a": {"timestamp": "2024-01-01T00:00:00"},
+                "event_d": {"timestamp": "2024-01-04T00:00:00"},
+                "event_b": {"timestamp": "2024-01-02T00:00:00"},
+            }
+        }
+    })
+
+
+def test_get_when_path_is_nested_return_copy_of_subtree(database):
+    value = database.reference("/medication_events/med_1/event_a").get()
+    value["timestamp"] = "changed"
+
+    assert database.reference("/medication_events/med_1/event_a/timestamp").get() == "2024-01-01T00:00:00"
+
+
+def test_get_when_shallow_return_child_keys_only(database):
+    assert database.reference("/medication_events/med_1").get(shallow=True) == {
+        "event_a": True, "event_b": True, "event_c": True, "event_d": True
+    }
+
+
+def test_order_by_child_when_range_and_limit_to_last_return_last_children_in_range(database):
+    events = database.reference("/medication_events/med_1")\
+        .order_by_child("timestamp")\
+        .start_at("2024-01-01T12:00:00")\
+        .end_at("2024-01-04T00:00:00")\
+        .limit_to_last(2)\
+        .get()
+
+    assert list(events) == ["event_c", "event_d"]
+
+
+def test_order_by_child_when_child_is_missing_sort_it_first(database):
+    database.reference("/medication_events/med_1/event_e").set({"dosage": "1 pill"})
+
+    events = database.reference("/medication_events/med_1").order_by_child("timestamp").limit_to_first(2).get()
+
+    assert list(events) == ["event_e", "event_a"]
+
+
+def test_order_by_key_when_keys_are_numeric_sort_them_numerically_first():
+    database = MemoryDatabase({"items": {"b": 1, "10": 2, "9": 3, "a": 4}})
+
+    assert list(database.reference("/items").order_by_key().get()) == ["9", "10", "a", "b"]
+
+
+def test_order_by_key_when_start_at_cursor_return_page_from_cursor(database):
+    page = database.reference("/medication_events/med_1").order_by_key().start_at("event_b").limit_to_first(2).get()
+
+    assert list(page) == ["event_b", "event_c"]
+
+
+def test_order_by_value_when_values_have_mixed_types_sort_by_type_then_value():
+    database = MemoryDatabase({"items": {"a": "x", "b": 2, "c": True, "d": 1, "e": {"k": 1}}})
+
+    assert list(database.reference("/items").order_by_value().get()) == ["c", "d", "b", "a", "e"]
+
+
+def test_update_when_keys_are_paths_write_each_path(database):
+    database.reference("/").update({
+        "users/user_1/name": "John",
+        "medication_events/med_1/event_a": None,
+        "metadata/user_count": {".sv": {"increment": 1}},
+    })
+
+    assert database.reference("/users/user_1/name").get() == "John"
+    assert database.reference("/medication_events/med_1/event_a").get() is None
+    assert database.reference("/metadata/user_count").get() == 1
+
+
+def test_delete_when_last_child_is_removed_prune_empty_parents():
+    database = MemoryDatabase({"users": {"user_1": {"medications": {"med_1": {"name": "Aspirin"}}}}})
+
+    database.reference("/users/user_1/medications/med_1").delete()
+
+    assert database.reference("/").get() is None
+
+
+def test_get_when_value_was_written_as_list_return_list():
+    database = MemoryDatabase()
+    database.reference("/users/user_1/monitored_by_users").set(["user_2", "user_3"])
+    database.reference("/sparse").set({"0": "a", "5": "b"})
+
+    assert database.reference("/users/user_1").get() == {"monitored_by_users": ["user_2", "user_3"]}
+    assert database.reference("/users/user_1/monitored_by_users/1").get() == "user_3"
+    assert database.reference("/sparse").get() == {"0": "a", "5": "b"}
+
+    database.reference("/users/user_1/monitored_by_users/0").delete()
+    assert database.reference("/users/user_1/monitored_by_users").get() == {"1": "user_3"}
+
+
+def test_push_when_called_repeatedly_generate_ordered_keys(database):
+    keys = [database.reference("/events").push({"index": i}).key for i in range(50)]
+
+    assert keys == sorted(keys)
+    assert len(set(keys)) == 50
+
+
+def test_transaction_when_called_apply_update_function(database):
+    database.reference("/counter").set(1)
+
+    assert database.reference("/counter").transaction(lambda count: count + 1) == 2
+    assert database.reference("/counter").get() == 2
+
+
+def test_limit_to_first_when_limit_to_last_is_set_raise_value_error(database):
+    with pytest.raises(ValueError):
+        database.reference("/medication_events/med_1").order_by_key().limit_to_last(1).limit_to_first(1)
+
+
+def test_create_medication_event_when_memory_backend_write_event(app, memory_db):
+    memory_db.reference("/users/user_1/medications/med_1").set({"medication_id": "med_1", "name": "Aspirin"})
+
+    with record_calls() as calls:
+        event = create_medication_event("user_1", "med_1", {"timestamp": "2024-01-01T08:00:00"})
+
+    stored = memory_db.reference(f"/medication_events/med_1/{event.medication_event_id}").get()
+    assert stored["timestamp"] == "2024-01-01T08:00:00"
+    assert memory_db.reference(f"/user_events/user_1/{event.medication_event_id}").get() == {
+        "medication_id": "med_1", "timestamp": "2024-01-01T08:00:00"
+    }
+    assert [(call.operation, call.path) for call in calls] == [
+        ("get", "/users/{user_id}/medications/{medication_id}"),
+        ("update", "/"),
+    ]
+
+
+def test_get_medication_events_for_user_when_thousands_of_events_return_page_across_medications(app, memory_db):
+    start = datetime(2024, 1, 1)
+    medications = {f"med_{m}": {"medication_id": f"med_{m}", "name": f"Medication {m}"} for m in range(3)}
+    memory_db.reference("/users/user_1").set({
+        "user_id": "user_1", "first_name": "John", "last_name": "Doe", "medications": medications
+    })
+    memory_db.reference("/medication_events").set({
+        medication_id: {
+            f"event_{e:04d}": {
+                "medication_event_id": f"event_{e:04d}",
+                "user_id": "user_1",
+                "medication_id": medication_id,
+                "timestamp": (start + timedelta(hours=e)).isoformat(),
+            }
+            for e in range(1000)
+        }
+        for medication_id in medications
+    })
+
+    with record_calls() as calls:
+        events, next_token = get_medication_events_for_user("user_1", start, start + timedelta(hours=99), 150)
+
+    assert len(events) == 150
+    assert [event.medication_id for event in events[:100]] == ["med_0"] * 100
+    assert events[100].timestamp == start + timedelta(hours=50)
+    assert next_token is not None
+    # The third medication's query runs concurrently with the others, unless it is cancelled before it starts.
+    assert calls[0].path == "/users/{user_id}/medications"
+    assert [call.path for call in calls[1:]] in (
+        ["/medication_events/{medication_id}"] * 2, ["/medication_events/{medication_id}"] * 3
+    )
+
+
+def test_create_medication_events_when_batch_is_sent_twice_write_each_event_once(app, memory_db):
+    for medication_id in ("med_1", "med_2"):
+        memory_db.reference(f"/users/user_1/medications/{medication_id}").set(
+            {"medication_id": medication_id, "name": "Aspirin"}
+        )
+    batch = [
+        {"medication_id": "med_1", "timestamp": "2024-01-01T08:00:00"},
+        {"medication_id": "med_2", "timestamp": "2024-01-01T08:00:00", "dosage": "10mg"},
+        {"medication_id": "med_1", "timestamp": "2024-01-01T08:00:00"},
+        {"medication_id": "med_3", "timestamp": "2024-01-01T08:00:00"},
+        {"medication_id": "med_1", "timestamp": "yesterday"},
+    ]
+
+    with record_calls() as calls:
+        results = create_medication_events("user_1", batch)
+
+    assert [result["status"] for result in results] == ["created", "created", "duplicate", "not_found", "invalid"]
+    assert results[2]["medication_event_id"] == results[0]["medication_event_id"]
+    assert [(call.operation, call.path) for call in calls] == [
+        ("get", "/users/{user_id}/medications"),
+        ("update", "/"),
+    ]
+    assert memory_db.reference(f"/medication_events/med_2/{results[1]['medication_event_id']}").get()["dosage"] == "10mg"
+    assert len(memory_db.reference("/user_events/user_1").get()) == 2
+
+    assert create_medication_events("user_1", batch) == results
+    assert len(memory_db.reference("/medication_events/med_1").get()) == 1
+    assert len(memory_db.reference("/user_events/user_1").get()) == 2
+
+
+def test_save_medications_when_list_is_mixed_write_valid_items_at_once(app, memory_db):
+    memory_db.reference("/users/user_1").set({
+        "user_id": "user_1",
+        "first_name": "John",
+        "last_name": "Doe",
+        "medications": {"med_1": {"medication_id": "med_1", "name": "Aspirin"}},
+    })
+    memory_db.reference("/metadata/medication_counts/user_1").set(1)
+
+    with record_calls() as calls:
+        results = save_medications("user_1", [
+            {"name": "Metformin", "schedule": {"hour": "8"}},
+            {"name": "Lisinopril", "nickname": "Blood pressure"},
+            {"medication_id": "med_1", "dosage": "81mg"},
+            {"medication_id": "med_9", "dosage": "5mg"},
+            {"name": "Ibuprofen", "schedule": {"hour": "25"}},
+            {"dosage": "10mg"},
+        ])
+
+    assert [result["status"] for result in results] == [
+        "created", "created", "updated", "not_found", "invalid", "invalid"
+    ]
+    assert [(call.operation, call.path) for call in calls] == [
+        ("get", "/users/{user_id}/medications"),
+        ("get", "/metadata/medication_counts/{user_id}"),
+        ("update", "/"),
+    ]
+    medications = memory_db.reference("/users/user_1/medications").get()
+    assert medications["med_1"] == {"medication_id": "med_1", "name": "Aspirin", "dosage": "81mg"}
+    assert medications[results[0]["medication_id"]]["schedule"]["hour"] == "8"
+    assert get_medication_count("user_1") == 3
+
+
+def test_get_event_version_if_changed_when_event_is_written_change_etag(app, memory_db):
+    memory_db.reference("/users/user_1/medications/med_1").set({"medication_id": "med_1", "name": "Aspirin"})
+    _, etag = get_event_version_if_changed("user_1", None)
+
+    assert get_event_version_if_changed("user_1", etag) == (False, etag)
+    event = create_medication_event("user_1", "med_1", {"timestamp": "2024-01-01T08:00:00"})
+    changed, created_etag = get_event_version_if_changed("user_1", etag)
+    assert changed
+    delete_medication_event("user_1", "med_1", event.medication_event_id)
+    assert get_event_version_if_changed("user_1", created_etag)[0]
@@ -0,0 +1,134 @@
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+from flask import g
+
+from src.utils.metrics import MetricsRegistry, _reset_registries_after_fork, mark_process_dead, record_firebase_call
+
+
+@pytest.fixture
+def registry(app, tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    app.extensions["metrics"] = registry
+    return registry
+
+
+def test_render_when_counter_is_incremented_return_counter_line(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    registry.inc("http_requests_total", {"endpoint": "users_bp.handle_get_user", "method": "GET", "status": "200"})
+    registry.inc("http_requests_total", {"endpoint": "users_bp.handle_get_user", "method": "GET", "status": "200"})
+
+    rendered = registry.render()
+
+    assert "# TYPE http_requests_total counter" in rendered
+    assert 'http_requests_total{endpoint="users_bp.handle_get_user",method="GET",status="200"} 2' in rendered
+
+
+def test_render_when_histogram_is_observed_return_cumulative_buckets(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    labels = {"endpoint": "base_bp.get_base", "method": "GET"}
+    registry.observe("http_request_duration_seconds", labels, 0.003)
+    registry.observe("http_request_duration_seconds", labels, 0.2)
+
+    rendered = registry.render()
+
+    assert 'http_request_duration_seconds_bucket{endpoint="base_bp.get_base",method="GET",le="0.005"} 1' in rendered
+    assert 'http_request_duration_seconds_bucket{endpoint="base_bp.get_base",method="GET",le="0.25"} 2' in rendered
+    assert 'http_request_duration_seconds_bucket{endpoint="base_bp.get_base",method="GET",le="+Inf"} 2' in rendered
+    assert 'http_request_duration_seconds_count{endpoint="base_bp.get_base",method="GET"} 2' in rendered
+
+
+def test_render_when_other_workers_have_snapshots_sum_them(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    labels = {"endpoint": "base_bp.get_base", "method": "GET", "status": "200"}
+    registry.inc("http_requests_total", labels)
+    other_worker_snapshot = {
+        "values": [["http_requests_total", sorted(labels.items()), 4]],
+        "histograms": [],
+    }
+    (tmp_path / "metrics_999999_1.json").write_text(json.dumps(other_worker_snapshot))
+
+    assert 'http_requests_total{endpoint="base_bp.get_base",method="GET",status="200"} 5' in registry.render()
+
+
+def test_reset_registries_after_fork_when_registry_has_values_clear_them(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    registry.inc("http_requests_in_flight")
+
+    _reset_registries_after_fork()
+
+    assert registry.snapshot() == {"values": [], "histograms": []}
+
+
+def test_mark_process_dead_when_worker_exits_zero_its_gauges_and_keep_counters(tmp_path):
+    snapshot = {
+        "values": [["http_requests_in_flight", [], 3], ["http_requests_total", [], 7]],
+        "histograms": [],
+    }
+    (tmp_path / "metrics_999999_1.json").write_text(json.dumps(snapshot))
+
+    mark_process_dead(str(tmp_path), 999999)
+
+    values = json.loads((tmp_path / "metrics_999999_1.json").read_text())["values"]
+    assert values == [["http_requests_in_flight", [], 0], ["http_requests_total", [], 7]]
+
+
+def test_flush_when_worker_reuses_pid_keep_earlier_worker_snapshot(tmp_path):
+    earlier = {"values": [["http_requests_total", [], 7]], "histograms": []}
+    registry = MetricsRegistry(str(tmp_path))
+    (tmp_path / f"metrics_{os.getpid()}_1.json").write_text(json.dumps(earlier))
+    registry.inc("http_requests_total")
+
+    assert "http_requests_total 8" in registry.render()
+
+
+def test_flush_when_value_recorded_during_flush_keep_registry_dirty(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    registry.inc("http_requests_total")
+    write = json.dump
+
+    def record_while_writing(snapshot, file):
+        registry.inc("http_requests_total")
+        write(snapshot, file)
+
+    with patch("src.utils.metrics.json.dump", record_while_writing):
+        registry.flush()
+
+    assert registry._dirty
+
+
+def test_handle_get_metrics_when_requests_were_served_return_request_metrics(app, client, registry):
+    app.config["METRICS_TOKEN"] = "scrape-token"
+    client.get("/")
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert 'http_requests_total{endpoint="base_bp.get_base",method="GET",status="200"} 1' in response.text
+    assert 'http_requests_in_flight 1' in response.text
+
+
+def test_handle_get_metrics_when_token_is_wrong_return_401(app, client, registry):
+    app.config["METRICS_TOKEN"] = "scrape-token"
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer other-token"}).status_code == 401
+
+
+def test_handle_get_metrics_when_no_token_is_configured_return_404(app, client, registry):
+    app.config["METRICS_TOKEN"] = None
+
+    assert client.get("/metrics").status_code == 404
+
+
+def test_record_firebase_call_when_in_request_count_call_against_request(app, registry):
+    with app.test_request_context():
+        record_firebase_call("/users/{user_id}", "get", 0.02)
+        record_firebase_call("/users/{user_id}", "get", 0.03)
+
+        assert g.firebase_calls == 2
+
+    assert 'firebase_calls_total{operation="get",path="/users/{user_id}"} 2' in registry.render()
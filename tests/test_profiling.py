@@ -0,0 +1,119 @@
+import pstats
+from unittest.mock import patch
+
+import pytest
+
+from src.models.Principal import Principal
+from src.routes.profiling import PROFILER_DIR, PROFILER_TOKEN, ProfilingBudget
+
+
+@pytest.fixture
+def profiler_app(app, tmp_path):
+    app.config[PROFILER_TOKEN] = "test_token"
+    app.config[PROFILER_DIR] = str(tmp_path)
+    app.extensions["profiling_budget"] = ProfilingBudget(max_per_minute=6)
+    return app
+
+
+def test_start_profiling_when_token_matches_store_profile(profiler_app, client, tmp_path):
+    response = client.get("/", headers={"X-Profile-Token": "test_token"})
+
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-Id"]
+    stats = pstats.Stats(str(tmp_path / f"{profile_id}.pstats"))
+    assert any(function_name == "get_base" for _, _, function_name in stats.stats)
+    assert (tmp_path / f"{profile_id}.collapsed").exists()
+
+
+def test_start_profiling_when_token_is_wrong_do_not_profile(profiler_app, client, tmp_path):
+    response = client.get("/", headers={"X-Profile-Token": "wrong_token"})
+
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_start_profiling_when_admin_sets_query_flag_store_profile(profiler_app, client):
+    admin = Principal(user_id="admin_user", claims={"admin": True})
+
+    with patch("src.routes.profiling.get_principal", return_value=admin):
+        response = client.get("/?_profile=1")
+
+    assert "X-Profile-Id" in response.headers
+
+
+def test_start_profiling_when_non_admin_sets_query_flag_do_not_profile(profiler_app, client):
+    with patch("src.routes.profiling.get_principal", return_value=Principal(user_id="test_user")):
+        response = client.get("/?_profile=1")
+
+    assert "X-Profile-Id" not in response.headers
+
+
+def test_start_profiling_when_budget_is_exhausted_do_not_profile(profiler_app, client):
+    profiler_app.extensions["profiling_budget"] = ProfilingBudget(max_per_minute=1)
+
+    first_response = client.get("/", headers={"X-Profile-Token": "test_token"})
+    second_response = client.get("/", headers={"X-Profile-Token": "test_token"})
+
+    assert "X-Profile-Id" in first_response.headers
+    assert "X-Profile-Id" not in second_response.headers
+
+
+def test_acquire_when_minute_has_passed_allow_profiling_again():
+    now = [0.0]
+    budget = ProfilingBudget(max_per_minute=1, clock=lambda: now[0])
+    assert budget.acquire() is True
+    budget.release()
+    assert budget.acquire() is False
+
+    now[0] = 61.0
+
+    assert budget.acquire() is True
+
+
+def test_acquire_when_profile_is_active_deny_concurrent_profiling():
+    budget = ProfilingBudget(max_per_minute=6)
+
+    assert budget.acquire() is True
+    assert budget.acquire() is False
+
+
+def test_handle_get_profile_when_authorized_return_collapsed_stacks(profiler_app, client):
+    profile_id = client.get("/", headers={"X-Profile-Token": "test_token"}).headers["X-Profile-Id"]
+
+    response = client.get(f"/profiles/{profile_id}", headers={"X-Profile-Token": "test_token"})
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+
+
+def test_handle_get_profile_when_no_credentials_are_sent_return_401(profiler_app, client):
+    profile_id = client.get("/", headers={"X-Profile-Token": "test_token"}).headers["X-Profile-Id"]
+
+    response = client.get(f"/profiles/{profile_id}")
+
+    assert response.status_code == 401
+
+
+def test_handle_get_profile_when_caller_is_not_admin_return_403(profiler_app, client):
+    profile_id = client.get("/", headers={"X-Profile-Token": "test_token"}).headers["X-Profile-Id"]
+
+    with patch("src.routes.auth.verify_id_token", return_value={"uid": "test_user"}):
+        response = client.get(f"/profiles/{profile_id}", headers={"Authorization": "id_token"})
+
+    assert response.status_code == 403
+
+
+def test_handle_get_profile_when_caller_is_admin_return_profile(profiler_app, client):
+    profile_id = client.get("/", headers={"X-Profile-Token": "test_token"}).headers["X-Profile-Id"]
+
+    with patch("src.routes.auth.verify_id_token", return_value={"uid": "admin_user", "admin": True}):
+        response = client.get(f"/profiles/{profile_id}", headers={"Authorization": "id_token"})
+
+    assert response.status_code == 200
+
+
+def test_handle_get_profile_when_id_is_malformed_return_404(profiler_app, client):
+    response = client.get("/profiles/..%2Fsecrets", headers={"X-Profile-Token": "test_token"})
+
+    assert response.status_code == 404
@@ -0,0 +1,45 @@
+import random
+
+from src.utils.push_id import PUSH_CHARS, PushIdGenerator, derive_push_id
+
+
+def test_push_id_when_generated_encode_time_then_random_characters():
+    push_id = PushIdGenerator(clock=lambda: 1700000000.123)()
+
+    assert len(push_id) == 20
+    assert set(push_id) <= set(PUSH_CHARS)
+    assert sum(PUSH_CHARS.index(char) * 64 ** (7 - i) for i, char in enumerate(push_id[:8])) == 1700000000123
+
+
+def test_push_id_when_generated_in_same_millisecond_increase():
+    generate = PushIdGenerator(clock=lambda: 1700000000.0, rng=random.Random(0))
+    push_ids = [generate() for _ in range(1000)]
+
+    assert push_ids == sorted(push_ids)
+    assert len(set(push_ids)) == 1000
+
+
+def test_push_id_when_clock_goes_back_keep_increasing():
+    times = iter([1700000001.0, 1700000000.0, 1700000002.0])
+    generate = PushIdGenerator(clock=lambda: next(times))
+    push_ids = [generate(), generate(), generate()]
+
+    assert push_ids == sorted(push_ids)
+    assert push_ids[0][:8] == push_ids[1][:8]
+
+
+def test_push_id_when_random_part_overflows_move_to_next_millisecond():
+    generate = PushIdGenerator(clock=lambda: 1700000000.0)
+    first = generate()
+    generate._last_random = [63] * 12
+    second = generate()
+
+    assert second > first
+    assert second[:8] > first[:8]
+
+
+def test_derive_push_id_when_parts_match_return_same_id():
+    assert derive_push_id(1700000000123, "user_1", "med_1") == derive_push_id(1700000000123, "user_1", "med_1")
+    assert derive_push_id(1700000000123, "user_1", "med_1") != derive_push_id(1700000000123, "user_1", "med_2")
+    assert derive_push_id(1700000000123, "a")[:8] == PushIdGenerator(clock=lambda: 1700000000.123)()[:8]
+    assert derive_push_id(1700000000123, "a") < derive_push_id(1700000000124, "a")
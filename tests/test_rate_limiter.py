@@ -0,0 +1,115 @@
+from unittest.mock import patch
+
+import pytest
+
+from src.models.Principal import Principal
+from src.utils.rate_limiter import TokenBucketRateLimiter
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def rate_limit_db_path(tmp_path):
+    return str(tmp_path / "rate_limits.sqlite3")
+
+
+def test_acquire_when_bucket_has_tokens_admit_until_capacity(rate_limit_db_path):
+    limiter = TokenBucketRateLimiter(rate_limit_db_path, capacity=3, refill_rate=1, clock=FakeClock())
+
+    assert [limiter.acquire("test_user")[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_acquire_when_bucket_is_empty_return_retry_after(rate_limit_db_path):
+    limiter = TokenBucketRateLimiter(rate_limit_db_path, capacity=5, refill_rate=0.5, clock=FakeClock())
+    limiter.acquire("test_user", cost=5)
+
+    allowed, retry_after = limiter.acquire("test_user", cost=2)
+
+    assert allowed is False
+    assert retry_after == 4.0
+
+
+def test_acquire_when_time_passes_refill_bucket(rate_limit_db_path):
+    clock = FakeClock()
+    limiter = TokenBucketRateLimiter(rate_limit_db_path, capacity=2, refill_rate=1, clock=clock)
+    limiter.acquire("test_user", cost=2)
+
+    clock.now += 1
+
+    assert limiter.acquire("test_user")[0] is True
+    assert limiter.acquire("test_user")[0] is False
+
+
+def test_acquire_when_keys_differ_use_separate_buckets(rate_limit_db_path):
+    limiter = TokenBucketRateLimiter(rate_limit_db_path, capacity=1, refill_rate=1, clock=FakeClock())
+
+    assert limiter.acquire("test_user")[0] is True
+    assert limiter.acquire("other_user")[0] is True
+
+
+def test_acquire_when_limiters_share_a_file_share_buckets(rate_limit_db_path):
+    clock = FakeClock()
+    first_worker = TokenBucketRateLimiter(rate_limit_db_path, capacity=2, refill_rate=1, clock=clock)
+    second_worker = TokenBucketRateLimiter(rate_limit_db_path, capacity=2, refill_rate=1, clock=clock)
+
+    assert first_worker.acquire("test_user")[0] is True
+    assert second_worker.acquire("test_user")[0] is True
+    assert first_worker.acquire("test_user")[0] is False
+
+
+def test_acquire_when_prune_interval_passes_delete_full_buckets(rate_limit_db_path):
+    clock = FakeClock()
+    limiter = TokenBucketRateLimiter(rate_limit_db_path, capacity=10, refill_rate=1, prune_interval=60, clock=clock)
+    limiter.acquire("idle_user", cost=5)
+    clock.now += 55
+    limiter.acquire("active_user", cost=10)
+
+    clock.now += 5
+    limiter.acquire("other_user")
+
+    buckets = limiter._connection().execute("SELECT bucket_key FROM token_buckets ORDER BY bucket_key").fetchall()
+    assert buckets == [("active_user",), ("other_user",)]
+    assert limiter.acquire("idle_user", cost=10)[0] is True
+
+
+def test_enforce_rate_limit_when_bucket_is_empty_return_429_with_retry_after(app, client, rate_limit_db_path):
+    app.extensions["rate_limiter"] = TokenBucketRateLimiter(
+        rate_limit_db_path, capacity=1, refill_rate=0.1, clock=FakeClock()
+    )
+
+    with patch("src.routes.rate_limit.get_principal", return_value=Principal(user_id="test_user")):
+        assert client.get("/").status_code == 200
+        response = client.get("/")
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"
+
+
+def test_enforce_rate_limit_when_endpoint_has_cost_charge_cost(app, client, rate_limit_db_path):
+    app.extensions["rate_limiter"] = TokenBucketRateLimiter(
+        rate_limit_db_path, capacity=4, refill_rate=1, clock=FakeClock()
+    )
+    app.config["RATE_LIMIT_COSTS"] = {"base_bp.get_base": 3}
+
+    with patch("src.routes.rate_limit.get_principal", return_value=Principal(user_id="test_user")):
+        assert client.get("/").status_code == 200
+        assert client.get("/").status_code == 429
+
+
+def test_enforce_rate_limit_when_batch_has_items_charge_each_item(app, client, rate_limit_db_path):
+    limiter = TokenBucketRateLimiter(rate_limit_db_path, capacity=60, refill_rate=1, clock=FakeClock())
+    app.extensions["rate_limiter"] = limiter
+    medications = [{"name": "Aspirin"}] * 10
+
+    with patch("src.routes.rate_limit.get_principal", return_value=Principal(user_id="test_user")):
+        client.post("/medications/bulk", json={"medications": medications})
+
+    # 1 for the request and 1 for each medication.
+    assert limiter.acquire("test_user", cost=49)[0] is True
+    assert limiter.acquire("test_user", cost=1)[0] is False
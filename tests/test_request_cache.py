@@ -0,0 +1,110 @@
+import pytest
+
+from src.controllers.medication_controller import get_medication
+from src.controllers.medication_event_controller import update_medication_event
+from src.database.data_access import REQUEST_READ_CACHE_ENABLED, record_calls, reference
+from src.database.request_cache import RequestReadCache
+
+
+@pytest.fixture
+def seeded_db(memory_db):
+    memory_db.set("/", {
+        "users": {
+            "user_1": {
+                "user_id": "user_1",
+                "medications": {"med_1": {"medication_id": "med_1", "name": "Aspirin"}},
+            }
+        },
+        "medication_events": {
+            "med_1": {
+                "event_1": {
+                    "medication_event_id": "event_1",
+                    "user_id": "user_1",
+                    "medication_id": "med_1",
+                    "timestamp": "2024-01-01T08:00:00",
+                }
+            }
+        },
+    })
+    return memory_db
+
+
+def test_lookup_when_ancestor_is_cached_return_child_value():
+    cache = RequestReadCache()
+    cache.store(["users", "user_1"], {"medications": {"med_1": {"name": "Aspirin"}}})
+
+    assert cache.lookup(["users", "user_1", "medications", "med_1", "name"]) == (True, "Aspirin")
+    assert cache.lookup(["users", "user_1", "dependants"]) == (True, None)
+    assert cache.lookup(["users", "user_2"]) == (False, None)
+
+
+def test_lookup_when_value_is_mutated_by_caller_keep_cached_value():
+    cache = RequestReadCache()
+    cache.store(["users", "user_1"], {"first_name": "John"})
+
+    cache.lookup(["users", "user_1"])[1]["first_name"] = "Jane"
+
+    assert cache.lookup(["users", "user_1", "first_name"]) == (True, "John")
+
+
+def test_invalidate_when_node_is_written_evict_ancestors_and_descendants():
+    cache = RequestReadCache()
+    cache.store(["users"], {})
+    cache.store(["users", "user_1", "medications"], {})
+    cache.store(["users", "user_1", "medications", "med_1"], {})
+    cache.store(["users", "user_2"], {})
+
+    cache.invalidate(["users", "user_1", "medications"])
+
+    assert cache.lookup(["users", "user_2"])[0] is True
+    cache.invalidate(["users", "user_2"])
+    assert cache.lookup(["users", "user_1", "medications", "med_1"])[0] is False
+    assert cache.lookup(["users"])[0] is False
+
+
+def test_get_when_same_node_is_read_twice_in_request_read_once(app, seeded_db):
+    with app.test_request_context(), record_calls() as calls:
+        assert get_medication("user_1", "med_1") == get_medication("user_1", "med_1")
+
+    assert len(calls) == 1
+
+
+def test_get_when_parent_was_read_in_request_serve_child_from_parent(app, seeded_db):
+    with app.test_request_context(), record_calls() as calls:
+        reference("/users/{user_id}", user_id="user_1").get()
+        medication_ids = reference("/users/{user_id}/medications", user_id="user_1").get(shallow=True)
+        medication = get_medication("user_1", "med_1")
+
+    assert medication_ids == {"med_1": True}
+    assert medication.name == "Aspirin"
+    assert [call.path for call in calls] == ["/users/{user_id}"]
+
+
+def test_get_when_node_was_written_in_request_read_it_again(app, seeded_db):
+    with app.test_request_context(), record_calls() as calls:
+        update_medication_event("user_1", "med_1", "event_1", {"dosage": "2 pills"})
+        event = reference(
+            "/medication_events/{medication_id}/{medication_event_id}", medication_id="med_1", medication_event_id="event_1"
+        ).get()
+
+    assert event["dosage"] == "2 pills"
+    assert [call.operation for call in calls] == ["get", "update", "get"]
+
+
+def test_get_when_requests_differ_do_not_share_cache(app, seeded_db):
+    with record_calls() as calls:
+        for _ in range(2):
+            with app.test_request_context():
+                get_medication("user_1", "med_1")
+
+    assert len(calls) == 2
+
+
+def test_get_when_cache_is_disabled_read_every_time(app, seeded_db):
+    app.config[REQUEST_READ_CACHE_ENABLED] = False
+
+    with app.test_request_context(), record_calls() as calls:
+        get_medication("user_1", "med_1")
+        get_medication("user_1", "med_1")
+
+    assert len(calls) == 2
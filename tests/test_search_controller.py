@@ -0,0 +1,150 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from src.controllers.medication_controller import create_medication, delete_medication, update_medication
+from src.controllers.search_controller import SearchIndexes, rebuild_search_names, search_medications, search_users
+from src.controllers.user_controller import create_user, update_user
+from src.database.data_access import record_calls
+
+
+@pytest.fixture
+def indexes():
+    search_indexes = SearchIndexes(refresh_seconds=300)
+    with patch("src.controllers.search_controller.search_indexes", search_indexes):
+        yield search_indexes
+
+
+@pytest.fixture
+def seeded_db(memory_db):
+    memory_db.set("/users", {
+        "user_1": {
+            "user_id": "user_1",
+            "first_name": "John",
+            "last_name": "Smith",
+            "medications": {
+                "med_1": {"medication_id": "med_1", "name": "Metformin", "nickname": "Sugar pill"},
+                "med_2": {"medication_id": "med_2", "name": "Lisinopril"},
+            },
+        },
+        "user_2": {
+            "user_id": "user_2",
+            "first_name": "Jane",
+            "last_name": "Johnson",
+            "medications": {"med_1": {"medication_id": "med_1", "name": "Metformin"}},
+        },
+    })
+    rebuild_search_names()
+    return memory_db
+
+
+def test_search_users_when_index_is_not_built_build_it_once(app, seeded_db, indexes):
+    with record_calls() as calls:
+        first = search_users("john")
+        search_users("smith")
+
+    assert [user["user_id"] for user in first] == ["user_1", "user_2"]
+    assert first[0]["first_name"] == "John"
+    assert [call.path for call in calls] == [
+        "/metadata/search_names_built", "/search_names/users", "/search_names/medications"
+    ]
+
+
+def test_search_users_when_mirror_was_never_built_build_it_from_users(app, seeded_db, indexes):
+    seeded_db.delete("/search_names")
+    seeded_db.delete("/metadata/search_names_built")
+
+    assert [user["user_id"] for user in search_users("john")] == ["user_1", "user_2"]
+    assert search_medications("user_2", "metformin")[0]["medication_id"] == "med_1"
+    assert seeded_db.get("/search_names/users/user_1") == {"first_name": "John", "last_name": "Smith"}
+    assert seeded_db.get("/metadata/search_names_built") is True
+
+
+def test_search_medications_when_query_is_partial_return_only_users_medications(app, seeded_db, indexes):
+    medications = search_medications("user_1", "metfor")
+
+    assert [medication["medication_id"] for medication in medications] == ["med_1"]
+    assert medications[0]["nickname"] == "Sugar pill"
+
+
+def test_search_when_controllers_write_keep_index_current(app, seeded_db, indexes):
+    indexes.build()
+
+    create_user("user_3", {"first_name": "Zelda", "last_name": "Fitzgerald"})
+    update_user("user_2", {"first_name": "Janet"})
+    medication = create_medication("user_1", {"name": "Atorvastatin"})
+    update_medication("user_1", "med_2", {"nickname": "Blood pressure"})
+    delete_medication("user_1", "med_1")
+
+    assert search_users("zelda")[0]["user_id"] == "user_3"
+    assert search_users("janet")[0]["first_name"] == "Janet"
+    assert search_medications("user_1", "atorva")[0]["medication_id"] == medication.medication_id
+    assert search_medications("user_1", "lisinopril")[0]["nickname"] == "Blood pressure"
+    assert search_medications("user_1", "metformin") == []
+
+
+def test_build_when_writes_happen_during_rebuild_replay_them(app, seeded_db, indexes):
+    original_reference = indexes.build.__globals__["reference"]
+
+    def reference_with_concurrent_write(path, **ids):
+        indexes.apply(lambda: indexes.users.add("user_9", ["Written During Rebuild"], {"user_id": "user_9"}))
+        return original_reference(path, **ids)
+
+    with patch("src.controllers.search_controller.reference", reference_with_concurrent_write):
+        indexes.build()
+
+    assert search_users("rebuild")[0]["user_id"] == "user_9"
+
+
+def test_ensure_fresh_when_index_is_stale_rebuild_in_background(app, seeded_db, indexes):
+    now = [0.0]
+    indexes._clock = lambda: now[0]
+    indexes.build()
+    seeded_db.set("/search_names/users/user_3", {"first_name": "Zelda", "last_name": "Fitzgerald"})
+
+    now[0] = 301.0
+    with patch("threading.Thread") as thread:
+        indexes.ensure_fresh(app)
+        indexes.ensure_fresh(app)
+
+    thread.assert_called_once()
+    indexes._rebuild_in_background(app)
+    assert indexes.users.search("zelda")[0].document_id == "user_3"
+    assert indexes.built_at == 301.0
+
+
+def test_rebuild_search_names_when_users_exist_mirror_only_names(app, seeded_db):
+    seeded_db.delete("/search_names")
+
+    assert rebuild_search_names() == 2
+
+    assert seeded_db.get("/search_names/users/user_1") == {"first_name": "John", "last_name": "Smith"}
+    assert seeded_db.get("/search_names/medications/user_1/med_1") == {"name": "Metformin", "nickname": "Sugar pill"}
+
+
+def test_ensure_fresh_when_first_searches_race_build_once(app, seeded_db, indexes):
+    original_build = indexes._build
+    builds = []
+    release = threading.Event()
+
+    def slow_build():
+        builds.append(1)
+        release.wait(1)
+        original_build()
+
+    def search():
+        with app.app_context():
+            indexes.ensure_fresh(app)
+
+    indexes._build = slow_build
+    threads = [threading.Thread(target=search) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert indexes.users.search("john")[0].document_id == "user_1"
+
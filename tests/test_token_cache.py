@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from src.utils.token_cache import TokenCache
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_when_token_is_cached_return_decoded_token_and_count_hit():
+    cache = TokenCache(max_size=2, clock=FakeClock())
+    decoded_token = {"user_id": "test_user", "exp": 2000}
+
+    cache.put("token", decoded_token)
+
+    assert cache.get("token") == decoded_token
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 0
+
+
+def test_get_when_token_is_not_cached_return_none_and_count_miss():
+    cache = TokenCache(max_size=2, clock=FakeClock())
+
+    assert cache.get("token") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_get_when_token_has_expired_evict_and_return_none():
+    clock = FakeClock()
+    cache = TokenCache(max_size=2, clock=clock)
+    cache.put("token", {"user_id": "test_user", "exp": 1500})
+
+    clock.now = 1500
+
+    assert cache.get("token") is None
+    assert len(cache) == 0
+
+
+def test_put_when_token_has_no_exp_claim_dont_cache():
+    cache = TokenCache(max_size=2, clock=FakeClock())
+
+    cache.put("token", {"user_id": "test_user"})
+
+    assert len(cache) == 0
+
+
+def test_put_when_cache_is_full_evict_least_recently_used():
+    cache = TokenCache(max_size=2, clock=FakeClock())
+    cache.put("first", {"user_id": "first", "exp": 2000})
+    cache.put("second", {"user_id": "second", "exp": 2000})
+    cache.get("first")
+
+    cache.put("third", {"user_id": "third", "exp": 2000})
+
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+    assert cache.get("third") is not None
+
+
+def test_put_when_called_concurrently_stay_bounded():
+    cache = TokenCache(max_size=16, clock=FakeClock())
+
+    def fill(worker: int):
+        for i in range(200):
+            cache.put(f"{worker}-{i}", {"user_id": str(i), "exp": 2000})
+            cache.get(f"{worker}-{i}")
+
+    threads = [threading.Thread(target=fill, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(cache) == 16
+    assert cache.stats()["hits"] == 1600
+
+
+def test_init_when_max_size_is_not_positive_raise_value_error():
+    with pytest.raises(ValueError):
+        TokenCache(max_size=0)
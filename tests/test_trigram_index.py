@@ -0,0 +1,83 @@
+from src.utils.trigram_index import TrigramIndex, trigrams, words
+
+
+def test_words_when_text_has_punctuation_return_lowercase_words():
+    assert words("Jo-Ann O'Neil") == {"jo", "ann", "o", "neil"}
+
+
+def test_trigrams_when_word_is_short_pad_it():
+    assert trigrams("al") == {"  a", " al", "al "}
+
+
+def test_search_when_query_is_partial_word_rank_containing_document_first():
+    index = TrigramIndex()
+    index.add("med_1", ["Metformin"])
+    index.add("med_2", ["Metoprolol"])
+    index.add("med_3", ["Aspirin"])
+
+    results = index.search("metfor", min_score=0.3)
+
+    assert [result.document_id for result in results] == ["med_1", "med_2"]
+    assert results[0].score > 0.8
+    assert [result.document_id for result in index.search("metfor")] == ["med_1"]
+
+
+def test_search_when_query_has_typo_find_document():
+    index = TrigramIndex()
+    index.add("med_1", ["Metformin"], payload={"name": "Metformin"})
+    index.add("med_2", ["Lisinopril"])
+
+    results = index.search("metfromin")
+
+    assert results[0].document_id == "med_1"
+    assert results[0].payload == {"name": "Metformin"}
+
+
+def test_search_when_word_matches_exactly_rank_it_above_longer_words():
+    index = TrigramIndex()
+    index.add("user_1", ["Johnathan", "Smith"])
+    index.add("user_2", ["John", "Smith"])
+    index.add("user_3", ["John", "Doe"])
+
+    assert [result.document_id for result in index.search("john")] == ["user_2", "user_3", "user_1"]
+
+
+def test_search_when_query_has_several_words_rank_documents_matching_all_first():
+    index = TrigramIndex()
+    index.add("user_1", ["Jennifer", "Smith"])
+    index.add("user_2", ["Jenifer", "Lopez"])
+    index.add("user_3", ["Maria", "Lopez"])
+
+    results = index.search("jennifer lopez")
+
+    assert [result.document_id for result in results] == ["user_2", "user_1", "user_3"]
+    assert results[1].score == 0.5
+
+
+def test_search_when_scope_is_given_ignore_other_scopes():
+    index = TrigramIndex()
+    index.add(("user_1", "med_1"), ["Aspirin"], scope="user_1")
+    index.add(("user_2", "med_1"), ["Aspirin"], scope="user_2")
+
+    assert [result.document_id for result in index.search("aspirin", scope="user_2")] == [("user_2", "med_1")]
+    assert index.search("aspirin") == []
+
+
+def test_add_when_document_exists_replace_its_trigrams():
+    index = TrigramIndex()
+    index.add("med_1", ["Aspirin"])
+    index.add("med_1", ["Ibuprofen"])
+
+    assert index.search("aspirin") == []
+    assert index.search("ibuprofen")[0].document_id == "med_1"
+    assert len(index) == 1
+
+
+def test_remove_when_document_is_removed_drop_its_postings():
+    index = TrigramIndex()
+    index.add("med_1", ["Aspirin"])
+
+    index.remove("med_1")
+
+    assert index.search("aspirin") == []
+    assert index.vocabulary_size == 0
@@ -3,7 +3,15 @@ from unittest.mock import MagicMock, patch
 import pytest
 from firebase_admin.exceptions import FirebaseError
 
-from src.controllers.user_controller import create_user, update_user
+from src.controllers.user_controller import (
+    create_user,
+    get_user_count,
+    get_users,
+    rebuild_user_search_index,
+    seed_user_count,
+    update_user,
+)
+from src.database.data_access import record_calls
 from src.models.User import User
 from src.models.errors.invalid_request_error import InvalidRequestError
 from src.models.errors.resource_already_exists_error import ResourceAlreadyExistsError
@@ -27,11 +35,21 @@ def test_create_user_when_user_is_created_return_user(app):
 
     with patch("firebase_admin.db.reference", return_value=mock_db_users_ref):
         mock_db_users_ref.get.return_value = None
-        mock_db_users_ref.set.return_value = None
+        mock_db_users_ref.update.return_value = None
 
         created_user = create_user(mock_user_id, mock_json_dict)
 
-        assert mock_db_users_ref.set.called_once_with(user.to_dict())
+        mock_db_users_ref.update.assert_called_once_with({
+            f"users/{mock_user_id}": user.to_dict(),
+            "metadata/user_count": {".sv": {"increment": 1}},
+            "metadata/medication_counts/test_user": 0,
+            "metadata/medication_versions/test_user": {".sv": {"increment": 1}},
+            "metadata/user_events_built/test_user": True,
+            "search_names/users/test_user": {"first_name": "Test", "last_name": "User"},
+            "search_names/medications/test_user": None,
+            "user_search/test test_user": "test user",
+            "user_search/user test_user": "test user",
+        })
         assert user == created_user
 
 
@@ -98,7 +116,7 @@ def test_create_user_when_set_user_fails_raise_firebase_error(app):
 
     with patch("firebase_admin.db.reference", return_value=mock_db_users_ref):
         mock_db_users_ref.get.return_value = None
-        mock_db_users_ref.set.side_effect = FirebaseError(8, "test")
+        mock_db_users_ref.update.side_effect = FirebaseError(8, "test")
 
         with pytest.raises(FirebaseError):
             create_user(mock_user_id, mock_json_dict)
@@ -184,3 +202,185 @@ def test_update_user_when_update_fails_raise_firebase_error(app):
         mock_db_users_ref.update.side_effect = FirebaseError(8, "test")
         with pytest.raises(FirebaseError):
             update_user(mock_user_id, mock_json_dict)
+
+
+@pytest.fixture
+def users_db(app, memory_db):
+    for i in range(10):
+        create_user(f"user_{i:02d}", {"first_name": "John" if i % 3 == 0 else "Jane", "last_name": "Doe"})
+    memory_db.set("/metadata/user_search_built", True)
+    return memory_db
+
+
+def test_get_users_when_pages_are_followed_return_every_user_once(app, users_db):
+    pages = []
+    next_token = None
+    while True:
+        users, total, next_token = get_users(next_token, 4)
+        pages.append([user_id for user_id, _ in users])
+        assert total == 10
+        if next_token is None:
+            break
+
+    assert pages == [
+        ["user_00", "user_01", "user_02", "user_03"],
+        ["user_04", "user_05", "user_06", "user_07"],
+        ["user_08", "user_09"],
+    ]
+
+
+def test_get_users_when_name_is_given_return_matching_users_page_by_page(app, users_db):
+    users, _, next_token = get_users(None, 2, "jo")
+    more_users, _, last_token = get_users(next_token, 2, "jo")
+
+    assert [user_id for user_id, _ in users] == ["user_00", "user_03"]
+    assert [user_id for user_id, _ in more_users] == ["user_06", "user_09"]
+    assert more_users[0][1]["first_name"] == "John"
+    assert last_token is None
+
+
+def test_get_users_when_name_has_several_tokens_return_users_matching_all(app, users_db):
+    create_user("user_10", {"first_name": "Doris", "last_name": "Dorsey"})
+    create_user("user_11", {"first_name": "Jo-Ann", "last_name": "Doe"})
+
+    assert [user_id for user_id, _ in get_users(None, 10, "do")[0]] == [
+        "user_00", "user_01", "user_02", "user_03", "user_04", "user_05", "user_06", "user_07", "user_08", "user_09",
+    ]
+    assert [user_id for user_id, _ in get_users(None, 10, "dor")[0]] == ["user_10"]
+    assert [user_id for user_id, _ in get_users(None, 10, "ann doe")[0]] == ["user_11"]
+
+
+def test_get_users_when_name_is_given_read_only_matching_index_entries(app, users_db):
+    with record_calls() as calls:
+        get_users(None, 10, "john")
+
+    assert calls[0].path == "/metadata/user_search_built"
+    assert calls[1].path == "/user_search"
+    assert calls[1].response_bytes < 200
+    assert [call.path for call in calls[2:]] == ["/users/{user_id}"] * 4
+
+
+def test_get_users_when_user_matches_several_entries_read_user_once(app, users_db):
+    matches = [("doe user_00", "user_00"), ("john user_00", "user_00"), ("john user_03", "user_03")]
+
+    with patch("src.controllers.user_controller._search_user_ids", return_value=matches), record_calls() as calls:
+        users, _, _ = get_users(None, 10, "john doe")
+
+    assert [user_id for user_id, _ in users] == ["user_00", "user_03"]
+    assert len(calls) == 3
+
+
+def test_get_users_when_search_index_is_not_built_scan_users_by_substring(app, users_db):
+    users_db.delete("/metadata/user_search_built")
+    users_db.delete("/user_search")
+
+    with patch("src.controllers.user_controller.USER_SCAN_BATCH_SIZE", 3):
+        users, total, next_token = get_users(None, 3, "OHN")
+        more_users, _, last_token = get_users(next_token, 3, "OHN")
+
+    assert [user_id for user_id, _ in users] == ["user_00", "user_03", "user_06"]
+    assert [user_id for user_id, _ in more_users] == ["user_09"]
+    assert total is None
+    assert last_token is None
+
+
+def test_update_user_when_medications_are_replaced_recount_them(app, users_db):
+    update_user("user_01", {"medications": {
+        "med_1": {"medication_id": "med_1", "name": "Aspirin"},
+        "med_2": {"medication_id": "med_2", "name": "Ibuprofen"},
+    }})
+
+    assert users_db.get("/metadata/medication_counts/user_01") == 2
+    assert users_db.get("/search_names/medications/user_01/med_2") == {"name": "Ibuprofen"}
+
+
+def test_update_user_when_name_changes_move_search_entries(app, users_db):
+    update_user("user_01", {"first_name": "Joan"})
+
+    assert users_db.get("/user_search/jane user_01") is None
+    assert users_db.get("/user_search/joan user_01") == "doe joan"
+    assert users_db.get("/user_search/doe user_01") == "doe joan"
+    assert users_db.get("/users/user_01/first_name") == "Joan"
+
+
+def test_rebuild_user_search_index_when_index_is_missing_index_every_user(app, users_db):
+    users_db.delete("/user_search")
+
+    users_db.delete("/metadata/user_search_built")
+
+    with patch("src.controllers.user_controller.USER_SCAN_BATCH_SIZE", 3):
+        assert rebuild_user_search_index() == 10
+
+    assert users_db.get("/metadata/user_search_built") is True
+    assert [user_id for user_id, _ in get_users(None, 10, "john")[0]] == ["user_00", "user_03", "user_06", "user_09"]
+
+
+def test_get_users_when_start_token_is_invalid_raise_invalid_request_error(app, users_db):
+    with pytest.raises(InvalidRequestError):
+        get_users("not a token!", 4)
+
+
+def test_get_user_count_when_counter_is_missing_count_users_without_writing(app, users_db):
+    users_db.delete("/metadata/user_count")
+
+    assert get_user_count() == 10
+    assert users_db.get("/metadata/user_count") is None
+
+
+def test_seed_user_count_when_users_exist_before_counter_count_them(app, users_db):
+    users_db.delete("/metadata/user_count")
+
+    assert seed_user_count() == 10
+    create_user("user_10", {"first_name": "Jim", "last_name": "Doe"})
+
+    assert get_user_count() == 11
+
+
+def test_create_user_when_counter_is_missing_seed_it_from_existing_users(app, users_db):
+    users_db.delete("/metadata/user_count")
+
+    create_user("user_10", {"first_name": "Jim", "last_name": "Doe"})
+    create_user("user_11", {"first_name": "Jane", "last_name": "Doe"})
+
+    assert users_db.get("/metadata/user_count") == 12
+
+
+def test_get_users_when_name_is_given_leave_total_out(app, users_db):
+    users, total, _ = get_users(None, 10, "john")
+
+    assert len(users) == 4
+    assert total is None
+
+
+def test_create_user_when_memory_backend_increment_user_count_and_index_name(app, users_db):
+    create_user("user_10", {"first_name": "Jim", "last_name": "Doe"})
+
+    assert users_db.get("/metadata/user_count") == 11
+    assert users_db.get("/users/user_10/first_name") == "Jim"
+    assert users_db.get("/user_search/jim user_10") == "doe jim"
+
+
+def test_update_user_when_user_has_many_medications_read_constant_size_payloads(app, users_db):
+    users_db.set("/users/user_01/medications", {
+        f"med_{m:03d}": {"medication_id": f"med_{m:03d}", "name": "Medication with a long name"} for m in range(200)
+    })
+
+    with record_calls() as calls:
+        update_user("user_01", {"first_name": "Joan", "phone": "555-0100"})
+
+    reads = [call for call in calls if call.operation == "get"]
+    assert [(call.path, call.query) for call in reads] == [
+        ("/users/{user_id}", "shallow"), ("/users/{user_id}/{key}", ""), ("/users/{user_id}/{key}", "")
+    ]
+    assert all(call.response_bytes < 200 for call in reads)
+    assert users_db.get("/user_search/joan user_01") == "doe joan"
+
+
+def test_update_user_when_medications_are_replaced_bump_versions(app, users_db):
+    users_db.set("/metadata/medication_versions/user_01", 2)
+    users_db.set("/metadata/event_versions/user_01", 4)
+
+    update_user("user_01", {"medications": {"med_1": {"medication_id": "med_1", "name": "Aspirin"}}})
+
+    assert users_db.get("/metadata/medication_versions/user_01") == 3
+    assert users_db.get("/metadata/event_versions/user_01") == 5
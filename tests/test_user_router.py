@@ -140,3 +140,61 @@ def test_handle_update_user_when_user_cant_be_updated_return_500(app, client):
             patch("src.routes.user_router.update_user", side_effect=FirebaseError(8, "test")):
         response = client.put(f"/users/{mock_user_id}", json=mock_user_data)
         assert response.status_code == 500
+
+
+def test_handle_get_users_when_users_exist_return_page_and_next_token(app, client):
+    mock_users = [("user_1", {"first_name": "John", "last_name": "Doe"})]
+
+    with patch("src.routes.user_router.get_users", return_value=(mock_users, 2, "dXNlcl8y")) as mock_get_users:
+        response = client.get("/users/?page_size=1&next_token=dXNlcl8x")
+
+    mock_get_users.assert_called_once_with("dXNlcl8x", 1, None)
+    assert response.status_code == 200
+    assert response.json["data"] == [["user_1", {"first_name": "John", "last_name": "Doe"}]]
+    assert response.json["total"] == 2
+    assert response.json["next_token"] == "dXNlcl8y"
+
+
+def test_handle_get_users_when_name_is_given_leave_total_out(app, client):
+    with patch("src.routes.user_router.get_users", return_value=([], None, None)):
+        response = client.get("/users/?name=john")
+
+    assert response.status_code == 200
+    assert "total" not in response.json
+
+
+def test_handle_get_users_when_page_size_is_too_large_return_400(app, client):
+    response = client.get("/users/?page_size=1000")
+
+    assert response.status_code == 400
+
+
+def test_handle_get_users_when_next_token_is_invalid_return_400(app, client):
+    with patch("src.routes.user_router.get_users", side_effect=InvalidRequestError("Invalid next_token.")):
+        response = client.get("/users/?next_token=bad")
+
+    assert response.status_code == 400
+
+
+def test_rebuild_search_index_command_when_run_report_indexed_users(app):
+    with patch("src.routes.user_router.rebuild_user_search_index", return_value=3):
+        result = app.test_cli_runner().invoke(args=["users", "rebuild-search-index"])
+
+    assert result.output == "Indexed 3 users\n"
+
+
+def test_handle_search_users_when_query_is_given_return_matches(app, client):
+    mock_users = [{"user_id": "user_1", "first_name": "John", "last_name": "Doe", "score": 1.0}]
+
+    with patch("src.routes.user_router.search_users", return_value=mock_users) as mock_search_users:
+        response = client.get("/users/search?q=jon&limit=5")
+
+    mock_search_users.assert_called_once_with("jon", 5)
+    assert response.status_code == 200
+    assert response.json["data"] == mock_users
+
+
+def test_handle_search_users_when_query_is_missing_return_400(app, client):
+    response = client.get("/users/search")
+
+    assert response.status_code == 400